@@ -0,0 +1,359 @@
+""" board.py: Contains the Board class. """
+
+
+import random
+import struct
+
+import config
+from event_handler import Key_Repeat
+from field import *
+from omino import *
+
+
+# The actions a player can take, in the order of their keys in
+# config.versus_keys
+ROTATE = 0
+LEFT = 1
+DOWN = 2
+RIGHT = 3
+DROP = 4
+
+# A saved board is this header, then the states of its two random number
+# generators, then the field's settled blocks (see Field.pack). The header is:
+# score, lines, pieces, accelerated points, fall time, next omino's index and
+# rotation, and whether there is a moving omino and its index, rotation and
+# location
+_board_header = struct.Struct('<IIIIdHBBHBhh')
+_random_state = struct.Struct('<625IBd')
+
+
+class Board:
+    
+    """ A class for one player's board: a field, the piece source it is fed
+    from, the keys held on it, and the garbage lines sent to it which are still
+    to be added. A single player game plays on one board, and a versus game on
+    one for each player. """
+    
+    def __init__(self, sound, level, order, ominoes, seed):
+        """ Initialise an empty board with the given level and order. The
+        ominoes are chosen from the given seed, so boards given the same seed
+        are dealt the same ominoes, whatever garbage they are sent.
+        
+        __init__(Sound, int, int,
+                 (list<list<list<bool>>>,
+                  list<((int, int, int), (int, int, int), (int, int, int))>),
+                 int) -> void
+        """
+        
+        self._sound = sound
+        self._order = order
+        self._random = random.Random(seed)
+        # Garbage gaps and the rotations ominoes are fitted in at the top come
+        # from their own generator, so that what happens on a board's field
+        # doesn't change the ominoes it is dealt
+        self._field_random = random.Random(seed)
+        
+        if order < 5:
+            width = 10
+            height = 20
+        else:
+            width = 15
+            height = 30
+        self._field = Field(order, width, height)
+        
+        self._droptime = config.levels[level]
+        self._fall_time = 0
+        self._accel_points = 0
+        self._keys = Key_Repeat(config.key_repeat_delay,
+                                config.key_repeat_rate)
+        
+        self._score = 0
+        self._lines = 0
+        self._pieces = 0
+        self._garbage = 0
+        self._playing = True
+        
+        self._ominoes = ominoes[0]
+        self._colours = ominoes[1]
+        self._indices = dict((colour, i)
+                             for i, colour in enumerate(self._colours))
+        self._next = self._choose_omino()
+    
+    def get_field(self):
+        """ Return the board's field.
+        
+        get_field() -> Field
+        """
+        
+        return self._field
+    
+    def get_score(self):
+        """ Return the board's current score.
+        
+        get_score() -> int
+        """
+        
+        return self._score
+    
+    def get_lines_cleared(self):
+        """ Return the number of lines cleared on the board.
+        
+        get_lines_cleared() -> int
+        """
+        
+        return self._lines
+    
+    def get_pieces(self):
+        """ Return the number of ominoes which have been played on the board.
+        
+        get_pieces() -> int
+        """
+        
+        return self._pieces
+    
+    def get_garbage(self):
+        """ Return the number of garbage lines waiting to be added to the
+        board.
+        
+        get_garbage() -> int
+        """
+        
+        return self._garbage
+    
+    def get_next_index(self):
+        """ Return the index in the board's list of ominoes of the omino that
+        is coming up next.
+        
+        get_next_index() -> int
+        """
+        
+        return self._next_index
+    
+    def get_next_omino(self):
+        """ Return the omino that is coming up next.
+        
+        get_next_omino() -> Omino
+        """
+        
+        return self._next
+    
+    def is_playing(self):
+        """ Return False once the board's blocks have reached the top.
+        
+        is_playing() -> bool
+        """
+        
+        return self._playing
+    
+    def start(self):
+        """ Add the first omino to the board. """
+        
+        self._field.add_omino(self._next, self._field_random)
+        self._next = self._choose_omino()
+        self._pieces = 1
+    
+    def save(self):
+        """ Return a compact binary snapshot of the board, which a new board
+        of the same order and level can be restored from.
+        
+        save() -> string
+        Precondition: No garbage has been added to the board.
+        """
+        
+        omino = self._field.get_omino()
+        if omino:
+            location = omino.get_location()
+            active = (1, self._indices[omino.get_colour()],
+                      omino.get_rotation(), location.x, location.y)
+        else:
+            active = (0, 0, 0, 0, 0)
+        header = _board_header.pack(self._score, self._lines, self._pieces,
+                                    self._accel_points, self._fall_time,
+                                    self._next_index,
+                                    self._next.get_rotation(), *active)
+        states = []
+        for generator in (self._random, self._field_random):
+            version, state, gauss = generator.getstate()
+            states.append(_random_state.pack(*(state + (gauss != None,
+                                                         gauss or 0.0))))
+        return header + ''.join(states) + self._field.pack(self._indices)
+    
+    def restore(self, data):
+        """ Restore the board from a snapshot returned by save. Raise
+        ValueError if the snapshot is corrupt.
+        
+        restore(string) -> void
+        Precondition: The board has the snapshot's order and level, and hasn't
+        been started.
+        """
+        
+        try:
+            (score, lines, pieces, accel_points, fall_time, next_index,
+             next_rotation, has_omino, omino_index, omino_rotation, x, y) = \
+                _board_header.unpack_from(data)
+            offset = _board_header.size
+            states = []
+            for i in xrange(2):
+                states.append(_random_state.unpack_from(data, offset))
+                offset += _random_state.size
+            self._field.unpack(data[offset:], self._colours)
+            next_omino = Omino(self._ominoes[next_index],
+                               self._colours[next_index], next_rotation)
+            omino = None
+            if has_omino:
+                omino = Omino(self._ominoes[omino_index],
+                              self._colours[omino_index], omino_rotation)
+                omino.move(Point(x, y))
+        except (struct.error, IndexError), error:
+            raise ValueError('Corrupt snapshot: ' + str(error))
+        
+        self._score = score
+        self._lines = lines
+        self._pieces = pieces
+        self._accel_points = accel_points
+        self._fall_time = fall_time
+        for generator, state in zip((self._random, self._field_random),
+                                    states):
+            gauss = None
+            if state[-2]:
+                gauss = state[-1]
+            generator.setstate((3, state[:-2], gauss))
+        
+        self._next_index = next_index
+        self._next = next_omino
+        if omino:
+            self._field.set_omino(omino)
+    
+    def press(self, action):
+        """ Carry out the given action, and keep repeating it while its key is
+        held if it is a move.
+        
+        press(int) -> void
+        """
+        
+        field = self._field
+        if action == ROTATE:
+            if field.rotate_omino():
+                self._sound.play_sound_effect(config.SFX_OMINO_ROTATE)
+        elif action == DROP:
+            while field.get_omino():
+                field.move_omino()
+            self._accel_points += 20
+        else:
+            self._keys.press(action)
+            self._move(action, 1)
+    
+    def release(self, action):
+        """ Stop repeating the given action.
+        
+        release(int) -> void
+        """
+        
+        self._keys.release(action)
+    
+    def release_all(self):
+        """ Stop repeating all actions. """
+        
+        self._keys.release_all()
+    
+    def receive(self, lines):
+        """ Queue the given number of garbage lines to be added to the board
+        when its omino next lands.
+        
+        receive(int) -> void
+        """
+        
+        self._garbage += lines
+    
+    def step(self, time, profiler):
+        """ Advance the board by the given number of milliseconds: drop the
+        omino under gravity, and once it has settled clear lines, add any
+        garbage and add the next omino, or stop playing if it doesn't fit.
+        Return the number of garbage lines its clears send to the other boards.
+        
+        step(float, Profiler) -> int
+        """
+        
+        if not self._playing:
+            return 0
+        
+        # Keys held down
+        for action, count in self._keys.step(time):
+            self._move(action, count)
+        
+        # Gravity
+        self._fall_time += time
+        if self._fall_time >= self._droptime:
+            self._fall_time -= self._droptime
+            self._field.move_omino()
+        
+        if self._field.get_omino():
+            return 0
+        
+        profiler.start('lines')
+        lines_cleared = self._field.check()
+        profiler.stop('lines')
+        sent = 0
+        if lines_cleared > 0:
+            self._sound.play_sound_effect(config.SFX_LINE_CLEAR)
+            self._lines += lines_cleared
+            points = lines_cleared * 50
+            sent = lines_cleared - 1
+            if lines_cleared == self._order:
+                points *= 2
+                sent = lines_cleared
+            self._score += points + self._accel_points
+            
+            # Lines sent first cancel out lines waiting to be received
+            cancelled = min(sent, self._garbage)
+            self._garbage -= cancelled
+            sent -= cancelled
+        else:
+            self._sound.play_sound_effect(config.SFX_OMINO_LAND)
+            self._score += self._accel_points
+        
+        if self._garbage:
+            gap = self._field_random.randint(0, self._field.get_size()[0] - 1)
+            if not self._field.add_garbage(self._garbage,
+                                           config.garbage_palette, gap):
+                self._playing = False
+            self._garbage = 0
+        if self._playing and self._field.add_omino(self._next,
+                                                   self._field_random):
+            self._next = self._choose_omino()
+            self._pieces += 1
+            self._fall_time = 0
+            self._accel_points = 0
+        else:
+            self._playing = False
+            self._keys.release_all()
+        return sent
+    
+    def _move(self, action, count):
+        """ Move the omino count times in the direction of the given action,
+        stopping early if it is blocked. A count of -1 moves it as far as it
+        will go.
+        
+        _move(int, int) -> void
+        """
+        
+        direction = {DOWN: 0, LEFT: 1, RIGHT: 2}[action]
+        moved = 0
+        while moved != count and self._field.move_omino(direction):
+            moved += 1
+        if direction == 0:
+            self._accel_points += moved
+        elif moved:
+            self._sound.play_sound_effect(config.SFX_OMINO_MOVE)
+    
+    def _choose_omino(self):
+        """ Choose a random omino from the board's piece source and return it.
+        Its index is kept as the index of the next omino.
+        
+        _choose_omino() -> Omino
+        """
+        
+        x = self._random.randint(0, len(self._ominoes) - 1)
+        self._next_index = x
+        return Omino(self._ominoes[x], self._colours[x],
+                     self._random.randint(0, 3))
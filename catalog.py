@@ -0,0 +1,303 @@
+""" catalog.py: Contains the Shape_Catalog and Shape_View classes. """
+
+
+import array
+
+from omino import *
+from helpers import *
+
+
+# Array typecodes tried in turn for the smallest one a row of blocks fits in
+_typecodes = 'BHIL'
+
+
+class Shape_Catalog:
+    
+    """ A class storing every polyomino shape of an order, in all four of its
+    rotations, packed into arrays instead of lists of lists. Each row of a
+    shape is one integer whose bits are the blocks of the row, so a shape
+    takes a few bytes rather than a list for every row of it. The pivot and
+    rotation offsets of each shape are found once and kept the same way, so
+    ominoes made from the catalog's shapes don't have to find them again.
+    
+    Indexing the catalog gives views of its shapes which can be used wherever
+    a list<list<bool>> shape can be read, including to make an Omino. A shape's
+    rows are only turned back into booleans the first time one of its views
+    is made, and are then kept, as tuples, for as long as the catalog. Every
+    row with the same blocks is the same tuple, so this costs little more than
+    the arrays. """
+    
+    def __init__(self, shapes):
+        """ Create a catalog of the given shapes, which are square 2D lists of
+        booleans all of the same order.
+        
+        __init__(list<list<list<bool>>>) -> void
+        """
+        
+        self._order = 0
+        if shapes:
+            self._order = len(shapes[0])
+        for typecode in _typecodes:
+            if array.array(typecode).itemsize * 8 >= self._order:
+                break
+        else:
+            raise ValueError('Shapes of order %d are too wide to pack' %
+                             self._order)
+        self._count = len(shapes)
+        # Row bits of shape i in rotation r start at (i * 4 + r) * order
+        self._rows = array.array(typecode)
+        # Pivot then four offsets of shape i start at i * 10, as (x, y) pairs
+        self._points = array.array('b')
+        # The rows of shape i in rotation r as booleans, at i * 4 + r, once
+        # they have been worked out, and the tuple for each row's bits
+        self._blocks = [None] * (self._count * 4)
+        self._lines = {}
+        
+        for shape in shapes:
+            omino = Omino(shape, None, 0)
+            for rotation in xrange(4):
+                for line in omino.get_shape(rotation):
+                    bits = 0
+                    for col, filled in enumerate(line):
+                        if filled:
+                            bits |= 1 << col
+                    self._rows.append(bits)
+            pivot = omino.get_pivot()
+            self._points.extend([pivot.x, pivot.y])
+            for rotation in xrange(4):
+                if pivot == Point(-1, -1):
+                    # The shape doesn't rotate, and so has no offsets
+                    self._points.extend([0, 0])
+                else:
+                    offset = omino.get_offset(rotation)
+                    self._points.extend([offset.x, offset.y])
+    
+    def __len__(self):
+        """ Return the number of shapes in the catalog.
+        
+        __len__() -> int
+        """
+        
+        return self._count
+    
+    def __getitem__(self, index):
+        """ Return a view of the shape at the given index, in its first
+        rotation.
+        
+        __getitem__(int) -> Shape_View
+        """
+        
+        return self.get_shape(index)
+    
+    def __iter__(self):
+        """ Iterate over views of every shape, in their first rotations. """
+        
+        for index in xrange(self._count):
+            yield Shape_View(self, index, 0)
+    
+    def get_order(self):
+        """ Return the order of the catalog's shapes.
+        
+        get_order() -> int
+        """
+        
+        return self._order
+    
+    def get_shape(self, index, rotation=0):
+        """ Return a view of the shape at the given index in the given
+        rotation.
+        
+        get_shape(int, int) -> Shape_View
+        Precondition: rotation is between 0 and 3 inclusive.
+        """
+        
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('Shape index out of range')
+        return Shape_View(self, index, rotation)
+    
+    def get_rows(self, index, rotation=0):
+        """ Return the rows of the shape at the given index in the given
+        rotation as integers, with the leftmost block of a row in its lowest
+        bit.
+        
+        get_rows(int, int) -> tuple<int>
+        Precondition: rotation is between 0 and 3 inclusive.
+        """
+        
+        start = (index * 4 + rotation) * self._order
+        return tuple(self._rows[start:start + self._order])
+    
+    def get_pivot(self, index):
+        """ Return the pivot point of the shape at the given index, which is
+        (-1, -1) if it looks the same in every rotation.
+        
+        get_pivot(int) -> Point
+        """
+        
+        return Point(self._points[index * 10], self._points[index * 10 + 1])
+    
+    def get_offsets(self, index):
+        """ Return the offsets of the shape at the given index for each of its
+        rotations, or None if it doesn't need rotating.
+        
+        get_offsets(int) -> list<Point>
+        """
+        
+        if self.get_pivot(index) == Point(-1, -1):
+            return None
+        start = index * 10 + 2
+        points = self._points
+        return [Point(points[start + i * 2], points[start + i * 2 + 1])
+                for i in xrange(4)]
+    
+    def get_size(self):
+        """ Return the number of bytes the catalog's arrays take up.
+        
+        get_size() -> int
+        """
+        
+        return (len(self._rows) * self._rows.itemsize +
+                len(self._points) * self._points.itemsize)
+    
+    def get_blocks(self, index, rotation):
+        """ Return the blocks of the shape at the given index in the given
+        rotation, as a tuple of rows of booleans.
+        
+        get_blocks(int, int) -> tuple<tuple<bool>>
+        Precondition: rotation is between 0 and 3 inclusive.
+        """
+        
+        blocks = self._blocks[index * 4 + rotation]
+        if blocks == None:
+            lines = self._lines
+            rows = []
+            for bits in self.get_rows(index, rotation):
+                if bits not in lines:
+                    lines[bits] = tuple([bits >> col & 1 == 1
+                                         for col in xrange(self._order)])
+                rows.append(lines[bits])
+            blocks = tuple(rows)
+            self._blocks[index * 4 + rotation] = blocks
+        return blocks
+    
+    def get_row(self, index, rotation, row):
+        """ Return the blocks of the given row of the shape at the given index
+        in the given rotation.
+        
+        get_row(int, int, int) -> tuple<bool>
+        Precondition: rotation is between 0 and 3 inclusive.
+        """
+        
+        return self.get_blocks(index, rotation)[row]
+
+
+class Shape_View:
+    
+    """ A class giving read-only access to one rotation of a shape in a
+    Shape_Catalog, as though it were a square 2D list of booleans. Its rows
+    are the catalog's tuples, so reading one makes nothing new. """
+    
+    def __init__(self, catalog, index, rotation):
+        """ Create a view of the given shape in the given catalog.
+        
+        __init__(Shape_Catalog, int, int) -> void
+        """
+        
+        self._catalog = catalog
+        self._index = index
+        self._rotation = rotation
+        self._blocks = catalog.get_blocks(index, rotation)
+    
+    def __len__(self):
+        """ Return the order of the shape, which is its number of rows.
+        
+        __len__() -> int
+        """
+        
+        return len(self._blocks)
+    
+    def __getitem__(self, row):
+        """ Return the given row of the shape as a tuple of booleans, or a
+        list of rows if given a slice.
+        
+        __getitem__(int) -> tuple<bool>
+        """
+        
+        if isinstance(row, slice):
+            return list(self._blocks[row])
+        return self._blocks[row]
+    
+    def __getslice__(self, first, last):
+        """ Return the rows between first and last as a list of tuples of
+        booleans.
+        
+        __getslice__(int, int) -> list<tuple<bool>>
+        """
+        
+        return self[slice(first, last)]
+    
+    def __iter__(self):
+        """ Iterate over the rows of the shape, top first. """
+        
+        return iter(self._blocks)
+    
+    def __eq__(self, other):
+        """ Return True if the other shape, a view or a 2D list, has the same
+        blocks filled.
+        
+        __eq__(Shape_View/list<list<bool>>) -> bool
+        """
+        
+        try:
+            return [list(line) for line in self] == \
+                   [list(line) for line in other]
+        except TypeError:
+            return False
+    
+    def __ne__(self, other):
+        """ Return True if the other shape has different blocks filled.
+        
+        __ne__(Shape_View/list<list<bool>>) -> bool
+        """
+        
+        return not self == other
+    
+    def __repr__(self):
+        """ Return the shape written as a 2D list.
+        
+        __repr__() -> string
+        """
+        
+        return repr([list(line) for line in self])
+    
+    def get_index(self):
+        """ Return the index of the shape in its catalog.
+        
+        get_index() -> int
+        """
+        
+        return self._index
+    
+    def get_rotations(self):
+        """ Return the blocks of the shape in all four rotations, starting
+        with this one, its pivot point in this rotation and its offset for each
+        rotation (None if it doesn't need rotating), as a triple. The blocks are
+        the catalog's own tuples, so an omino reads them as quickly as lists.
+        
+        get_rotations() -> (list<tuple<tuple<bool>>>, Point, list<Point>)
+        """
+        
+        catalog = self._catalog
+        turn = self._rotation
+        shapes = [catalog.get_blocks(self._index, (turn + rotation) % 4)
+                  for rotation in xrange(4)]
+        pivot = catalog.get_pivot(self._index)
+        offsets = catalog.get_offsets(self._index)
+        if offsets == None:
+            return shapes, pivot, None
+        # Offsets are kept from the first rotation, so move them to this one
+        offsets = [offsets[(turn + rotation) % 4] - offsets[turn]
+                   for rotation in xrange(4)]
+        return shapes, pivot + catalog.get_offsets(self._index)[turn], offsets
@@ -8,7 +8,13 @@ import os
 
 # Resources locations
 resources_dir = 'resources'
+stats_filename = os.path.join(resources_dir, 'stats.db')
+# High scores from before the stats database, imported into it when created
 highscores_filename = os.path.join(resources_dir, 'highscores')
+suspend_filename = os.path.join(resources_dir, 'suspended')
+
+# Number of highscores kept for each order and level
+highscores_length = 10
 font = os.path.join(resources_dir, 'fonts', 'fff_spacedust.ttf')
 music_dir = os.path.join(resources_dir, 'music')
 sfx_dir = os.path.join(resources_dir, 'sfx')
@@ -17,15 +23,104 @@ sfx_filenames = ['menu_move.wav', 'menu_select.wav', 'omino_move.wav',
                  'omino_rotate.wav', 'omino_land.wav', 'line_clear.wav',
                  'pause.wav', 'game_over.wav']
 
+# Each sound effect's priority (when every channel is busy, an effect cuts off
+# the oldest of the lowest priority effects no more important than it) and the
+# shortest time (in ms) allowed between two plays of it
+sfx_priorities = [1, 2, 0, 1, 2, 3, 3, 4]
+sfx_min_intervals = [0, 0, 60, 40, 0, 0, 0, 0]
+
+# Mixer: sample rate, buffer size in samples (smaller means sounds are heard
+# sooner after they're played, but may crackle on slow machines) and how many
+# sound effects can play at once
+mixer_frequency = 22050
+mixer_buffer = 512
+sfx_channels = 4
+
+# Music plays in the order of music_filenames above, or is shuffled each time
+# through if music_shuffle is set
+music_shuffle = False
+
 # How quickly (in ms) omino drops at each difficulty level
 levels = {1: 500, 2: 400, 3: 300, 4: 250, 5: 200, 6: 150, 7: 100, 8: 50, 9: 25}
 
-# How often the event happens (in ms) when a key is held down
-key_repeat_time = 100
+# The game logic runs at this fixed number of ticks per second, independently
+# of how many frames per second are drawn (0 frames per second is unlimited)
+logic_rate = 120
+frame_rate = 60
+
+# The most time (in ms) the game logic will catch up on after a stall
+max_catch_up = 250
+
+# If not 0, every frame advances the game logic by exactly this many ms, no
+# matter how long it really took (used to make benchmarks repeatable)
+fixed_frame_time = 0
+
+# How long (in ms) a key must be held down before it starts repeating, and how
+# often it then repeats (0 to repeat as far as possible at once)
+key_repeat_delay = 100
+key_repeat_rate = 100
+
+# Versus mode: the keys each player uses to rotate, move left, move down, move
+# right and drop (by the names of the pygame K_ constants, without the K_), and
+# the palette of the garbage lines sent to the other players
+versus_keys = [('w', 'a', 's', 'd', 'lshift'),
+               ('up', 'left', 'down', 'right', 'rshift'),
+               ('i', 'j', 'k', 'l', 'u'),
+               ('kp8', 'kp4', 'kp5', 'kp6', 'kp0')]
+garbage_palette = ((128, 128, 128), (192, 192, 192), (64, 64, 64))
+
+# Network play: the port a server listens on, how often (in ms) the server
+# sends the boards to its clients and the clients send their keys, and how many
+# sent boards the server keeps to send just the changed rows against. The
+# loopback test (--netplay) pretends the network delays packets by latency ms,
+# plus up to jitter ms more, and loses the given fraction of them
+net_port = 7482
+net_send_interval = 50
+net_history = 64
+net_latency = 40
+net_jitter = 20
+net_loss = 0.1
 
 # The size (in pixels) of the omino blocks at each order
 sizes = {1: 21, 2: 21, 3: 21, 4: 21, 5: 14, 6: 14}
 
+# Maximum number of rendered text surfaces kept for reuse
+text_cache_size = 1024
+
+# Maximum number of pre-drawn polyomino thumbnails kept, and how many are
+# drawn ahead of time each frame for the selected order
+thumbnail_cache_size = 512
+thumbnails_per_frame = 4
+
+# The cycling highlight colour moves through hue in steps of this many degrees,
+# so only 360 / cycle_hue_step distinct colours (and cached texts) ever exist
+cycle_hue_step = 3
+
+# Profiling: whether each phase of each frame is timed, whether the timings
+# are shown on screen, how many frames they are kept for, how long (in ms) a
+# frame must take to be recorded as a hitch, and how often (in seconds, 0 for
+# never) a report is written to the profile file (.json for JSON, else CSV)
+profile = False
+profile_hud = False
+profile_window = 300
+profile_hitch_time = 25
+profile_max_hitches = 100
+profile_dump_interval = 10
+profile_filename = 'profile.csv'
+
+# The most time (in ms) it should take from starting to showing a first frame
+first_frame_budget = 250
+
+# Memory tracking: whether the resident memory and the live objects of each
+# type are counted whenever the application enters the menu, a game or the game
+# over screen, and how many of the types which grew the most are written to the
+# memory file on exit. A soak test fails if resident memory grows by more than
+# soak_max_growth KB between the first and last quarters of its games
+memory_tracking = False
+memory_report_top = 15
+memory_filename = 'memory.txt'
+soak_max_growth = 4096
+
 # Text
 names = {1: 'monomino', 2: 'domino', 3: 'tromino',
          4: 'tetromino', 5: 'pentomino', 6: 'hexomino'}
@@ -45,13 +140,9 @@ SFX_PAUSE = 6
 SFX_GAME_OVER = 7
 
 # Custom events
-EVENT_FALL = 24
+EVENT_RANDOM_OMINO = 24
 EVENT_MUSIC_STOP = 25
-EVENT_MOVE_LEFT = 26
-EVENT_MOVE_RIGHT = 27
-EVENT_MOVE_DOWN = 28
-CUSTOM_EVENTS = [EVENT_FALL, EVENT_MUSIC_STOP, EVENT_MOVE_LEFT,
-                 EVENT_MOVE_RIGHT, EVENT_MOVE_DOWN]
+CUSTOM_EVENTS = [EVENT_RANDOM_OMINO, EVENT_MUSIC_STOP]
 
 # Application state
 GS_MENU = 0
@@ -62,22 +153,31 @@ GS_GAME = 4
 GS_GAME_PAUSED = 5
 GS_GAME_OVER = 6
 GS_MENU_ENTER_HIGHSCORE = 7
+GS_VERSUS = 8
+GS_VERSUS_PAUSED = 9
+GS_VERSUS_OVER = 10
 
-# Which class (Game or Menu) handles each application state
-GAME_STATES = [GS_GAME, GS_GAME_PAUSED, GS_GAME_OVER]
+# Which class (Game or Versus, or Menu) handles each application state
+VERSUS_STATES = [GS_VERSUS, GS_VERSUS_PAUSED, GS_VERSUS_OVER]
+GAME_STATES = [GS_GAME, GS_GAME_PAUSED, GS_GAME_OVER] + VERSUS_STATES
 MENU_STATES = [GS_MENU, GS_MENU_HIGHSCORES, GS_MENU_HELP,
                GS_MENU_ENTER_HIGHSCORE]
 
+# The states at which memory is tracked, and their names in the memory report
+MEMORY_STATES = {GS_MENU: 'menu', GS_GAME: 'game', GS_GAME_OVER: 'game over',
+                 GS_VERSUS: 'versus'}
+
 # Menu selections
-MENU_LENGTH = 8  # Number of selections
+MENU_LENGTH = 9  # Number of selections
 MENU_START = 0
 MENU_HIGHSCORES = 1
 MENU_HELP = 2
 MENU_QUIT = 3
 MENU_LEVEL = 4
 MENU_ORDER = 5
-MENU_SFX = 6
-MENU_MUSIC = 7
+MENU_PLAYERS = 6
+MENU_SFX = 7
+MENU_MUSIC = 8
 
 # Button states
 TXT_NORMAL = 0
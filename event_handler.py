@@ -2,6 +2,9 @@
 """ event_handler.py: Contains the Event_Handler class. """
 
 
+import random
+
+import pygame.constants
 from pygame.constants import *
 
 import config
@@ -18,8 +21,18 @@ class Event_Handler:
         """
         
         self._pygame = pygame
-        self._filter = [KEYDOWN, KEYUP, QUIT]
+        self._filter = [KEYDOWN, KEYUP, QUIT, VIDEOEXPOSE, ACTIVEEVENT]
         self._filter.extend(config.CUSTOM_EVENTS)
+        self._handlers = {}
+        self._always = {}   # Handlers for every state, by event type
+        self._script = None
+        self._recording = None
+        self._recorded = None
+        self._frame = 0
+        
+        # Only let the events we use onto the queue in the first place
+        self._pygame.event.set_blocked(None)
+        self._pygame.event.set_allowed(self._filter)
     
     def clear_queue(self):
         """ Clear the events queue. """
@@ -28,9 +41,408 @@ class Event_Handler:
     
     def get_events(self):
         """ Return all events which have occured since the method
-        was last called, as a list. Events not useful are filtered out.
+        was last called, as a list. Events not useful are never queued.
         
         get_events() -> list<pygame.event>
         """
         
-        return [e for e in self._pygame.event.get() if e.type in self._filter]
+        self._frame += 1
+        events = self._pygame.event.get()
+        if self._recording != None:
+            for event in events:
+                if event.type in [KEYDOWN, KEYUP]:
+                    self._recording.add_event(self._frame, event.type,
+                                              event.key)
+        if self._script != None:
+            Event = self._pygame.event.Event
+            for event_type, key in self._script.get_events(self._frame):
+                events.append(Event(event_type, key=key))
+            if self._frame >= self._script.get_length():
+                events.append(Event(QUIT))
+        return events
+    
+    def set_script(self, script):
+        """ Feed the events of the given input script in along with real
+        events, one frame of the script per call of get_events, and then a
+        quit event once the script has ended.
+        
+        set_script(Input_Script) -> void
+        """
+        
+        self._script = script
+        self._frame = 0
+    
+    def get_frame_time(self, measured):
+        """ Return the time (in ms) the logic should be stepped by for the
+        frame whose events were last got: the time recorded for the frame if a
+        script with frame times is being fed in, otherwise the given measured
+        time, which is recorded if recording.
+        
+        get_frame_time(float) -> float
+        """
+        
+        if self._script != None:
+            recorded = self._script.get_frame_time(self._frame)
+            if recorded != None:
+                return recorded
+        if self._recording != None:
+            self._recording.set_frame_time(self._frame, measured)
+        return measured
+    
+    def start_recording(self, seed, order, level):
+        """ Start recording key events and frame times for a game of the given
+        order and level, whose ominoes are chosen from the given seed, so that
+        they can be saved as a script which replays the game.
+        
+        start_recording(int, int, int) -> void
+        """
+        
+        self._recording = Input_Script([], 0, seed, order, level)
+        self._frame = 0
+    
+    def stop_recording(self):
+        """ Stop recording, keeping what was recorded to be saved. Does nothing
+        if not recording. """
+        
+        if self._recording == None:
+            return
+        # One frame more, so the last recorded keys are handled before the
+        # script's quit event when it is replayed
+        self._recording.set_length(self._frame + 1)
+        self._recorded = self._recording
+        self._recording = None
+    
+    def save_recording(self, filename):
+        """ Save the last recording as an input script file. Return False if
+        nothing was recorded.
+        
+        save_recording(string) -> bool
+        """
+        
+        self.stop_recording()
+        if self._recorded == None:
+            return False
+        self._recorded.save(filename)
+        return True
+    
+    def register(self, states, event_type, key, handler):
+        """ Register handler to be called with events of the given type while
+        the application is in any of the given states. For key events, key is
+        the key the handler is for, or None if it handles every key.
+        
+        register(list<int>, int, int, function) -> void
+        """
+        
+        for state in states:
+            self._handlers[(state, event_type, key)] = handler
+    
+    def register_always(self, event_type, handler):
+        """ Register handler to be called with events of the given type
+        whatever state the application is in. Such handlers come before those
+        registered for a state, and aren't removed by unregister.
+        
+        register_always(int, function) -> void
+        """
+        
+        self._always[event_type] = handler
+    
+    def unregister(self, states):
+        """ Remove all handlers registered for any of the given states.
+        
+        unregister(list<int>) -> void
+        """
+        
+        for lookup in self._handlers.keys():
+            if lookup[0] in states:
+                del self._handlers[lookup]
+    
+    def dispatch(self, state, event):
+        """ Call the handler registered for the given event in the given state,
+        if there is one, with the event. Return True if the event was handled.
+        
+        dispatch(int, pygame.event) -> bool
+        """
+        
+        handler = self._always.get(event.type)
+        if handler != None:
+            handler(event)
+            return True
+        key = getattr(event, 'key', None)
+        handler = self._handlers.get((state, event.type, key))
+        if handler == None and key != None:
+            handler = self._handlers.get((state, event.type, None))
+        if handler == None:
+            return False
+        handler(event)
+        return True
+
+
+class Key_Repeat:
+    
+    """ A class for working out when held keys should auto-repeat. A key held
+    for longer than the delay repeats once every rate milliseconds, or if the
+    rate is 0, repeats as many times as possible at once. Time is advanced by
+    the game logic, so repeats happen in step with it. """
+    
+    def __init__(self, delay, rate):
+        """ Initialise with the given delay and rate in milliseconds.
+        
+        __init__(int, int) -> void
+        """
+        
+        self._delay = delay
+        self._rate = rate
+        self._held = {}   # Time in ms until each held key next repeats
+    
+    def press(self, key):
+        """ Start tracking the given key as held down.
+        
+        press(int) -> void
+        """
+        
+        self._held[key] = self._delay
+    
+    def release(self, key):
+        """ Stop tracking the given key.
+        
+        release(int) -> void
+        """
+        
+        self._held.pop(key, None)
+    
+    def release_all(self):
+        """ Stop tracking all keys. """
+        
+        self._held.clear()
+    
+    def step(self, time):
+        """ Advance time by the given number of milliseconds and return a list
+        of the held keys which repeat, paired with how many times they repeat.
+        A count of -1 means the key should repeat as many times as possible.
+        
+        step(float) -> list<(int, int)>
+        """
+        
+        repeats = []
+        for key, remaining in self._held.items():
+            remaining -= time
+            if remaining > 0:
+                self._held[key] = remaining
+            elif self._rate == 0:
+                self._held[key] = 0
+                repeats.append((key, -1))
+            else:
+                count = 1 + int(-remaining // self._rate)
+                self._held[key] = remaining + count * self._rate
+                repeats.append((key, count))
+        return repeats
+
+
+class Input_Script:
+    
+    """ A class for a scripted sequence of key presses and releases, each
+    happening on a given frame, used to drive the application without a
+    player for benchmarks and replays. A script recorded from a game also
+    holds the game's seed, order and level, and the time each frame covered.
+    Scripts are saved as text files with one event per line, of the form
+    '<frame> down|up <key name>', or '<frame> time <ms>' for the frames whose
+    time differs from the frame before, after a header of 'length', 'seed',
+    'order' and 'level' lines. """
+    
+    def __init__(self, events, length, seed=None, order=None, level=None):
+        """ Initialise with the given list of (frame, event type, key) triples
+        and length in frames, and if the script replays a game, the game's
+        seed, order and level.
+        
+        __init__(list<(int, int, int)>, int, int, int, int) -> void
+        """
+        
+        self._length = length
+        self._seed = seed
+        self._order = order
+        self._level = level
+        self._events = {}
+        self._times = {}
+        for frame, event_type, key in events:
+            self.add_event(frame, event_type, key)
+    
+    def add_event(self, frame, event_type, key):
+        """ Add an event of the given type for the given key on the given
+        frame.
+        
+        add_event(int, int, int) -> void
+        """
+        
+        self._events.setdefault(frame, []).append((event_type, key))
+    
+    def set_frame_time(self, frame, time):
+        """ Set the time (in ms) the given frame covers.
+        
+        set_frame_time(int, float) -> void
+        """
+        
+        self._times[frame] = time
+    
+    def get_frame_time(self, frame):
+        """ Return the time (in ms) the given frame covers, or None if the
+        script doesn't say.
+        
+        get_frame_time(int) -> float
+        """
+        
+        return self._times.get(frame)
+    
+    def set_length(self, length):
+        """ Set the number of frames the script lasts for.
+        
+        set_length(int) -> void
+        """
+        
+        self._length = length
+    
+    def get_seed(self):
+        """ Return the seed of the game the script replays, or None if it
+        doesn't replay one.
+        
+        get_seed() -> int
+        """
+        
+        return self._seed
+    
+    def get_order(self):
+        """ Return the order of the game the script replays, or None if it
+        doesn't replay one.
+        
+        get_order() -> int
+        """
+        
+        return self._order
+    
+    def get_level(self):
+        """ Return the level of the game the script replays, or None if it
+        doesn't replay one.
+        
+        get_level() -> int
+        """
+        
+        return self._level
+    
+    def get_length(self):
+        """ Return the number of frames the script lasts for.
+        
+        get_length() -> int
+        """
+        
+        return self._length
+    
+    def get_events(self, frame):
+        """ Return the (event type, key) pairs which happen on the given frame.
+        
+        get_events(int) -> list<(int, int)>
+        """
+        
+        return self._events.get(frame, [])
+    
+    def save(self, filename):
+        """ Save the script to the given file.
+        
+        save(string) -> void
+        """
+        
+        names = {KEYDOWN: 'down', KEYUP: 'up'}
+        file_handle = open(filename, 'w')
+        file_handle.write('length %d\n' % self._length)
+        for name, value in [('seed', self._seed), ('order', self._order),
+                            ('level', self._level)]:
+            if value != None:
+                file_handle.write('%s %d\n' % (name, value))
+        time = None
+        for frame in sorted(set(self._events.keys()) | set(self._times)):
+            if frame in self._times and self._times[frame] != time:
+                time = self._times[frame]
+                file_handle.write('%d time %r\n' % (frame, time))
+            for event_type, key in self._events.get(frame, []):
+                file_handle.write('%d %s %s\n' % (frame, names[event_type],
+                                                  _key_name(key)))
+        file_handle.close()
+
+
+def load_script(filename):
+    """ Load and return the input script saved in the given file.
+    
+    load_script(string) -> Input_Script
+    """
+    
+    types = {'down': KEYDOWN, 'up': KEYUP}
+    events = []
+    times = {}
+    header = {'length': 0, 'seed': None, 'order': None, 'level': None}
+    file_handle = open(filename, 'r')
+    for line in file_handle:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] in header:
+            header[words[0]] = int(words[1])
+            continue
+        frame, event_type, name = words
+        frame = int(frame)
+        if event_type == 'time':
+            times[frame] = float(name)
+        else:
+            events.append((frame, types[event_type], key_code(name)))
+        header['length'] = max(header['length'], frame)
+    file_handle.close()
+    
+    script = Input_Script(events, header['length'], header['seed'],
+                          header['order'], header['level'])
+    # Each time lasts until the next one given
+    time = None
+    for frame in xrange(header['length'] + 1):
+        time = times.get(frame, time)
+        if time != None:
+            script.set_frame_time(frame, time)
+    return script
+
+def random_script(frames, seed=None):
+    """ Return an input script of the given length in which game keys are
+    pressed and released at random, as a stand-in for a player. Return is
+    pressed now and then to get past the game over screen.
+    
+    random_script(int, int) -> Input_Script
+    """
+    
+    rng = random.Random(seed)
+    keys = [K_LEFT, K_LEFT, K_RIGHT, K_RIGHT, K_UP, K_DOWN, K_SPACE, K_RETURN]
+    events = []
+    frame = 1
+    while frame < frames:
+        key = rng.choice(keys)
+        held = rng.randint(1, 20)
+        events.append((frame, KEYDOWN, key))
+        events.append((min(frame + held, frames - 1), KEYUP, key))
+        frame += held + rng.randint(1, 10)
+    return Input_Script(events, frames)
+
+def _key_name(key):
+    """ Return the name used for the given key code in script files.
+    
+    _key_name(int) -> string
+    """
+    
+    for name in dir(pygame.constants):
+        if name.startswith('K_') and getattr(pygame.constants, name) == key:
+            return name[2:].lower()
+    return str(key)
+
+def key_code(name):
+    """ Return the key code for the given key name, as used in script files
+    and the config file.
+    
+    key_code(string) -> int
+    """
+    
+    for constant in ['K_' + name, 'K_' + name.upper()]:
+        if hasattr(pygame.constants, constant):
+            return getattr(pygame.constants, constant)
+    return int(name)
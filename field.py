@@ -2,8 +2,8 @@
 """ field.py: Contains the Field class. """
 
 
-import random
 import copy
+import struct
 
 from helpers import *
 
@@ -12,7 +12,8 @@ class Field:
     
     """ A class representing the game's playing field which is a grid
     of blocks and a moving omino. The grid is a 2D list of pairs of the form
-    (bool, (int, int, int)) representing block on/off and block RGB colour
+    (bool, ((int, int, int), (int, int, int), (int, int, int))) representing
+    block on/off and block palette (RGB colour, highlight and shadow colours)
     respectively.
     """
     
@@ -28,6 +29,7 @@ class Field:
         self._order = order
         self._grid = rect_list(width, height, (False, (0, 0, 0)))
         self._omino = None
+        self._version = 0
     
     def get_size(self):
         """ Return a pair giving the width and height of the field.
@@ -37,11 +39,31 @@ class Field:
         
         return (self._width, self._height)
     
+    def get_grid(self):
+        """ Return the grid of settled blocks, without the moving omino. The
+        returned grid is the field's own and must not be modified.
+        
+        get_grid() ->
+            list<list<(bool, ((int, int, int), (int, int, int), (int, int, int)))>>
+        """
+        
+        return self._grid
+    
+    def get_version(self):
+        """ Return a number which changes every time the settled blocks of the
+        grid change, ie. when an omino is baked in or lines are cleared.
+        
+        get_version() -> int
+        """
+        
+        return self._version
+    
     def get_complete_grid(self):
         """ Return a copy of the grid with the currently moving omino baked
         into it.
         
-        get_complete_grid() -> list<list<(bool, (int, int, int))>>
+        get_complete_grid() ->
+            list<list<(bool, ((int, int, int), (int, int, int), (int, int, int)))>>
         """
         
         if self._omino == None:
@@ -68,13 +90,104 @@ class Field:
         
         return self._omino
     
-    def add_omino(self, omino):
+    def set_omino(self, omino):
+        """ Put the given omino into the field where it is, replacing any
+        moving omino, without dropping it in from the top.
+        
+        set_omino(Omino) -> void
+        Precondition: The omino has a location, and doesn't collide there.
+        """
+        
+        self._omino = omino
+    
+    def set_line(self, row, line):
+        """ Replace the given row of settled blocks with the given line of
+        (on/off, palette) pairs.
+        
+        set_line(int, list<(bool, ((int, int, int), (int, int, int),
+                                   (int, int, int)))>) -> void
+        """
+        
+        self._grid[row] = line
+        self._version += 1
+    
+    def add_garbage(self, count, palette, gap):
+        """ Push the settled blocks up by count rows, filling the rows left
+        at the bottom with blocks of the given palette in every column but the
+        gap column. Return False if any blocks were pushed out of the top of
+        the grid.
+        
+        add_garbage(int, ((int, int, int), (int, int, int), (int, int, int)),
+                    int) -> bool
+        """
+        
+        count = min(count, self._height)
+        overflow = False
+        for row in self._grid[:count]:
+            if [n[0] for n in row].count(True):
+                overflow = True
+        del self._grid[:count]
+        for i in xrange(count):
+            row = [(True, palette)] * self._width
+            row[gap] = (False, (0, 0, 0))
+            self._grid.append(row)
+        self._version += 1
+        return not overflow
+    
+    def pack(self, indices):
+        """ Return the settled blocks of the grid packed into a string: a bit
+        for each block saying if it is filled, row by row, followed by the
+        number of each filled block's palette in the given dictionary (two
+        bytes each, in the same order). The moving omino is not included.
+        
+        pack(dict<((int, int, int), (int, int, int), (int, int, int)):int>)
+            -> string
+        """
+        
+        bits = bytearray((self._width * self._height + 7) // 8)
+        palettes = []
+        i = 0
+        for row in self._grid:
+            for filled, palette in row:
+                if filled:
+                    bits[i >> 3] |= 0x80 >> (i & 7)
+                    palettes.append(indices[palette])
+                i += 1
+        return str(bits) + struct.pack('<%dH' % len(palettes), *palettes)
+    
+    def unpack(self, data, palettes):
+        """ Replace the settled blocks of the grid with those packed into the
+        given string by pack, using the given list of palettes to look up each
+        block's palette number. Return the number of bytes of data used.
+        
+        unpack(string, list<((int, int, int), (int, int, int), (int, int, int))>)
+            -> int
+        Precondition: The data was packed from a field of the same size.
+        """
+        
+        size = (self._width * self._height + 7) // 8
+        bits = bytearray(data[:size])
+        filled = [i for i in xrange(self._width * self._height)
+                  if bits[i >> 3] & (0x80 >> (i & 7))]
+        end = size + 2 * len(filled)
+        indices = struct.unpack('<%dH' % len(filled), data[size:end])
+        
+        self._grid = rect_list(self._width, self._height, (False, (0, 0, 0)))
+        for i, index in zip(filled, indices):
+            self._grid[i // self._width][i % self._width] = \
+                (True, palettes[index])
+        self._version += 1
+        return end
+    
+    def add_omino(self, omino, rng):
         """ Drop the given omino into the top of the grid. Return False if
         the block cannot be added (in any rotation) because others are in
         the way. If there is already a moving omino the field if will be
-        replaced.
+        replaced. If the omino only fits in other rotations, one of them is
+        picked with the given random number generator, so that games played
+        from the same seed stay the same.
         
-        add_omino(Omino) -> bool
+        add_omino(Omino, random.Random) -> bool
         """
         
         self._omino = omino
@@ -99,7 +212,7 @@ class Field:
                 self._omino = None
                 return False
             else:
-                random.shuffle(rotations)
+                rng.shuffle(rotations)
                 self._omino.move(location)
                 self._omino.rotate(rotations[0])
                 return True
@@ -126,6 +239,7 @@ class Field:
                 # Hit the ground or a stale block, so bake omino into the grid
                 self._grid = self.get_complete_grid()
                 self._omino = None
+                self._version += 1
                 return False
             else:
                 self._omino.move(new_location)
@@ -192,6 +306,7 @@ class Field:
                 for above_row in xrange(row, 0, -1):
                     for column in xrange(self._width):
                         self._grid[above_row][column] = self._grid[above_row - 1][column]
+            self._version += 1
         return len(full_lines)
     
     def _check_collision(self, location, rotation=None):
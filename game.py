@@ -3,53 +3,63 @@
 
 
 import random
+import struct
 import pygame.constants as constants
 import pygame.time
 import pygame.event
 
 import config
-from field import *
+from board import *
 from generator import *
-from omino import *
+
+
+# A saved game is this header, then the game's board (see Board.save). The
+# header is: magic, format version, order, level, seed and play time. Ominoes
+# are saved by their index in the list of their order, which is generated the
+# same every time (see Generator.generate)
+SNAPSHOT_MAGIC = 'POLY'
+SNAPSHOT_VERSION = 3
+_snapshot_header = struct.Struct('<4sBBBId')
+
+# The action each of the game's keys takes on its board
+_actions = {constants.K_UP: ROTATE, constants.K_LEFT: LEFT,
+            constants.K_DOWN: DOWN, constants.K_RIGHT: RIGHT,
+            constants.K_SPACE: DROP}
 
 
 class Game:
     
     """ The game class which handles the application while in the game. """
     
-    def __init__(self, master, view, event_handler, sound, level, order, ominoes):
+    def __init__(self, master, view, event_handler, sound, level, order, ominoes,
+                 seed=None):
         """ Initialise a new game with the given level and order, and given
-        list of ominoes.
+        list of ominoes. The ominoes are chosen at random from the given seed,
+        or from a random one if it isn't given.
         
         __init__(Ominohs, View, Event_Handler, Sound, int, int,
-                 (list<list<list<bool>>>, list<(int, int, int)>)) -> void
+                 (list<list<list<bool>>>,
+                  list<((int, int, int), (int, int, int), (int, int, int))>),
+                 int) -> void
         """
         
         self._master = master
+        self._profiler = master.get_profiler()
         self._view = view
         self._events = event_handler
         self._sound = sound
         self._order = order
         self._level = level
+        self._play_time = 0
         
-        self._score = 0
-        self._lines = 0
-        
-        if order < 5:
-            width = 10
-            height = 20
-        else:
-            width = 15
-            height = 30
-        self._field = Field(order, width, height)
-        
-        self._droptime = config.levels[self._level]
-        
-        self._ominoes = ominoes[0]
-        self._colours = ominoes[1]
-        
-        self._next = self._choose_omino()
+        if seed == None:
+            seed = random.randint(0, 2 ** 31 - 1)
+        self._seed = seed
+        self._board = Board(sound, level, order, ominoes, seed)
         
+        self._running = False
+        self._result = None
+        self._restored = False
         self._state = None
     
     def get_order(self):
@@ -60,13 +70,21 @@ class Game:
         
         return self._order
     
+    def get_level(self):
+        """ Return the difficulty level of the game.
+        
+        get_level() -> int
+        """
+        
+        return self._level
+    
     def get_score(self):
         """ Return the current score.
         
         get_score() -> int
         """
         
-        return self._score
+        return self._board.get_score()
     
     def get_lines_cleared(self):
         """ Return the number of lines cleared in the game.
@@ -74,7 +92,32 @@ class Game:
         get_lines_cleared() -> int
         """
         
-        return self._lines
+        return self._board.get_lines_cleared()
+    
+    def get_pieces(self):
+        """ Return the number of ominoes which have been played in the game.
+        
+        get_pieces() -> int
+        """
+        
+        return self._board.get_pieces()
+    
+    def get_play_time(self):
+        """ Return how long (in ms) the game has been played for, not counting
+        time spent paused or on the game over screen.
+        
+        get_play_time() -> float
+        """
+        
+        return self._play_time
+    
+    def get_seed(self):
+        """ Return the seed the game's ominoes are chosen from.
+        
+        get_seed() -> int
+        """
+        
+        return self._seed
     
     def get_field(self):
         """ Return the field object associated with the game.
@@ -82,7 +125,16 @@ class Game:
         get_field() -> Field
         """
         
-        return self._field
+        return self._board.get_field()
+    
+    def get_next_index(self):
+        """ Return the index in the game's list of ominoes of the omino that
+        is coming up next.
+        
+        get_next_index() -> int
+        """
+        
+        return self._board.get_next_index()
     
     def get_next_omino(self):
         """ Return the omino that is coming up next.
@@ -90,7 +142,37 @@ class Game:
         get_next_omino() -> Omino
         """
         
-        return self._next
+        return self._board.get_next_omino()
+    
+    def save(self):
+        """ Return a compact binary snapshot of the game, which a new game of
+        the same order and level can be restored from.
+        
+        save() -> string
+        """
+        
+        header = _snapshot_header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                       self._order, self._level, self._seed,
+                                       self._play_time)
+        return header + self._board.save()
+    
+    def restore(self, data):
+        """ Restore the game from a snapshot returned by save. The game then
+        carries on from where the snapshot was taken when its loop is run.
+        
+        restore(string) -> void
+        Precondition: The game has the snapshot's order and level (see
+        read_snapshot), and its loop hasn't been run.
+        """
+        
+        try:
+            seed, play_time = _snapshot_header.unpack_from(data)[4:]
+        except struct.error, error:
+            raise ValueError('Corrupt snapshot: ' + str(error))
+        self._board.restore(data[_snapshot_header.size:])
+        self._seed = seed
+        self._play_time = play_time
+        self._restored = True
     
     def change_state(self, state):
         """ Change the state of the game.
@@ -112,142 +194,173 @@ class Game:
         clock = pygame.time.Clock()
         self._events.clear_queue()
         
-        self._field.add_omino(self._next)
-        self._next = self._choose_omino()
-        
-        pygame.time.set_timer(config.EVENT_FALL, self._droptime)        
-        accel_points = 0
+        if not self._restored:
+            self._board.start()
         
         self._sound.play_next()
         
-        loop = True
-        while loop == True:
+        # The game logic is stepped in fixed ticks, as many as the time since
+        # the last frame covers, independently of how often frames are drawn
+        tick_time = 1000.0 / config.logic_rate
+        lag = 0.0
+        previous = pygame.time.get_ticks()
+        
+        self._register_handlers()
+        profiler = self._profiler
+        self._running = True
+        while self._running:
+            
+            profiler.begin_frame()
+            if config.fixed_frame_time:
+                elapsed = config.fixed_frame_time
+            else:
+                now = pygame.time.get_ticks()
+                elapsed = now - previous
+                previous = now
             
             # Events
-            for event in self._events.get_events():
-                
-                # Music stopped
-                if event.type == config.EVENT_MUSIC_STOP:
-                    self._sound.play_next()
-                
-                # In game
-                if self._state == config.GS_GAME:
-                    
-                    if event.type == constants.KEYDOWN:
-                        if event.key == constants.K_UP:
-                            # Rotate
-                            if self._field.rotate_omino():
-                                self._sound.play_sound_effect(config.SFX_OMINO_ROTATE)
-                        elif event.key == constants.K_LEFT:
-                            # Move left
-                            pygame.time.set_timer(config.EVENT_MOVE_LEFT,
-                                                  config.key_repeat_time)
-                            if self._field.move_omino(1):
-                                self._sound.play_sound_effect(config.SFX_OMINO_MOVE)
-                        elif event.key == constants.K_RIGHT:
-                            # Move right
-                            pygame.time.set_timer(config.EVENT_MOVE_RIGHT,
-                                                  config.key_repeat_time)
-                            if self._field.move_omino(2):
-                                self._sound.play_sound_effect(config.SFX_OMINO_MOVE)
-                        elif event.key == constants.K_DOWN:
-                            # Move down
-                            pygame.time.set_timer(config.EVENT_MOVE_DOWN,
-                                                  config.key_repeat_time)
-                            if self._field.move_omino():
-                                accel_points += 1
-                        elif event.key == constants.K_ESCAPE:
-                            # Pause
-                            self._sound.play_sound_effect(config.SFX_PAUSE)
-                            pygame.time.set_timer(config.EVENT_FALL, 0)
-                            self._master.change_state(config.GS_GAME_PAUSED)
-                        elif event.key == constants.K_SPACE:
-                            # Drop
-                            while self._field.get_omino():
-                                self._field.move_omino()
-                            accel_points += 20
-                    
-                    elif event.type == constants.KEYUP:
-                        if event.key == constants.K_LEFT:
-                            pygame.time.set_timer(config.EVENT_MOVE_LEFT, 0)
-                        elif event.key == constants.K_RIGHT:
-                            pygame.time.set_timer(config.EVENT_MOVE_RIGHT, 0)
-                        elif event.key == constants.K_DOWN:
-                            pygame.time.set_timer(config.EVENT_MOVE_DOWN, 0)
-                    
-                    elif event.type == config.EVENT_FALL:
-                        self._field.move_omino()
-                    
-                    # Keys held down
-                    elif event.type == config.EVENT_MOVE_LEFT:
-                        if self._field.move_omino(1):
-                            self._sound.play_sound_effect(config.SFX_OMINO_MOVE)
-                    elif event.type == config.EVENT_MOVE_RIGHT:
-                        if self._field.move_omino(2):
-                            self._sound.play_sound_effect(config.SFX_OMINO_MOVE)
-                    elif event.type == config.EVENT_MOVE_DOWN:
-                        if self._field.move_omino():
-                                accel_points += 1
-                
-                # Game paused
-                elif self._state == config.GS_GAME_PAUSED:
-                    if event.type == constants.KEYDOWN:
-                        if event.key == constants.K_ESCAPE:
-                            # Un-pause
-                            pygame.time.set_timer(config.EVENT_FALL, 500)
-                            self._master.change_state(config.GS_GAME)
-                        elif event.key == constants.K_y:
-                            # Quit back to menu
-                            self._sound.stop_music()
-                            return -1
-                
-                # Game over screen
-                elif self._state == config.GS_GAME_OVER:
-                    if event.type == constants.KEYDOWN:
-                        if event.key == constants.K_RETURN:
-                            loop = False
-                
-                if event.type == constants.QUIT:
-                    return None
+            profiler.start('events')
+            events = self._events.get_events()
+            profiler.stop('events')
+            profiler.start('dispatch')
+            for event in events:
+                self._events.dispatch(self._state, event)
+                if not self._running:
+                    break
+            profiler.stop('dispatch')
+            if not self._running:
+                break
             
-            # Handle the omino being settled and either game over or new omino
-            if self._state == config.GS_GAME:
-                if not self._field.get_omino():
-                    lines_cleared = self._field.check()
-                    if lines_cleared > 0:
-                        self._sound.play_sound_effect(config.SFX_LINE_CLEAR)
-                        self._lines += lines_cleared
-                        points = lines_cleared * 50
-                        if lines_cleared == self._order:
-                            points *= 2
-                        points += accel_points
-                        self._score += points
-                    else:
-                        self._sound.play_sound_effect(config.SFX_OMINO_LAND)
-                        self._score += accel_points
-                    if self._field.add_omino(self._next):
-                        self._next = self._choose_omino()
-                        pygame.time.set_timer(config.EVENT_FALL, self._droptime)
-                        accel_points = 0
-                    else:
-                        # Game over
-                        self._sound.stop_music()
-                        self._sound.play_sound_effect(config.SFX_GAME_OVER)
-                        pygame.time.set_timer(config.EVENT_FALL, 0)
-                        self._master.change_state(config.GS_GAME_OVER)
+            # Frame times are recorded and replayed along with the keys, so
+            # that replays step the game exactly as it was played
+            elapsed = self._events.get_frame_time(elapsed)
+            lag = min(lag + elapsed, config.max_catch_up)
+            profiler.start('logic')
+            while lag >= tick_time:
+                self._step(tick_time)
+                lag -= tick_time
+            profiler.stop('logic')
             
             self._view.update()
-            clock.tick(60)
+            profiler.end_frame()
+            clock.tick(config.frame_rate)
+        
+        self._events.unregister(config.GAME_STATES)
+        return self._result
+    
+    def _register_handlers(self):
+        """ Register the game's event handlers for each game state with the
+        event handler. """
+        
+        register = self._events.register
+        KEYDOWN = constants.KEYDOWN
+        
+        # In game
+        game = [config.GS_GAME]
+        for key in _actions:
+            register(game, KEYDOWN, key, self._press_key)
+        register(game, KEYDOWN, constants.K_ESCAPE, self._pause)
+        register(game, constants.KEYUP, None, self._release_key)
+        
+        # Game paused
+        paused = [config.GS_GAME_PAUSED]
+        register(paused, KEYDOWN, constants.K_ESCAPE, self._resume)
+        register(paused, KEYDOWN, constants.K_y, self._quit_to_menu)
+        
+        # Game over screen
+        register([config.GS_GAME_OVER], KEYDOWN, constants.K_RETURN,
+                 self._finish)
+        
+        register(config.GAME_STATES, config.EVENT_MUSIC_STOP, None,
+                 self._next_track)
+        register(config.GAME_STATES, constants.QUIT, None, self._quit)
+    
+    def _stop(self, result):
+        """ End the game loop, returning the given result from it.
+        
+        _stop(int) -> void
+        """
+        
+        self._result = result
+        self._running = False
+    
+    def _press_key(self, event):
+        """ Carry out the action of the pressed key on the game's board. """
+        
+        self._profiler.key_down()
+        self._board.press(_actions[event.key])
+    
+    def _release_key(self, event):
+        """ Stop repeating the action of the released key. """
         
-        return self._score
+        if event.key in _actions:
+            self._board.release(_actions[event.key])
     
-    def _choose_omino(self):
-        """ Choose a random omino from the list of ominoes of the game's order
-        and return it.
+    def _pause(self, event):
+        """ Pause the game. """
         
-        _choose_omino() -> Omino
+        self._sound.play_sound_effect(config.SFX_PAUSE)
+        self._board.release_all()
+        self._master.change_state(config.GS_GAME_PAUSED)
+    
+    def _resume(self, event):
+        """ Un-pause the game. """
+        
+        self._master.change_state(config.GS_GAME)
+    
+    def _quit_to_menu(self, event):
+        """ Abandon the game and go back to the menu. """
+        
+        self._sound.stop_music()
+        self._stop(-1)
+    
+    def _finish(self, event):
+        """ Leave the game over screen. """
+        
+        self._stop(self._board.get_score())
+    
+    def _next_track(self, event):
+        """ Keep the music going when a track finishes. """
+        
+        self._sound.track_ended()
+    
+    def _quit(self, event):
+        """ End the application. """
+        
+        self._stop(None)
+    
+    def _step(self, time):
+        """ Advance the game logic by the given number of milliseconds, and
+        end the game once the board's blocks have reached the top.
+        
+        _step(float) -> void
         """
         
-        x = random.randint(0, len(self._ominoes) - 1)
-        omino = Omino(self._ominoes[x], self._colours[x])
-        return omino
\ No newline at end of file
+        if self._state != config.GS_GAME:
+            return
+        self._play_time += time
+        
+        self._board.step(time, self._profiler)
+        if not self._board.is_playing():
+            self._sound.stop_music()
+            self._sound.play_sound_effect(config.SFX_GAME_OVER)
+            self._master.change_state(config.GS_GAME_OVER)
+
+
+def read_snapshot(data):
+    """ Return the order and level of the game saved in the given snapshot.
+    Raise ValueError if it isn't a snapshot this version of the game can
+    restore.
+    
+    read_snapshot(string) -> (int, int)
+    """
+    
+    try:
+        magic, version, order, level = _snapshot_header.unpack_from(data)[:4]
+    except struct.error, error:
+        raise ValueError('Corrupt snapshot: ' + str(error))
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError('Not a snapshot, or from another version')
+    if order not in config.names or level not in config.levels:
+        raise ValueError('Corrupt snapshot: bad order or level')
+    return order, level
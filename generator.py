@@ -5,6 +5,12 @@
 import random
 import copy
 
+try:
+    import numpy
+except ImportError:
+    # Batches of shapes are canonicalised one at a time in Python instead
+    numpy = None
+
 import graphics
 from helpers import *
 
@@ -13,6 +19,10 @@ from helpers import *
 # {order: number of omiones}
 counts = {1: 1, 2: 1, 3: 2, 4: 7, 5: 18, 6: 60}
 
+# Fewer grids than this are keyed one at a time even if NumPy is installed, as
+# setting up the arrays takes longer than keying them in Python
+_batch_minimum = 64
+
 
 class Generator:
     
@@ -23,12 +33,16 @@ class Generator:
     def generate(self, order):
         """ Return a list of all the one-sided polyominoes of the given order.
         Objects in returned list are 2D square lists representing the shape of
-        the polyominoes by boolean values.
+        the polyominoes by boolean values. The list is the same, in the same
+        order, every time, so polyominoes can be saved by their index in it.
         
         generate(int) -> list<list<list<bool>>>
         """
         
         self._order = order
+        # The polyominoes are grown from a generator of their own, seeded by
+        # the order, so their order doesn't depend on what else was random
+        self._random = random.Random(order)
         ominoes = []
         
         if order == 1:
@@ -39,40 +53,75 @@ class Generator:
         # A order * order grid is made, then the bottom-left block filled.
         # The squares adjacent to that block are numbered, and one of them
         # is randomly picked. This continues till order blocks are filled.
-        # Check to see if generated polyomino is a repeat, and continue
-        # till we've generated enough.
+        # Polyominoes are grown in batches of as many as are still missing,
+        # and the repeats among them and those already found are dropped by
+        # their canonical keys, as canonicalise does. This continues till
+        # we've generated enough.
         
+        seen = set([0])
         while len(ominoes) < counts[order]:
-            free_squares = {}
-            pick = 0
-            max_number = 0
-            omino = rect_list(order, order, False)
-            if order > 4:
-                # A different starting point for orders > 4
-                # This is so crosses and similar shapes can be generated
-                row, col = order - 2, 0
-            else:
-                row, col = order - 1, 0
-            omino[row][col] = True
-            for s in xrange(order - 1):
-                free_squares, max_number = self._number_adjacent_squares(omino,
-                                           (row, col), free_squares, max_number)
-                possible = [n for n in free_squares.keys() if n > pick]
-                pick = random.choice(possible)
-                row, col = free_squares[pick]
-                free_squares.pop(pick)
-                omino[row][col] = True
-            omino = self._normalise(omino)
-            if not [n for n in ominoes if n == omino]:
-                ominoes.append(omino)
+            batch = [self._grow()
+                     for i in xrange(counts[order] - len(ominoes))]
+            ominoes.extend(self._distinct(batch, False, seen))
         
         return ominoes
     
+    def canonicalise(self, grids, free=False):
+        """ Return the distinct polyominoes among the given candidate grids, in
+        the order they first appear, normalised in the same way as those
+        returned by generate. Two grids hold the same polyomino if one can be
+        rotated, or if free is True also turned over, and moved to match the
+        other. Grids with no blocks hold no polyomino, and are skipped. The
+        grids are square 2D lists of booleans of the same order, or a NumPy
+        array of them stacked, and if NumPy is installed and there are enough
+        of them they are rotated, trimmed and keyed all together in array
+        operations (see check_batch_keys).
+        
+        canonicalise(list<list<list<bool>>>, bool) -> list<list<list<bool>>>
+        """
+        
+        if len(grids) == 0:
+            return []
+        self._order = len(grids[0])
+        # Only a grid with no blocks has a key of 0
+        return self._distinct(grids, free, set([0]))
+    
+    def _distinct(self, grids, free, seen):
+        """ Return the polyominoes among the given grids of the generator's
+        order, as canonicalise does, except those with keys in the given set.
+        The keys of those returned are added to the set.
+        
+        _distinct(list<list<list<bool>>>, bool, set<int>)
+            -> list<list<list<bool>>>
+        """
+        
+        if self.can_batch(self._order) and len(grids) >= _batch_minimum:
+            keys = self._batch_keys(grids, free)
+        else:
+            keys = [self._key(grid, free) for grid in grids]
+        
+        ominoes = []
+        for i, (key, flipped, turns) in enumerate(keys):
+            if key not in seen:
+                seen.add(key)
+                # Normalise from the orientation the key came from, so that
+                # a polyomino is normalised the same way whichever grid of it
+                # came first
+                omino = [[bool(n) for n in line] for line in grids[i]]
+                if flipped:
+                    omino = [line[::-1] for line in omino]
+                for turn in xrange(turns):
+                    omino = self._rotate(omino)
+                ominoes.append(self._normalise(self._move(omino)))
+        return ominoes
+    
     def generate_colours(self, n):
-        """ Generate n unique colours and return as a list of RGB triples.
-        Colours are as contrasted as possible.
+        """ Generate n unique colours and return them as a list of block
+        palettes, which are triples of RGB triples: the colour itself and its
+        highlight and shadow colours. Colours are as contrasted as possible.
         
-        generate_colours(int) -> list<(int, int, int)>
+        generate_colours(int) -> list<((int, int, int), (int, int, int),
+                                       (int, int, int))>
         """
         
         # This divides the 360 degrees of hue in the HSV colour space by n,
@@ -83,9 +132,53 @@ class Generator:
         for i in xrange(n):
             hsv = (degrees * i, 1.0, 0.78)
             rgb = graphics.hsv2rgb(hsv)
-            colours.append(rgb)
+            colours.append(graphics.make_palette(rgb))
         return colours
     
+    def can_batch(self, order):
+        """ Return True if canonicalise keys grids of the given order all
+        together with NumPy, rather than one at a time.
+        
+        can_batch(int) -> bool
+        """
+        
+        # Keys of grids up to 8 by 8 fit in 64 bit integers
+        return numpy != None and order <= 8
+    
+    def check_batch_keys(self, order):
+        """ Return the grids of the given order which canonicalise keys
+        differently with NumPy than one at a time in Python, turned over or
+        not. Every polyomino of the order is tried in every rotation, mirror
+        image and place in its grid, along with a grid with no blocks.
+        
+        check_batch_keys(int) -> list<list<list<bool>>>
+        Precondition: can_batch(order)
+        """
+        
+        grids = [rect_list(order, order, False)]
+        for omino in self.generate(order):
+            for shape in [omino, [line[::-1] for line in omino]]:
+                for rotation in xrange(4):
+                    shape = self._move(self._rotate(shape))
+                    cells = [(row, col) for row in xrange(order)
+                             for col in xrange(order) if shape[row][col]]
+                    height = order - min([row for row, col in cells])
+                    width = max([col for row, col in cells]) + 1
+                    for up in xrange(order - height + 1):
+                        for right in xrange(order - width + 1):
+                            grid = rect_list(order, order, False)
+                            for row, col in cells:
+                                grid[row - up][col + right] = True
+                            grids.append(grid)
+        
+        different = []
+        for free in [False, True]:
+            keys = self._batch_keys(grids, free)
+            for grid, key in zip(grids, keys):
+                if key != self._key(grid, free) and grid not in different:
+                    different.append(grid)
+        return different
+    
     def _normalise(self, polyomino):
         """ Return a copy of the given polyomino with its rotation and position
         normalised. That is, in its left- and bottom-most position and rotation.
@@ -167,6 +260,140 @@ class Generator:
                 rotated[col][self._order - 1 - row] = polyomino[row][col]
         return rotated
     
+    def _key(self, polyomino, free):
+        """ Return the canonical key of the given polyomino, which is the same
+        for all its rotations (and mirror images if free is True), whether it
+        was its mirror image that gave the key, and the number of clockwise
+        turns that did, as a triple. The key is the smallest of the bitmasks
+        of its blocks, with the block in row r and column c as bit
+        r * order + c, after pushing each rotation into the bottom left
+        corner.
+        
+        _key(list<list<bool>>, bool) -> (int, bool, int)
+        """
+        
+        order = self._order
+        cells = [(row, col) for row in xrange(order) for col in xrange(order)
+                 if polyomino[row][col]]
+        key, turns = self._rotated_key(cells)
+        if free:
+            mirrored, mirrored_turns = self._rotated_key(
+                [(row, order - 1 - col) for row, col in cells])
+            if mirrored < key:
+                return mirrored, True, mirrored_turns
+        return key, False, turns
+    
+    def _rotated_key(self, cells):
+        """ Return the smallest bitmask of the given (row, column) blocks in
+        any of their rotations, pushed into the bottom left corner, and the
+        number of clockwise turns which gave it, as a pair.
+        
+        _rotated_key(list<(int, int)>) -> (int, int)
+        """
+        
+        if not cells:
+            # No blocks at all, as _batch_rotated_keys finds too
+            return 0, 0
+        order = self._order
+        best = None
+        for rotation in xrange(4):
+            down = order - 1 - max([row for row, col in cells])
+            left = min([col for row, col in cells])
+            key = 0
+            for row, col in cells:
+                key |= 1 << ((row + down) * order + col - left)
+            if best == None or key < best[0]:
+                best = (key, rotation)
+            # Rotate clockwise, as _rotate does
+            cells = [(col, order - 1 - row) for row, col in cells]
+        return best
+    
+    def _batch_keys(self, grids, free):
+        """ Return the canonical key of each of the given stack of grids,
+        whether its mirror image gave the key and the number of clockwise
+        turns that did, as _key does. Needs NumPy, and the order to be at
+        most 8.
+        
+        _batch_keys(list<list<list<bool>>>, bool) -> list<(int, bool, int)>
+        """
+        
+        order = self._order
+        stack = numpy.asarray(grids, dtype=bool)
+        weights = numpy.left_shift(numpy.uint64(1),
+                                   numpy.arange(order * order,
+                                                dtype=numpy.uint64))
+        keys, turns = self._batch_rotated_keys(stack, weights)
+        flipped = numpy.zeros(len(stack), dtype=bool)
+        if free:
+            mirrored, mirrored_turns = self._batch_rotated_keys(
+                stack[:, :, ::-1], weights)
+            flipped = mirrored < keys
+            keys = numpy.where(flipped, mirrored, keys)
+            turns = numpy.where(flipped, mirrored_turns, turns)
+        return zip(keys.tolist(), flipped.tolist(), turns.tolist())
+    
+    def _batch_rotated_keys(self, stack, weights):
+        """ Return the smallest bitmask of each grid in the given stack in any
+        of its rotations, pushed into the bottom left corner, and the number
+        of clockwise turns which gave it, as _rotated_key does. Weights are
+        the values of the bits of each block.
+        
+        _batch_rotated_keys(numpy.ndarray, numpy.ndarray)
+                            -> (numpy.ndarray, numpy.ndarray)
+        """
+        
+        order = self._order
+        index = numpy.arange(order)
+        grid_index = numpy.arange(len(stack))[:, None, None]
+        keys = []
+        for rotation in xrange(4):
+            # Rows to move each grid down so its bottom row is filled, and
+            # columns to move it left so its left column is
+            down = stack.any(axis=2)[:, ::-1].argmax(axis=1)
+            left = stack.any(axis=1).argmax(axis=1)
+            rows = index[None, :, None] - down[:, None, None]
+            cols = index[None, None, :] + left[:, None, None]
+            moved = stack[grid_index, rows.clip(0, order - 1),
+                          cols.clip(0, order - 1)]
+            moved &= (rows >= 0) & (cols < order)
+            bits = moved.reshape(len(stack), order * order)
+            keys.append((bits.astype(numpy.uint64) * weights).sum(axis=1))
+            # Rotate clockwise, as _rotate does
+            stack = stack.transpose(0, 2, 1)[:, :, ::-1]
+        # argmin picks the first of equal keys, as _rotated_key does
+        keys = numpy.array(keys)
+        turns = keys.argmin(axis=0)
+        return keys[turns, numpy.arange(len(turns))], turns
+    
+    def _grow(self):
+        """ Return a polyomino grown from a single block by adding one
+        randomly picked adjacent square at a time, as described in generate.
+        
+        _grow() -> list<list<bool>>
+        """
+        
+        order = self._order
+        free_squares = {}
+        pick = 0
+        max_number = 0
+        omino = rect_list(order, order, False)
+        if order > 4:
+            # A different starting point for orders > 4
+            # This is so crosses and similar shapes can be generated
+            row, col = order - 2, 0
+        else:
+            row, col = order - 1, 0
+        omino[row][col] = True
+        for s in xrange(order - 1):
+            free_squares, max_number = self._number_adjacent_squares(omino,
+                                       (row, col), free_squares, max_number)
+            possible = [n for n in free_squares.keys() if n > pick]
+            pick = self._random.choice(possible)
+            row, col = free_squares[pick]
+            free_squares.pop(pick)
+            omino[row][col] = True
+        return omino
+    
     def _number_adjacent_squares(self, polyomino, coordinates, \
                                  numbered_squares, max_number):
         """ Return a pair with a dictionary of all the adjacent squares in the
@@ -183,7 +410,8 @@ class Generator:
         row, col = coordinates
         possible_squares = [(row - 1, col), (row, col + 1),
                             (row + 1, col), (row, col - 1)]
-        adjacents = copy.deepcopy(numbered_squares)
+        # The squares are tuples, so a shallow copy keeps them apart
+        adjacents = dict(numbered_squares)
         n = max_number
         for row, col in possible_squares:
             if row in range(self._order) and col in range(self._order) \
@@ -194,4 +422,3 @@ class Generator:
                 n += 1
                 adjacents.update({n: (row, col)})
         return adjacents, n
-    
\ No newline at end of file
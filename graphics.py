@@ -7,8 +7,56 @@ class. """
 import math
 
 import config
+from helpers import *
 
 
+# Fonts loaded so far, keyed by (path, size) and shared by all the helpers here
+_fonts = {}
+
+# Rendered text surfaces, keyed by (text, size, colour, outline)
+_text_cache = LRU_Cache(config.text_cache_size)
+
+# Pre-drawn block sprites, keyed by (palette, size)
+_block_sprites = {}
+
+# Pre-drawn polyominoes, keyed by (shape id, size, palette)
+_thumbnails = LRU_Cache(config.thumbnail_cache_size)
+
+
+def get_font(size, pygame, path=None):
+    """ Return the font of the given size, loaded from the given file (or the
+    application font if no path is given). Each font is only loaded from disk
+    the first time it is asked for.
+    
+    get_font(int, pygame, string) -> pygame.font.Font
+    Precondition: pygame.font has been initialised.
+    """
+    
+    if path == None:
+        path = config.font
+    key = (path, size)
+    font = _fonts.get(key)
+    if font == None:
+        font = pygame.font.Font(path, size)
+        _fonts[key] = font
+    return font
+
+def clear_font_cache():
+    """ Forget all loaded fonts. Must be called if pygame.font is shut down
+    and re-initialised, as the old font objects are no longer valid. """
+    
+    _fonts.clear()
+    _text_cache.clear()
+
+def get_text_cache_stats():
+    """ Return a triple of the hits, misses and number of entries of the
+    rendered text cache.
+    
+    get_text_cache_stats() -> (int, int, int)
+    """
+    
+    return _text_cache.get_stats()
+
 def hsv2rgb(hsv):
     """ Convert the given HSV triple to an RGB triple.
     (0..359, 0..1, 0..1) -> (0..255, 0..255, 0..255)
@@ -56,37 +104,124 @@ def rgb2hsv(rgb):
     
     return (h, s, v)
 
+def make_palette(colour):
+    """ Return a block palette for the given RGB colour: a triple of the colour
+    itself and its highlight and shadow colours.
+    
+    make_palette((int, int, int)) ->
+                 ((int, int, int), (int, int, int), (int, int, int))
+    """
+    
+    h, s, v = rgb2hsv(colour)
+    return (tuple(colour), hsv2rgb((h, s, 1.0)), hsv2rgb((h, s, 0.57)))
+
+# Palettes of the cycling highlight colour, indexed by hue in degrees, so that
+# no colour conversion has to happen while drawing
+cycle_palettes = [make_palette(hsv2rgb((h, 1.0, 200 / 255.0)))
+                  for h in xrange(360)]
+
 def draw_grid(surface, coords, grid, size, pygame):
     """ Draw the grid of blocks to the given surface at (left, top) coordinates,
-    with blocks of given size.
+    with blocks of given size. Each cell of the grid holds a block on/off flag
+    and the block's palette.
     
     draw_grid(pygame.Surface, (int, int),
-              list<list<(bool, (int, int, int))>>, int, pygame) -> void
+              list<list<(bool, ((int, int, int), (int, int, int),
+                                (int, int, int)))>>, int, pygame) -> void
     """
     
     left, top = coords
-    height = len(grid)
-    width = len(grid[0])
-    
-    for row in xrange(height):
-        for col in xrange(width):
-            if grid[row][col][0]:
-                colour = grid[row][col][1]
-                block_left = left + col * (size - 1)
-                block_top = top + row * (size - 1)
-                draw_block(surface, (block_left, block_top), size, colour, pygame)
-
-def draw_block(surface, coords, size, colour, pygame):
-    """ Draw a block of the given colour and size onto the given surface at
-    (left, top) coordinates.
-    
-    draw_block(pygame.Surface, (int, int), int, (int, int, int), pygame) -> void
+    step = size - 1
+    
+    blits = []
+    for row, line in enumerate(grid):
+        block_top = top + row * step
+        for col, cell in enumerate(line):
+            if cell[0]:
+                sprite = get_block_sprite(size, cell[1], pygame)
+                blits.append((sprite, (left + col * step, block_top)))
+    blit_all(surface, blits)
+
+def draw_shape(surface, coords, shape, size, palette, pygame, clip=None):
+    """ Draw the blocks of the given shape in the given palette and size to the
+    given surface, with the shape's top left corner at (left, top) coordinates.
+    If clip is given as (columns, rows), blocks outside that many columns and
+    rows from the coordinates are not drawn.
+    
+    draw_shape(pygame.Surface, (int, int), list<list<bool>>, int,
+               ((int, int, int), (int, int, int), (int, int, int)), pygame,
+               (int, int)) -> void
     """
     
     left, top = coords
-    h, s, v = rgb2hsv(colour)
-    highlight_colour = hsv2rgb((h, s, 1.0))
-    shadow_colour = hsv2rgb((h, s, 0.57))
+    step = size - 1
+    sprite = get_block_sprite(size, palette, pygame)
+    
+    blits = []
+    for row, line in enumerate(shape):
+        for col, filled in enumerate(line):
+            if filled:
+                if clip != None and (col >= clip[0] or row >= clip[1]):
+                    continue
+                blits.append((sprite, (left + col * step, top + row * step)))
+    blit_all(surface, blits)
+
+def blit_all(surface, blits):
+    """ Blit each (source, (left, top)) pair in blits onto the given surface,
+    in a single call where the installed pygame supports it.
+    
+    blit_all(pygame.Surface, list<(pygame.Surface, (int, int))>) -> void
+    """
+    
+    if hasattr(surface, 'blits'):
+        surface.blits(blits, False)
+    else:
+        for source, dest in blits:
+            surface.blit(source, dest)
+
+def get_block_sprite(size, palette, pygame):
+    """ Return a surface with a block of the given size and palette drawn on it,
+    with black as the transparent colour. Each sprite is only drawn the first
+    time it is asked for, so the returned surface must not be drawn on.
+    
+    get_block_sprite(int, ((int, int, int), (int, int, int), (int, int, int)),
+                     pygame) -> pygame.Surface
+    """
+    
+    key = (palette, size)
+    sprite = _block_sprites.get(key)
+    if sprite == None:
+        sprite = pygame.Surface((size, size))
+        sprite = sprite.convert()
+        sprite.fill((0, 0, 0))
+        sprite.set_colorkey((0, 0, 0))
+        draw_block(sprite, (0, 0), size, palette, pygame)
+        _block_sprites[key] = sprite
+    return sprite
+
+def load_block_sprites(palettes, size, pygame):
+    """ Draw the block sprites for all the given palettes at the given size
+    ahead of time, so that none have to be drawn during play.
+    
+    load_block_sprites(list<((int, int, int), (int, int, int),
+                             (int, int, int))>, int, pygame) -> void
+    """
+    
+    for palette in palettes:
+        get_block_sprite(size, palette, pygame)
+
+def draw_block(surface, coords, size, palette, pygame):
+    """ Draw a block of the given palette and size onto the given surface at
+    (left, top) coordinates. The palette is a triple of the block's colour and
+    its highlight and shadow colours, as given by make_palette.
+    
+    draw_block(pygame.Surface, (int, int), int,
+               ((int, int, int), (int, int, int), (int, int, int)),
+               pygame) -> void
+    """
+    
+    left, top = coords
+    colour, highlight_colour, shadow_colour = palette
     
     # Outline
     rect = pygame.Rect(left, top, size, size)
@@ -110,36 +245,73 @@ def draw_block(surface, coords, size, colour, pygame):
     rect = pygame.Rect(left + size - 3, top + 3, 2, size - 4)
     pygame.draw.rect(surface, shadow_colour, rect, 0)
 
-def draw_polyomino(surface, coords, shape, size, colour, pygame):
-    """ Draw the given polyomino in the given colour and size to the given
-    surface at (left, top) coordinates.
+def draw_polyomino(surface, coords, shape, size, palette, pygame,
+                   shape_id=None):
+    """ Draw the given polyomino in the given palette and size to the given
+    surface at (left, top) coordinates. If shape_id is given it must uniquely
+    identify the shape (including its rotation), and the drawn polyomino will
+    be kept as a thumbnail to be reused by later calls.
     
     draw_polyomino(pygame.Surface, (int, int), list<list<bool>>, int,
-                   (int, int, int), pygame) -> void
+                   ((int, int, int), (int, int, int), (int, int, int)),
+                   pygame, object) -> void
     """
     
     left, top = coords
-    order = len(shape)
+    if shape_id == None:
+        thumbnail, offset = render_polyomino(shape, size, palette, pygame)
+    else:
+        thumbnail, offset = get_thumbnail(shape_id, shape, size, palette,
+                                          pygame)
+    surface.blit(thumbnail, (left, top + offset))
+
+def render_polyomino(shape, size, palette, pygame):
+    """ Return a pair of a surface with the given polyomino drawn on it in the
+    given palette and size, with black as the transparent colour, and the
+    vertical offset at which the surface should be drawn. Empty rows at the
+    top of the shape are trimmed.
+    
+    render_polyomino(list<list<bool>>, int,
+                     ((int, int, int), (int, int, int), (int, int, int)),
+                     pygame) -> (pygame.Surface, int)
+    """
     
-    block = pygame.Surface((size, size))
-    block = block.convert()
-    block.fill((0, 0, 0))
-    block.set_colorkey((0, 0, 0))
-    draw_block(block, (0, 0), size, colour, pygame)
+    order = len(shape)
+    rows = [row for row in xrange(order) if shape[row].count(True) > 0]
+    first, last = rows[0], rows[-1]
+    
+    width = order * (size - 1) + 1
+    height = (last - first + 1) * (size - 1) + 1
+    thumbnail = pygame.Surface((width, height))
+    thumbnail = thumbnail.convert()
+    thumbnail.fill((0, 0, 0))
+    thumbnail.set_colorkey((0, 0, 0))
+    draw_shape(thumbnail, (0, 0), shape[first:last + 1], size, palette, pygame)
+    
+    # Each empty row at the top moves the polyomino up by one pixel
+    return thumbnail, -first
+
+def get_thumbnail(shape_id, shape, size, palette, pygame):
+    """ Return the same as render_polyomino, but only render each polyomino
+    the first time it is asked for. shape_id must uniquely identify the shape,
+    including its rotation.
+    
+    get_thumbnail(object, list<list<bool>>, int,
+                  ((int, int, int), (int, int, int), (int, int, int)),
+                  pygame) -> (pygame.Surface, int)
+    """
     
-    # Adjust for empty rows at top
-    for row in shape:
-        if row.count(True) == 0:
-            top -= size
-        else:
-            break
+    key = (shape_id, size, palette)
+    thumbnail = _thumbnails.get(key)
+    if thumbnail == None:
+        thumbnail = render_polyomino(shape, size, palette, pygame)
+        _thumbnails.put(key, thumbnail)
+    return thumbnail
+
+def clear_thumbnails():
+    """ Forget all polyomino thumbnails. """
     
-    for row in xrange(order):
-        for col in xrange(order):
-            if shape[row][col]:
-                block_top = top + row * (size - 1)
-                block_left = left + col * (size - 1)
-                surface.blit(block, (block_left, block_top))
+    _thumbnails.clear()
 
 def draw_border(surface, colour, pygame):
     """ Draw a two pixel border of colour and a two pixel border of white
@@ -163,22 +335,75 @@ def draw_text(surface, coords, text, size, colour, pygame, outline=False):
               pygame, bool) -> void
     """
     
-    left, top = coords
+    surface.blit(render_text(text, size, colour, pygame, outline), coords)
+
+def render_text(text, size, colour, pygame, outline=False):
+    """ Return a surface with the given text rendered in the given size and
+    colour (or in white with a one pixel outline of colour if outline is True).
+    Renders are cached, so the returned surface must not be drawn on.
+    
+    render_text(string, int, (int, int, int), pygame, bool) -> pygame.Surface
+    """
+    
+    colour = tuple(colour)
+    key = (text, size, colour, outline)
+    render = _text_cache.get(key)
+    if render != None:
+        return render
+    
+    font = get_font(size, pygame)
     if not outline:
-        font = pygame.font.Font(config.font, size)
         render = font.render(text, False, colour)
-        pos = render.get_rect()
-        pos.left = left
-        pos.top = top
-        surface.blit(render, pos)
     else:
-        font = pygame.font.Font(config.font, size)
-        surface.blit(hollow_text(font, text, colour, pygame), (left, top))
-        render = font.render(text, False, (255, 255, 255))
-        pos = render.get_rect()
-        pos.left = left + 1
-        pos.top = top + 1
-        surface.blit(render, pos)
+        render = hollow_text(font, text, colour, pygame)
+        render.blit(font.render(text, False, (255, 255, 255)), (1, 1))
+        if pygame.display.get_surface() != None:
+            render = render.convert()
+    _text_cache.put(key, render)
+    return render
+
+class Field_Layer:
+    
+    """ A class for drawing a field's blocks. The settled blocks are kept on
+    their own surface, which is only redrawn when the field reports they have
+    changed, so most frames only the moving omino is drawn block by block. """
+    
+    def __init__(self, surface_size, block_size, pygame):
+        """ Initialise a layer of the given size (width, height) for drawing
+        a field with blocks of the given size.
+        
+        __init__((int, int), int, pygame) -> void
+        """
+        
+        self._size = block_size
+        self._stack = pygame.Surface(surface_size)
+        self._stack = self._stack.convert()
+        self._stack.set_colorkey((0, 0, 0))
+        self._version = None
+    
+    def draw(self, surface, field, pygame):
+        """ Draw the given field's blocks onto the given surface, inside a five
+        pixel margin.
+        
+        draw(pygame.Surface, Field, pygame) -> void
+        """
+        
+        size = self._size
+        if field.get_version() != self._version:
+            self._stack.fill((0, 0, 0))
+            draw_grid(self._stack, (5, 5), field.get_grid(), size, pygame)
+            self._version = field.get_version()
+        surface.blit(self._stack, (0, 0))
+        
+        omino = field.get_omino()
+        if omino != None:
+            location = omino.get_location()
+            width, height = field.get_size()
+            left = 5 + location.x * (size - 1)
+            top = 5 + location.y * (size - 1)
+            draw_shape(surface, (left, top), omino.get_shape(), size,
+                       omino.get_colour(), pygame,
+                       (width - location.x, height - location.y))
 
 class Text_Entry:
     
@@ -390,7 +615,7 @@ def render_textrect(string, size, rect, text_color, background_color,
     Failure - raises a TextRectException if the text won't fit onto the surface.
     """
     
-    font = pygame.font.Font(config.font, size)
+    font = get_font(size, pygame)
     
     final_lines = []
     
@@ -3,6 +3,9 @@
 other classes and so don't belong anywhere else. """
 
 
+import collections
+
+
 def rect_list(width, height, value=None):
     """ Return a rectangular 2D list of size width * height, filled with value
     and indexed by [row][column].
@@ -45,3 +48,71 @@ class Point:
     
     def __ne__(self, other):
         return not self.__eq__(other)
+
+
+class LRU_Cache:
+    
+    """ A mapping of bounded size which forgets its least recently used entry
+    when full. Counts of lookup hits and misses are kept so the effectiveness
+    of the cache can be checked. """
+    
+    def __init__(self, capacity):
+        """ Create an empty cache holding at most capacity entries.
+        
+        __init__(int) -> void
+        Precondition: capacity is greater than zero.
+        """
+        
+        self._capacity = capacity
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    def get(self, key):
+        """ Return the value stored for key and mark it as recently used, or
+        return None if there is no such entry.
+        
+        get(object) -> object/None
+        """
+        
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self._misses += 1
+            return None
+        self._entries[key] = value
+        self._hits += 1
+        return value
+    
+    def put(self, key, value):
+        """ Store value for key, evicting the least recently used entry if
+        the cache is full.
+        
+        put(object, object) -> void
+        """
+        
+        if key in self._entries:
+            self._entries.pop(key)
+        elif len(self._entries) >= self._capacity:
+            self._entries.popitem(False)
+        self._entries[key] = value
+    
+    def clear(self):
+        """ Remove all entries. Hit and miss counts are kept. """
+        
+        self._entries.clear()
+    
+    def get_stats(self):
+        """ Return a triple of the number of hits, number of misses and the
+        current number of entries.
+        
+        get_stats() -> (int, int, int)
+        """
+        
+        return (self._hits, self._misses, len(self._entries))
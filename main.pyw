@@ -4,6 +4,13 @@ Polyominohs class. """
 
 
 import sys
+import os
+import optparse
+import cProfile
+import pstats
+import random
+import socket
+import timeit
 
 try:
     import pygame
@@ -18,6 +25,15 @@ from sound import *
 from view import *
 from menu import *
 from game import *
+from versus import *
+from network import *
+from solver import *
+from catalog import *
+from generator import counts
+from profiler import *
+from memory import *
+from stats import *
+from writer import *
 
 
 class Polyominohs:
@@ -25,66 +41,113 @@ class Polyominohs:
     """ The main game class which controls the application at the highest
     level, as well as taking care of file handling (ie. high scores file). """
     
-    def __init__(self):
+    def __init__(self, profiler=None, memory=None):
         """ Initalise instances of the main classes, load high scores list
-        and set up anything else needed. """
+        and set up anything else needed. If no profiler or memory tracker is
+        given, one is made as set in the configuration file.
         
+        __init__(Profiler, Memory_Tracker) -> void
+        """
+        
+        self._launch_time = timeit.default_timer()
+        self._first_frame_time = None
+        
+        # Only what is needed to show the loading screen is initialised here,
+        # the rest of pygame (including the mixer) once it is showing
         self._pygame = pygame
-        if not ((self._pygame.init()[0] == 5 and
-           self._pygame.mixer.get_init() == None) or
-           self._pygame.init()[0] == 6):
-            # We can deal with no sound, but need everything else
+        self._pygame.display.init()
+        self._pygame.font.init()
+        if not (self._pygame.display.get_init() and
+                self._pygame.font.get_init()):
             print 'Not all required pygame modules could be initialised.', \
                   'The application will now close.'
             sys.exit(-1)
+        if profiler == None:
+            profiler = Profiler(config.profile)
+        self._profiler = profiler
+        if memory == None:
+            memory = Memory_Tracker(config.memory_tracking)
+        self._memory = memory
         self._events = Event_Handler(self._pygame)
         self._sound = Sound(self._pygame)
         self._view = View(self._pygame, self)
-        self._load_highscores()
+        # Only the changed parts of the screen are drawn each frame, so the
+        # window must be told when it needs drawing again as a whole
+        self._events.register_always(self._pygame.VIDEOEXPOSE, self._redraw)
+        self._events.register_always(self._pygame.ACTIVEEVENT, self._redraw)
+        self._stats = Stats_Store(config.stats_filename)
+        if self._stats.is_new():
+            # The old high scores weren't kept by order and level, so they
+            # are put with the menu's starting order and level
+            self._stats.import_highscores(config.highscores_filename, 4, 1)
+        self._suspend_writer = File_Writer(config.suspend_filename)
+        self._highscores = {}
+        self._last_game = None
+        self._recording = False
+        self._online = None
         self._state = config.GS_LOADING
         self._menu = None
         self._game = None
     
     def run(self):
-        """ Start the game and continue until the user quits. """
+        """ Start the game and continue until the user quits. A game which was
+        suspended when the user last quit is resumed, paused, first. """
         
-        self._view.start()
-        self.change_state(config.GS_LOADING)
-        self._view.update()
-        
-        # Generate all polyominoes while the user sees a loading screen
-        generator = Generator()
-        self._ominoes = []
-        for order in xrange(6):
-            shapes = generator.generate(order + 1)
-            colours = generator.generate_colours(len(shapes))
-            self._ominoes.append((shapes, colours))
+        self._start()
+        self._generate_ominoes()
         
         level = 1
         order = 4
+        players = 1
         is_highscore = False
+        if self._online != None:
+            self._game = self._start_online(*self._online)
+        else:
+            self._game = self._load_suspended_game()
         while True:
-            self._menu = Menu(self, self._view, self._events, self._sound,
-                              level, order)
-            if is_highscore:
-                self.change_state(config.GS_MENU_ENTER_HIGHSCORE)
-                self._menu.highscore = score
-            else:
-                self.change_state(config.GS_MENU)
-            order, level = self._menu.loop()
-            if order == 0:
-                self._pygame.quit()
-                return
-            self.change_state(config.GS_LOADING)
-            self._view.update()
-            self._game = Game(self, self._view, self._events, self._sound,
-                              level, order, self._ominoes[order - 1])
-            self.change_state(config.GS_GAME)
+            if self._game == None:
+                self._menu = Menu(self, self._view, self._events, self._sound,
+                                  level, order, players)
+                if is_highscore:
+                    self.change_state(config.GS_MENU_ENTER_HIGHSCORE)
+                    self._menu.highscore = score
+                else:
+                    self.change_state(config.GS_MENU)
+                order, level = self._menu.loop()
+                if order == 0:
+                    self._quit()
+                    return
+                players = self._menu.get_players()
+                self.change_state(config.GS_LOADING)
+                self._view.update()
+                if players > 1:
+                    self._game = Versus(self, self._view, self._events,
+                                        self._sound, level, order,
+                                        self._ominoes[order - 1], players)
+                    self.change_state(config.GS_VERSUS)
+                else:
+                    self._game = Game(self, self._view, self._events,
+                                      self._sound, level, order,
+                                      self._ominoes[order - 1])
+                    if self._recording:
+                        self._events.start_recording(self._game.get_seed(),
+                                                     order, level)
+                    self.change_state(config.GS_GAME)
+            elif isinstance(self._game, Game):
+                order = self._game.get_order()
+                level = self._game.get_level()
+                self.change_state(config.GS_GAME)
+                self.change_state(config.GS_GAME_PAUSED)
             score = self._game.loop()
+            self._events.stop_recording()
             if score == None:
-                self._pygame.quit()
+                if self._state in [config.GS_GAME, config.GS_GAME_PAUSED]:
+                    self._suspend_writer.write(self._game.save())
+                self._quit()
                 return
-            is_highscore = self._is_highscore(score)
+            is_highscore = False
+            if score >= 0:
+                is_highscore = self._record_game(self._game)
             self._game = None
             self._menu = None
     
@@ -96,13 +159,120 @@ class Polyominohs:
         
         return self._state
         
-    def get_highscores(self):
-        """ Return the list of highscores as pairs of (name, score).
+    def benchmark(self, order, level, script, games=0, seed=None):
+        """ Play games of the given order and level, driven by the given input
+        script instead of a player, until the script ends or the given number
+        of games (if not 0) have been played. A new game starts whenever one
+        ends. The first game's ominoes are chosen from the given seed, if
+        given. Music and sound effects are turned off and high scores are not
+        touched. Return the number of games finished.
+        
+        benchmark(int, int, Input_Script, int, int) -> int
+        """
+        
+        self._start()
+        self._generate_ominoes()
+        self._events.set_script(script)
+        if self._sound.get_music_on() == 'On':
+            self._sound.toggle_music()
+        if self._sound.get_sound_effects_on() == 'On':
+            self._sound.toggle_sound_effects()
+        
+        played = 0
+        score = 0
+        while score != None and (not games or played < games):
+            self._game = Game(self, self._view, self._events, self._sound,
+                              level, order, self._ominoes[order - 1], seed)
+            seed = None
+            self.change_state(config.GS_GAME)
+            score = self._game.loop()
+            if score != None:
+                played += 1
+            self.change_state(config.GS_LOADING)
+            self._game = None
+        self._pygame.quit()
+        return played
+    
+    def record_games(self):
+        """ Record the keys pressed in every new single player game from now
+        on, with the game's seed, order and level, so that the last one can be
+        saved with save_recording and replayed. """
+        
+        self._recording = True
+    
+    def play_online(self, players, address, order, level):
+        """ Start by playing a versus game over a network, rather than at
+        the menu: hosting one between the given number of players with the
+        given order and level if players is given, otherwise joining the one
+        hosted at the given (host, port) address.
+        
+        play_online(int, (string, int), int, int) -> void
+        Precondition: If players is given, 2 <= players <=
+                      len(config.versus_keys)
+        """
+        
+        self._online = (players, address, order, level)
+    
+    def save_recording(self, filename):
+        """ Save the last game recorded to the given file as an input script.
+        Return False if no game was recorded.
+        
+        save_recording(string) -> bool
+        """
+        
+        return self._events.save_recording(filename)
+    
+    def get_first_frame_time(self):
+        """ Return the time (in ms) it took from the application being created
+        to its first frame being shown, or None if it hasn't been yet.
         
-        get_highscores() -> list<(string, int)>
+        get_first_frame_time() -> float
         """
         
-        return self._highscores
+        return self._first_frame_time
+    
+    def get_sound(self):
+        """ Return the application's sound component.
+        
+        get_sound() -> Sound
+        """
+        
+        return self._sound
+    
+    def get_profiler(self):
+        """ Return the profiler timing the application's frames.
+        
+        get_profiler() -> Profiler
+        """
+        
+        return self._profiler
+    
+    def get_ominoes(self, order):
+        """ Return the polyomino shapes of the given order and their block
+        palettes, as a pair of lists (the shapes being a Shape_Catalog).
+        
+        get_ominoes(int) -> (Shape_Catalog,
+                             list<((int, int, int), (int, int, int),
+                                   (int, int, int))>)
+        Precondition: The polyominoes have been generated.
+        """
+        
+        return self._ominoes[order - 1]
+    
+    def get_highscores(self, order, level):
+        """ Return the list of highscores of the given order and level as
+        pairs of (name, score), best first. The lists are kept from one call to
+        the next, until a game of their order and level is recorded.
+        
+        get_highscores(int, int) -> list<(string, int)>
+        """
+        
+        key = (order, level)
+        if key not in self._highscores:
+            top = self._stats.get_top(order, level, config.highscores_length)
+            self._highscores[key] = [(name or '_-_', score)
+                                     for game_id, name, score in top]
+        return self._highscores[key]
     
     def change_state(self, state):
         """ Change the state of the application and inform all the other
@@ -132,65 +302,517 @@ class Polyominohs:
             self._menu.change_state(state)
         
         self._view.change_state(state, new_interface)
+        
+        if state in config.MEMORY_STATES:
+            self._memory.snapshot(config.MEMORY_STATES[state])
     
     def add_score(self, name, score):
-        """ Add the given name and score to the high scores list. If the score
-        given is too low for the high scores list, nothing is done. Return the
-        index at which the score was added, or -1 if it wasn't added.
+        """ Put the given name to the last game recorded, which got the given
+        score. Return the index of the game in its order and level's high
+        scores list, or -1 if it isn't in it.
         
-        _add_score(string, int) -> int
+        add_score(string, int) -> int
         """
         
-        index = -1
-        for i, highscore in enumerate(self._highscores):
-            if score > highscore[1]:
-                self._highscores.insert(i, (name, score))
-                self._highscores.pop()
-                index = i
-                break
-        self._save_highscores()
+        if self._last_game == None:
+            return -1
+        game_id, order, level = self._last_game
+        self._stats.set_name(game_id, name)
+        self._highscores.pop((order, level), None)
+        index = self._stats.get_rank(game_id, config.highscores_length)
+        if index == config.highscores_length:
+            return -1
         return index
     
-    def _is_highscore(self, score):
-        """ Return true if the given score is a high score.
+    def _redraw(self, event):
+        """ Draw the whole screen again, as the window has been uncovered or
+        restored. """
+        
+        self._view.redraw()
+    
+    def _quit(self):
+        """ Write out the profiling and memory reports and anything still
+        waiting to be saved, then close pygame. """
+        
+        self._profiler.dump(config.profile_filename)
+        self._memory.dump(config.memory_filename, config.memory_report_top)
+        self._stats.close()
+        self._suspend_writer.flush()
+        self._pygame.quit()
+    
+    def _load_suspended_game(self):
+        """ Return the game which was suspended when the user last quit,
+        restored from its file, or None if there isn't one. The file is
+        removed, so that the game is only resumed once.
         
-        _is_highscore(int) -> bool
-        Precondition: The high scores file has been previously loaded.
+        _load_suspended_game() -> Game
         """
         
-        scores = [n[1] for n in self._highscores]
-        return score > min(scores)
+        try:
+            file_handle = open(config.suspend_filename, 'rb')
+            data = file_handle.read()
+            file_handle.close()
+            os.remove(config.suspend_filename)
+        except (IOError, OSError):
+            return None
+        
+        try:
+            order, level = read_snapshot(data)
+            game = Game(self, self._view, self._events, self._sound, level,
+                        order, self._ominoes[order - 1])
+            game.restore(data)
+        except ValueError, error:
+            print 'The suspended game could not be resumed:', error
+            return None
+        return game
     
-    def _save_highscores(self):
-        """ Save the high scores list to file. The high scores filename is set
-        in the configuration file and this method assumes the file exists and is
-        writeable. """
+    def _start(self):
+        """ Open the window and show the loading screen as soon as possible,
+        then initialise the rest of pygame and start loading the audio in the
+        background. The time taken to show the loading screen is recorded, and
+        reported if profiling and over budget. """
+        
+        self._view.start()
+        self.change_state(config.GS_LOADING)
+        self._view.update()
+        self._first_frame_time = (timeit.default_timer() -
+                                  self._launch_time) * 1000.0
+        if self._profiler.is_enabled() and \
+           self._first_frame_time > config.first_frame_budget:
+            print 'First frame took %d ms (budget %d ms).' % \
+                  (self._first_frame_time, config.first_frame_budget)
         
-        file_handle = open(config.highscores_filename, 'w')
-        for highscore in self._highscores:
-            file_handle.write(highscore[0] + ',' + str(highscore[1]) + '\n')
-        file_handle.close()
+        self._pygame.init()
+        self._sound.load()
     
-    def _load_highscores(self):
-        """ Load the high scores list from file. The high scores filename is set
-        in the configuration file and this method assumes the file exists and is
-        readable. """
+    def _start_online(self, players, address, order, level):
+        """ Return the network game set by play_online, hosting it if
+        players is given, or None if it can't be started.
+        
+        _start_online(int, (string, int), int, int) -> Net_Versus
+        """
         
-        self._highscores = []
-        file_handle = open(config.highscores_filename, 'r')
-        for line in file_handle:
-            name, score = line.split(',')
-            score = int(score)
-            self._highscores.append((name, score))
-        file_handle.close()
+        server = None
+        try:
+            if players:
+                server = Server(Link(('', config.net_port)), level, order,
+                                self._ominoes[order - 1], players)
+                address = ('127.0.0.1', config.net_port)
+                print 'Hosting a game for %d players on port %d.' % \
+                      (players, config.net_port)
+            host, port = address
+            address = (socket.gethostbyname(host), port)
+            client = Client(Link(('', 0)), address, self._ominoes)
+        except socket.error, error:
+            print 'The network game could not be started:', error
+            if server != None:
+                server.close()
+            return None
+        return Net_Versus(self, self._view, self._events, self._sound, client,
+                          server)
+    
+    def _generate_ominoes(self):
+        """ Generate the polyominoes of every order, and their colours, while
+        the loading screen is shown. """
+        
+        generator = Generator()
+        self._ominoes = []
+        for order in xrange(6):
+            shapes = Shape_Catalog(generator.generate(order + 1))
+            colours = generator.generate_colours(len(shapes))
+            self._ominoes.append((shapes, colours))
+    
+    def _record_game(self, game):
+        """ Record the given finished game in the stats store, and return True
+        if it made its order and level's high scores list.
+        
+        _record_game(Game) -> bool
+        """
+        
+        order = game.get_order()
+        level = game.get_level()
+        score = game.get_score()
+        game_id = self._stats.add_game(order, level, score,
+                                       game.get_lines_cleared(),
+                                       game.get_play_time(),
+                                       game.get_pieces(), game.get_seed())
+        self._last_game = (game_id, order, level)
+        self._highscores.pop((order, level), None)
+        rank = self._stats.get_rank(game_id, config.highscores_length)
+        return score > 0 and rank < config.highscores_length
 
 
 def main():
     """ Create and run the application. This method is the main entry point
-    into the application. """
+    into the application. See --help for the benchmarking options. """
+    
+    options = _parse_arguments(sys.argv[1:])
+    if options.stats:
+        print_stats()
+        return
+    if options.soak:
+        sys.exit(soak(options))
+    if options.netplay:
+        sys.exit(netplay(options))
+    if options.tile:
+        sys.exit(tile(options))
+    if options.check_keys:
+        sys.exit(check_keys())
+    if options.frames or options.replay:
+        benchmark(options)
+        return
+    
+    if options.host and not 2 <= options.host <= len(config.versus_keys):
+        print 'A game can be hosted for 2 to %d players.' % \
+              len(config.versus_keys)
+        sys.exit(1)
+    try:
+        address = _parse_address(options.join)
+    except ValueError, error:
+        print error
+        sys.exit(1)
     
     app = Polyominohs()
-    app.run()
+    if options.record:
+        app.record_games()
+    if options.host or options.join:
+        app.play_online(options.host, address, options.order, options.level)
+    try:
+        app.run()
+    finally:
+        if options.record and not app.save_recording(options.record):
+            print 'No new game was played, so there was nothing to record.'
+
+def benchmark(options):
+    """ Run the application headlessly (with SDL's dummy video and audio
+    drivers) on scripted or replayed input, and print a cProfile report, a
+    histogram of frame times and the peak memory used.
+    
+    benchmark(optparse.Values) -> void
+    """
+    
+    _set_headless(options.seed)
+    order, level, seed = options.order, options.level, None
+    if options.replay:
+        script = load_script(options.replay)
+        if script.get_order() != None:
+            # Replay the recorded game, rather than one of the options
+            order = script.get_order()
+            level = script.get_level()
+            seed = script.get_seed()
+    else:
+        script = random_script(options.frames, options.seed)
+    
+    profiler = Profiler(True, window=script.get_length())
+    app = Polyominohs(profiler)
+    stats = cProfile.Profile()
+    stats.runcall(app.benchmark, order, level, script, 0, seed)
+    
+    if options.profile:
+        stats.dump_stats(options.profile)
+    report = pstats.Stats(stats)
+    report.sort_stats('cumulative').print_stats(options.top)
+    
+    print 'Frame times (ms):'
+    for line in profiler.get_summary():
+        print '  ' + line
+    lower = 0
+    for bound, count in profiler.get_histogram():
+        if bound == None:
+            print '  %3d+     %d' % (lower, count)
+        else:
+            print '  %3d-%-3d  %d' % (lower, bound, count)
+            lower = bound
+    
+    # Key presses move the omino as soon as they are handled, so it is shown
+    # moved at the end of the same frame
+    latency = profiler.get_percentiles('input', (99,))[0]
+    print 'Input latency: %.1f ms at the 99th percentile (budget %.1f ms)' % \
+          (latency, config.fixed_frame_time)
+    print 'Time to first frame: %d ms (budget %d ms)' % \
+          (app.get_first_frame_time(), config.first_frame_budget)
+    print 'Sound effect latency: %d ms (%d sample buffer)' % \
+          (app.get_sound().get_latency(), config.mixer_buffer)
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak /= 1024
+        print 'Peak memory: %d KB' % peak
+    except ImportError:
+        print 'Peak memory: unavailable on this platform'
+
+def print_stats():
+    """ Print the totals of the games played at each order and level. """
+    
+    stats = Stats_Store(config.stats_filename)
+    print 'order level  games   best  average   lines   hours'
+    for order, level, games, best, average, lines, duration in \
+        stats.get_totals():
+        print '%5d %5d %6d %6d %8.1f %7d %7.1f' % \
+              (order, level, games, best, average, lines,
+               duration / 3600000.0)
+    stats.close()
+
+def soak(options):
+    """ Play the given number of games headlessly on random input, tracking
+    memory at every change of state, and print the memory report. Return 1 if
+    resident memory grew by more than the configured limit between the first
+    and last quarters of the games, otherwise 0.
+    
+    soak(optparse.Values) -> int
+    """
+    
+    _set_headless(options.seed)
+    frames = options.frames or options.soak * 3000
+    script = random_script(frames, options.seed)
+    memory = Memory_Tracker(True)
+    app = Polyominohs(Profiler(False), memory)
+    played = app.benchmark(options.order, options.level, script, options.soak)
+    
+    for line in memory.get_report(config.memory_report_top):
+        print line
+    
+    resident = memory.get_resident(config.MEMORY_STATES[config.GS_GAME])
+    quarter = len(resident) // 4
+    if quarter == 0:
+        print 'Only %d games were played, too few to judge.' % played
+        return 1
+    early = sorted(resident[:quarter])[quarter // 2]
+    late = sorted(resident[-quarter:])[quarter // 2]
+    print 'Played %d games. Resident memory: %d KB early, %d KB late.' % \
+          (played, early, late)
+    if late - early > config.soak_max_growth:
+        print 'FAILED: memory grew by %d KB (limit %d KB).' % \
+              (late - early, config.soak_max_growth)
+        return 1
+    print 'Passed.'
+    return 0
+
+def netplay(options):
+    """ Play a versus game between the given number of clients and a server,
+    over loopback with the configured latency, jitter and packet loss, with
+    every client pressing random keys. Print how much each client sent and was
+    sent, and return 1 if any client's boards didn't end up the same as the
+    server's, otherwise 0.
+    
+    netplay(optparse.Values) -> int
+    """
+    
+    random.seed(options.seed)
+    generator = Generator()
+    ominoes = []
+    for order in xrange(6):
+        shapes = Shape_Catalog(generator.generate(order + 1))
+        ominoes.append((shapes, generator.generate_colours(len(shapes))))
+    
+    players = options.netplay
+    links = [Link(('127.0.0.1', 0), config.net_latency, config.net_jitter,
+                  config.net_loss, options.seed + i)
+             for i in xrange(players + 1)]
+    server = Server(links[0], options.level, options.order,
+                    ominoes[options.order - 1], players, options.seed)
+    clients = [Client(link, links[0].get_address(), ominoes)
+               for link in links[1:]]
+    
+    # Random key presses for a while, then enough time with none for every
+    # packet to arrive
+    frame_time = 1000.0 / 60
+    frames = options.frames or 3600
+    settle = int(2000 / frame_time)
+    held = [None] * players
+    for frame in xrange(frames + settle):
+        for i, client in enumerate(clients):
+            if frame >= frames or random.random() > 0.1:
+                continue
+            if held[i] != None:
+                client.release(held[i])
+                held[i] = None
+            else:
+                action = random.choice([ROTATE, LEFT, DOWN, RIGHT, DROP])
+                client.press(action)
+                if action in [LEFT, DOWN, RIGHT]:
+                    held[i] = action
+            if frame == frames - 1 and held[i] != None:
+                client.release(held[i])
+        for client in clients:
+            client.step(frame_time)
+        server.step(frame_time)
+    
+    seconds = (frames + settle) * frame_time / 1000.0
+    failed = 0
+    print 'client  received B/s  sent B/s  in sync'
+    for i, client in enumerate(clients):
+        link = links[i + 1]
+        rows = server.get_sent_boards(client.get_sequence())
+        in_sync = client.get_unacknowledged() == 0 and rows != None and \
+                  rows == client.get_rows()
+        if not in_sync:
+            failed = 1
+        print '%6d  %12.0f  %8.0f  %s' % \
+              (i + 1, link.get_bytes_received() / seconds,
+               link.get_bytes_sent() / seconds, in_sync)
+    print 'Scores:', ', '.join([str(board.get_score())
+                                for board in server.get_boards()])
+    if failed:
+        print 'FAILED: not every client ended up with the server\'s boards.'
+    else:
+        print 'Passed.'
+    return failed
+
+def tile(options):
+    """ Solve the puzzle of filling a rectangle with every polyomino of the
+    given order, each used once and turned over if need be, and print the
+    first solution, every solution, or how many there are. Solutions which are
+    rotations or reflections of each other are only given once. Return 1 if
+    the puzzle can't be set or has no solution, otherwise 0.
+    
+    tile(optparse.Values) -> int
+    """
+    
+    try:
+        width, height = [int(n) for n in options.tile.split('x')]
+    except ValueError:
+        print 'The rectangle must be given as WIDTHxHEIGHT, eg. 10x6.'
+        return 1
+    random.seed(options.seed)
+    shapes = Generator().generate(options.order)
+    try:
+        tiling = Tiling(shapes, width, height)
+    except ValueError, error:
+        print error
+        return 1
+    
+    start = timeit.default_timer()
+    if options.count:
+        found = tiling.count(options.processes)
+    else:
+        if options.all:
+            solutions = tiling.find_all(options.processes)
+        else:
+            solutions = [tiling.find_first(options.processes)]
+            solutions = [n for n in solutions if n != None]
+        names = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+        for solution in solutions:
+            for row in solution:
+                print ''.join([names[n] for n in row])
+            print
+        found = len(solutions)
+    print '%d solutions found (%d counting rotations and reflections) ' \
+          'in %.1f s' % (found, found * tiling.get_symmetries(),
+                         timeit.default_timer() - start)
+    return int(found == 0)
+
+def check_keys():
+    """ Check that NumPy gives every polyomino of every order the same
+    canonical keys as working them out one at a time does, and print how many
+    grids of each order didn't. Return 1 if any didn't, otherwise 0.
+    
+    check_keys() -> int
+    """
+    
+    generator = Generator()
+    if not generator.can_batch(1):
+        print 'NumPy is not installed, so its keys are never used.'
+        return 0
+    failed = 0
+    print 'order  different'
+    for order in sorted(counts):
+        different = generator.check_batch_keys(order)
+        print '%5d  %9d' % (order, len(different))
+        if different:
+            failed = 1
+    if failed:
+        print 'FAILED: NumPy keys some polyominoes differently.'
+    else:
+        print 'Passed.'
+    return failed
+
+def _set_headless(seed):
+    """ Set up for running without a window or sound: use SDL's dummy video
+    and audio drivers, step every frame as if exactly 1/60th of a second had
+    passed without waiting for it to, and seed the random number generator.
+    
+    _set_headless(int) -> void
+    """
+    
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    config.frame_rate = 0
+    config.fixed_frame_time = 1000.0 / 60
+    random.seed(seed)
+
+def _parse_address(address):
+    """ Return the (host, port) address given as 'host' or 'host:port', the
+    port being the configured one if not given, or None if no address is
+    given. Raise ValueError if the port isn't a number.
+    
+    _parse_address(string) -> (string, int)
+    """
+    
+    if not address:
+        return None
+    host, colon, port = address.partition(':')
+    if not colon:
+        return (host, config.net_port)
+    try:
+        return (host, int(port))
+    except ValueError:
+        raise ValueError('The port to join must be a number, eg. %s:%d.' %
+                         (host, config.net_port))
+
+def _parse_arguments(arguments):
+    """ Parse and return the command line options.
+    
+    _parse_arguments(list<string>) -> optparse.Values
+    """
+    
+    parser = optparse.OptionParser()
+    parser.add_option('--frames', type='int', default=0,
+                      help='run headlessly for FRAMES frames of random input')
+    parser.add_option('--replay', metavar='FILE',
+                      help='run headlessly, replaying input recorded in FILE')
+    parser.add_option('--record', metavar='FILE',
+                      help='record key presses to FILE for replaying later')
+    parser.add_option('--stats', action='store_true',
+                      help='print totals of the games played and exit')
+    parser.add_option('--soak', type='int', default=0, metavar='GAMES',
+                      help='play GAMES games headlessly and fail if memory '
+                           'keeps growing')
+    parser.add_option('--netplay', type='int', default=0, metavar='PLAYERS',
+                      help='play a versus game between PLAYERS clients over '
+                           'loopback and check they stay in sync')
+    parser.add_option('--host', type='int', default=0, metavar='PLAYERS',
+                      help='host a versus game over the network for PLAYERS '
+                           'players, including you')
+    parser.add_option('--join', metavar='HOST[:PORT]',
+                      help='join the versus game hosted on HOST')
+    parser.add_option('--tile', metavar='WIDTHxHEIGHT',
+                      help='fill a rectangle with every polyomino of the '
+                           'order and print the first solution')
+    parser.add_option('--all', action='store_true',
+                      help='print every solution of the --tile puzzle')
+    parser.add_option('--count', action='store_true',
+                      help='only count the solutions of the --tile puzzle')
+    parser.add_option('--processes', type='int', default=1,
+                      help='split the --tile search over PROCESSES '
+                           'processes (default 1)')
+    parser.add_option('--check-keys', action='store_true',
+                      help='check that NumPy keys polyominoes the same as '
+                           'Python does')
+    parser.add_option('--order', type='int', default=4,
+                      help='polyomino order to benchmark, tile with or '
+                           'host (default 4)')
+    parser.add_option('--level', type='int', default=1,
+                      help='difficulty level to benchmark or host '
+                           '(default 1)')
+    parser.add_option('--seed', type='int', default=0,
+                      help='random seed for the benchmark (default 0)')
+    parser.add_option('--profile', metavar='FILE',
+                      help='save the benchmark\'s cProfile stats to FILE')
+    parser.add_option('--top', type='int', default=25,
+                      help='number of functions to list in the report')
+    return parser.parse_args(arguments)[0]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+""" memory.py: Contains the Memory_Tracker class. """
+
+
+import collections
+import gc
+import os
+import sys
+
+
+class Memory_Tracker:
+    
+    """ A class for finding memory leaks. At each snapshot it records the
+    resident memory of the process and the number of live objects of each
+    type, and compares them with the first snapshot taken with the same
+    label (so the menu is compared with the menu, a game with a game, and so
+    on). The types whose counts grew the most are where memory is being lost.
+    When not enabled, all methods return straight away. """
+    
+    def __init__(self, enabled):
+        """ Initialise.
+        
+        __init__(bool) -> void
+        """
+        
+        self._enabled = enabled
+        self._labels = []       # In the order they were first snapshotted
+        self._first = {}
+        self._last = {}
+        self._resident = {}
+    
+    def is_enabled(self):
+        """ Return True if the tracker is taking snapshots.
+        
+        is_enabled() -> bool
+        """
+        
+        return self._enabled
+    
+    def snapshot(self, label):
+        """ Record the resident memory and count the live objects of each type,
+        under the given label.
+        
+        snapshot(string) -> void
+        """
+        
+        if not self._enabled: return
+        gc.collect()
+        counts = collections.defaultdict(int)
+        for obj in gc.get_objects():
+            counts[_type_name(obj)] += 1
+        resident = get_resident_memory()
+        
+        if label not in self._first:
+            self._labels.append(label)
+            self._first[label] = counts
+            self._resident[label] = []
+        self._last[label] = counts
+        self._resident[label].append(resident)
+    
+    def get_resident(self, label):
+        """ Return the resident memory (in KB) recorded at each snapshot taken
+        with the given label, in order.
+        
+        get_resident(string) -> list<int>
+        """
+        
+        return list(self._resident.get(label, []))
+    
+    def get_growth(self, label, top=10):
+        """ Return the types of object whose counts grew the most between the
+        first and last snapshots with the given label, as pairs of the type's
+        name and how many more objects of it there are, largest first.
+        
+        get_growth(string, int) -> list<(string, int)>
+        """
+        
+        if label not in self._first:
+            return []
+        first = self._first[label]
+        last = self._last[label]
+        growth = [(name, count - first.get(name, 0))
+                  for name, count in last.iteritems()]
+        growth = [n for n in growth if n[1] > 0]
+        growth.sort(key=lambda n: (-n[1], n[0]))
+        return growth[:top]
+    
+    def get_report(self, top=10):
+        """ Return a list of lines of text describing, for each label, how the
+        resident memory changed over its snapshots and which types of object
+        grew the most.
+        
+        get_report(int) -> list<string>
+        """
+        
+        lines = []
+        for label in self._labels:
+            resident = self._resident[label]
+            lines.append('%s: %d snapshots, %d KB -> %d KB (%+d KB)' %
+                         (label, len(resident), resident[0], resident[-1],
+                          resident[-1] - resident[0]))
+            for name, count in self.get_growth(label, top):
+                lines.append('  %+8d  %s' % (count, name))
+        return lines
+    
+    def dump(self, filename, top=10):
+        """ Write the report to the given file.
+        
+        dump(string, int) -> void
+        """
+        
+        if not self._enabled: return
+        file_handle = open(filename, 'w')
+        for line in self.get_report(top):
+            file_handle.write(line + '\n')
+        file_handle.close()
+
+
+def get_resident_memory():
+    """ Return the resident memory of the process in KB. Where the current
+    figure can't be read (anywhere but Linux) the peak is returned instead,
+    and 0 if neither is available.
+    
+    get_resident_memory() -> int
+    """
+    
+    try:
+        file_handle = open('/proc/self/statm', 'r')
+        pages = int(file_handle.read().split()[1])
+        file_handle.close()
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+def _type_name(obj):
+    """ Return the name of the given object's type, with its module. Instances
+    of old-style classes are named by their class.
+    
+    _type_name(object) -> string
+    """
+    
+    kind = getattr(obj, '__class__', type(obj))
+    module = getattr(kind, '__module__', None)
+    if module in [None, '__builtin__']:
+        return kind.__name__
+    return module + '.' + kind.__name__
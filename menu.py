@@ -14,19 +14,23 @@ class Menu:
     """ The menu class which handles the running of the application while
     in the menu. """
     
-    def __init__(self, master, view, event_handler, sound, level=1, order=4):
-        """ Initialise the menu with the given level and order pre-selected.
+    def __init__(self, master, view, event_handler, sound, level=1, order=4,
+                 players=1):
+        """ Initialise the menu with the given level, order and number of
+        players pre-selected.
         
-        __init__(Ominohs, View, Event_Handler, Sound, int, int) -> void
+        __init__(Ominohs, View, Event_Handler, Sound, int, int, int) -> void
         """
         
         self._master = master
+        self._profiler = master.get_profiler()
         self._view = view
         self._events = event_handler
         self._sound = sound
         
         self._order = order
         self._level = level
+        self._players = players
         
         self._sfx = sound.get_sound_effects_on()
         self._music = sound.get_music_on()
@@ -41,6 +45,9 @@ class Menu:
         self._name_selected = 0
         self._alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ_'
         self._highlight_score = -1
+        
+        self._running = False
+        self._result = (0, 0)
     
     def change_state(self, state):
         """ Change the state of the menu.
@@ -91,6 +98,14 @@ class Menu:
         
         return self._level
     
+    def get_players(self):
+        """ Return the currently selected number of players.
+        
+        get_players() -> int
+        """
+        
+        return self._players
+    
     def get_sfx(self):
         """ Return the currently selected sound effects option.
         
@@ -133,126 +148,206 @@ class Menu:
         """
         
         self._events.clear_queue()
+        self._register_handlers()
         clock = pygame.time.Clock()
         
         # Timer for changing random omino being displayed
-        pygame.time.set_timer(constants.USEREVENT, 1000)
+        pygame.time.set_timer(config.EVENT_RANDOM_OMINO, 1000)
         
-        while True:
+        profiler = self._profiler
+        self._running = True
+        while self._running:
             
             # Events
-            for event in self._events.get_events():
-                
-                # Normal Menu
-                if self._state == config.GS_MENU:
-                    if event.type == constants.KEYDOWN:
-                        if event.key == constants.K_UP:
-                            self._selected = (self._selected - 1) % \
-                                             config.MENU_LENGTH
-                            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_DOWN:
-                            self._selected = (self._selected + 1) % \
-                                             config.MENU_LENGTH
-                            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_LEFT:
-                            if self._selected == config.MENU_ORDER and \
-                               self._order > 1:
-                                self._order -= 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                                self._new_random_omino()
-                            elif self._selected == config.MENU_LEVEL and \
-                                 self._level > 1:
-                                self._level -= 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                            elif self._selected == config.MENU_SFX and \
-                                 self._sfx == 'Off':
-                                self._sfx = 'On'
-                                self._sound.toggle_sound_effects()
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                            elif self._selected == config.MENU_MUSIC and \
-                                 self._music == 'Off':
-                                self._music = 'On'
-                                self._sound.toggle_music()
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_RIGHT:
-                            if self._selected == config.MENU_ORDER and \
-                               self._order < 6:
-                                self._order += 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                                self._new_random_omino()
-                            elif self._selected == config.MENU_LEVEL and \
-                                 self._level < 9:
-                                self._level += 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                            elif self._selected == config.MENU_SFX and \
-                                 self._sfx == 'On':
-                                self._sfx = 'Off'
-                                self._sound.toggle_sound_effects()
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                            elif self._selected == config.MENU_MUSIC and \
-                                 self._music == 'On':
-                                self._music = 'Off'
-                                self._sound.toggle_music()
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_RETURN:
-                            if self._selected == config.MENU_START:
-                                self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                                return (self._order, self._level)
-                            elif self._selected == config.MENU_QUIT:
-                                self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                                return (0, 0)
-                            elif self._selected == config.MENU_HELP:
-                                self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                                self._master.change_state(config.GS_MENU_HELP)
-                            elif self._selected == config.MENU_HIGHSCORES:
-                                self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                                self._master.change_state(config.GS_MENU_HIGHSCORES)
-                    elif event.type == constants.USEREVENT:
-                        self._new_random_omino()
-                
-                # Help or highscores being shown
-                elif self._state in [config.GS_MENU_HELP,
-                                     config.GS_MENU_HIGHSCORES]:
-                    if event.type == constants.KEYDOWN:
-                        if event.key in [constants.K_RETURN, constants.K_ESCAPE]:
-                            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                            self._highlight_score = -1
-                            self._master.change_state(config.GS_MENU)
-                
-                # Enter highscore
-                elif self._state == config.GS_MENU_ENTER_HIGHSCORE:
-                    if event.type == constants.KEYDOWN:
-                        if event.key == constants.K_RETURN:
-                            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
-                            index = self._master.add_score(''.join(self._highscore_name),
-                                                           self.highscore)
-                            self._highlight_score = index
-                            self._master.change_state(config.GS_MENU_HIGHSCORES)
-                        elif event.key == constants.K_LEFT:
-                            if self._name_selected > 0:
-                                self._name_selected -= 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_RIGHT:
-                            if self._name_selected < 2:
-                                self._name_selected += 1
-                                self._sound.play_sound_effect(config.SFX_MENU_MOVE)
-                        elif event.key == constants.K_UP:
-                            current = self._highscore_name[self._name_selected]
-                            self._highscore_name[self._name_selected] = \
-                                self._next_letter(current, -1)
-                        elif event.key == constants.K_DOWN:
-                            current = self._highscore_name[self._name_selected]
-                            self._highscore_name[self._name_selected] = \
-                                self._next_letter(current)
-                
-                if event.type == constants.QUIT:
-                    return (0, 0)
+            profiler.begin_frame()
+            profiler.start('events')
+            events = self._events.get_events()
+            profiler.stop('events')
+            profiler.start('dispatch')
+            for event in events:
+                self._events.dispatch(self._state, event)
+                if not self._running:
+                    break
+            profiler.stop('dispatch')
+            if not self._running:
+                break
             
             self._view.update()
-            clock.tick(60)
+            profiler.end_frame()
+            clock.tick(config.frame_rate)
+        
+        self._events.unregister(config.MENU_STATES)
+        pygame.time.set_timer(config.EVENT_RANDOM_OMINO, 0)
+        return self._result
+    
+    def _register_handlers(self):
+        """ Register the menu's event handlers for each menu state with the
+        event handler. """
+        
+        register = self._events.register
+        KEYDOWN = constants.KEYDOWN
+        
+        # Normal menu
+        menu = [config.GS_MENU]
+        register(menu, KEYDOWN, constants.K_UP, self._select_previous)
+        register(menu, KEYDOWN, constants.K_DOWN, self._select_next)
+        register(menu, KEYDOWN, constants.K_LEFT, self._decrease_setting)
+        register(menu, KEYDOWN, constants.K_RIGHT, self._increase_setting)
+        register(menu, KEYDOWN, constants.K_RETURN, self._choose)
+        register(menu, config.EVENT_RANDOM_OMINO, None,
+                 self._change_random_omino)
+        
+        # Help or highscores being shown
+        screens = [config.GS_MENU_HELP, config.GS_MENU_HIGHSCORES]
+        register(screens, KEYDOWN, constants.K_RETURN, self._close_screen)
+        register(screens, KEYDOWN, constants.K_ESCAPE, self._close_screen)
+        
+        # Enter highscore
+        entry = [config.GS_MENU_ENTER_HIGHSCORE]
+        register(entry, KEYDOWN, constants.K_RETURN, self._enter_highscore)
+        register(entry, KEYDOWN, constants.K_LEFT, self._previous_character)
+        register(entry, KEYDOWN, constants.K_RIGHT, self._next_character)
+        register(entry, KEYDOWN, constants.K_UP, self._letter_back)
+        register(entry, KEYDOWN, constants.K_DOWN, self._letter_forward)
+        
+        register(config.MENU_STATES, constants.QUIT, None, self._quit)
+    
+    def _stop(self, result):
+        """ End the menu loop, returning the given result from it.
+        
+        _stop((int, int)) -> void
+        """
+        
+        self._result = result
+        self._running = False
+    
+    def _select_previous(self, event):
+        """ Move the selection up the menu. """
+        
+        self._selected = (self._selected - 1) % config.MENU_LENGTH
+        self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _select_next(self, event):
+        """ Move the selection down the menu. """
+        
+        self._selected = (self._selected + 1) % config.MENU_LENGTH
+        self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _decrease_setting(self, event):
+        """ Move the selected setting, if one is selected, one option left. """
+        
+        if self._selected == config.MENU_ORDER and self._order > 1:
+            self._order -= 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+            self._new_random_omino()
+        elif self._selected == config.MENU_LEVEL and self._level > 1:
+            self._level -= 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_PLAYERS and self._players > 1:
+            self._players -= 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_SFX and self._sfx == 'Off':
+            self._sfx = 'On'
+            self._sound.toggle_sound_effects()
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_MUSIC and self._music == 'Off':
+            self._music = 'On'
+            self._sound.toggle_music()
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _increase_setting(self, event):
+        """ Move the selected setting, if one is selected, one option right. """
+        
+        if self._selected == config.MENU_ORDER and self._order < 6:
+            self._order += 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+            self._new_random_omino()
+        elif self._selected == config.MENU_LEVEL and self._level < 9:
+            self._level += 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_PLAYERS and \
+             self._players < len(config.versus_keys):
+            self._players += 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_SFX and self._sfx == 'On':
+            self._sfx = 'Off'
+            self._sound.toggle_sound_effects()
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+        elif self._selected == config.MENU_MUSIC and self._music == 'On':
+            self._music = 'Off'
+            self._sound.toggle_music()
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _choose(self, event):
+        """ Carry out the selected menu item, if it is a button. """
+        
+        if self._selected == config.MENU_START:
+            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+            self._stop((self._order, self._level))
+        elif self._selected == config.MENU_QUIT:
+            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+            self._stop((0, 0))
+        elif self._selected == config.MENU_HELP:
+            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+            self._master.change_state(config.GS_MENU_HELP)
+        elif self._selected == config.MENU_HIGHSCORES:
+            self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+            self._master.change_state(config.GS_MENU_HIGHSCORES)
+    
+    def _change_random_omino(self, event):
+        """ Show a different random omino. """
+        
+        self._new_random_omino()
+    
+    def _close_screen(self, event):
+        """ Close the help or highscores screen and go back to the menu. """
+        
+        self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+        self._highlight_score = -1
+        self._master.change_state(config.GS_MENU)
+    
+    def _enter_highscore(self, event):
+        """ Add the entered name and score to the highscores and show them. """
+        
+        self._sound.play_sound_effect(config.SFX_MENU_SELECT)
+        index = self._master.add_score(''.join(self._highscore_name),
+                                       self.highscore)
+        self._highlight_score = index
+        self._master.change_state(config.GS_MENU_HIGHSCORES)
+    
+    def _previous_character(self, event):
+        """ Select the previous character of the highscore name. """
+        
+        if self._name_selected > 0:
+            self._name_selected -= 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _next_character(self, event):
+        """ Select the next character of the highscore name. """
+        
+        if self._name_selected < 2:
+            self._name_selected += 1
+            self._sound.play_sound_effect(config.SFX_MENU_MOVE)
+    
+    def _letter_back(self, event):
+        """ Change the selected character of the highscore name to the
+        previous letter. """
+        
+        current = self._highscore_name[self._name_selected]
+        self._highscore_name[self._name_selected] = \
+            self._next_letter(current, -1)
+    
+    def _letter_forward(self, event):
+        """ Change the selected character of the highscore name to the
+        next letter. """
+        
+        current = self._highscore_name[self._name_selected]
+        self._highscore_name[self._name_selected] = self._next_letter(current)
+    
+    def _quit(self, event):
+        """ End the application. """
         
-        pygame.time.set_timer(constants.USEREVENT, 0)
-        return (self._order, self._level)
+        self._stop((0, 0))
     
     def _new_random_omino(self):
         """ Generate a new random omino number of the currently selected order.
@@ -261,7 +356,7 @@ class Menu:
         if self._order in [1, 2]:
             new = 0
         else:
-            max = len(self._master._ominoes[self._order - 1][0]) - 1
+            max = len(self._master.get_ominoes(self._order)[0]) - 1
             new = random.randint(0, max)
             while new == self._rand_omino:
                 new = random.randint(0, max)
@@ -0,0 +1,1079 @@
+""" network.py: Contains the Link, Server, Client, Remote_Board and Net_Versus
+classes, for playing versus games over a network. """
+
+
+import collections
+import errno
+import heapq
+import random
+import select
+import socket
+import struct
+import pygame.constants as constants
+import pygame.time
+
+import config
+from event_handler import key_code
+from field import *
+from profiler import *
+from versus import *
+
+
+# Every packet starts with this header: magic, message type, sequence number
+# and acknowledgement. A client's key packets are numbered by the last key
+# press in them and acknowledge the last boards it received. The server's board
+# packets are numbered by the boards sent and acknowledge the last key press of
+# the client's which was applied
+NET_MAGIC = 'PNET'
+_header = struct.Struct('<4sBII')
+
+# Message types
+MSG_HELLO = 0       # Client asks to join
+MSG_WELCOME = 1     # Server gives the client its player number and the game
+MSG_KEYS = 2        # Client sends the key presses not yet acknowledged
+MSG_BOARDS = 3      # Server sends every board, as changes to an earlier send
+
+# Player, players, order, level, board width and height
+_welcome = struct.Struct('<BBBBBB')
+# Number of key presses, which follow as a byte each: the action, plus 128 if
+# the key was pressed rather than released
+_keys = struct.Struct('<B')
+# Sequence number of the boards the changes are against, boards and winner
+_boards = struct.Struct('<IBB')
+# Each board's score, lines, garbage waiting, whether it is playing and the
+# size of its changed rows, which follow (see _pack_rows)
+_board = struct.Struct('<IIHBH')
+
+# Winners of a game still being played, and of one which ended in a draw
+_PLAYING = 255
+_DRAW = 254
+
+
+class Link:
+    
+    """ A class for sending and receiving packets over UDP without blocking.
+    A link can pretend to be a poor network, holding each packet back for the
+    given latency plus up to the given jitter, and losing the given fraction
+    of them, so network play can be tested over loopback. Time is advanced by
+    step, so packets are delayed in step with the game logic. """
+    
+    def __init__(self, address, latency=0, jitter=0, loss=0.0, seed=None):
+        """ Open a link on the given (host, port) address. A port of 0 picks a
+        free one.
+        
+        __init__((string, int), float, float, float, int) -> void
+        """
+        
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(0)
+        self._socket.bind(address)
+        self._latency = latency
+        self._jitter = jitter
+        self._loss = loss
+        self._random = random.Random(seed)
+        
+        self._time = 0.0
+        self._queue = []    # Heap of (time due, number sent, data, address)
+        self._queued = 0
+        self._bytes_sent = 0
+        self._bytes_received = 0
+    
+    def get_address(self):
+        """ Return the (host, port) address the link is bound to.
+        
+        get_address() -> (string, int)
+        """
+        
+        return self._socket.getsockname()
+    
+    def get_bytes_sent(self):
+        """ Return the number of bytes sent, including any lost on purpose.
+        
+        get_bytes_sent() -> int
+        """
+        
+        return self._bytes_sent
+    
+    def get_bytes_received(self):
+        """ Return the number of bytes received.
+        
+        get_bytes_received() -> int
+        """
+        
+        return self._bytes_received
+    
+    def send(self, data, address):
+        """ Send the given packet to the given address, once the link's
+        latency has passed, unless the link loses it.
+        
+        send(string, (string, int)) -> void
+        """
+        
+        self._bytes_sent += len(data)
+        if self._loss and self._random.random() < self._loss:
+            return
+        delay = self._latency
+        if self._jitter:
+            delay += self._random.uniform(0, self._jitter)
+        if delay <= 0:
+            self._send(data, address)
+            return
+        heapq.heappush(self._queue, (self._time + delay, self._queued, data,
+                                     address))
+        self._queued += 1
+    
+    def step(self, time):
+        """ Advance time by the given number of milliseconds, and send the
+        packets which are now due.
+        
+        step(float) -> void
+        """
+        
+        self._time += time
+        while self._queue and self._queue[0][0] <= self._time:
+            due, number, data, address = heapq.heappop(self._queue)
+            self._send(data, address)
+    
+    def receive(self):
+        """ Return the packets which have arrived, as pairs of the data and
+        the address it came from, without waiting for any more.
+        
+        receive() -> list<(string, (string, int))>
+        """
+        
+        packets = []
+        while select.select([self._socket], [], [], 0)[0]:
+            try:
+                data, address = self._socket.recvfrom(65536)
+            except socket.error, error:
+                # Windows reports an earlier packet couldn't be delivered here
+                if error.args[0] == errno.ECONNRESET:
+                    continue
+                raise
+            self._bytes_received += len(data)
+            packets.append((data, address))
+        return packets
+    
+    def close(self):
+        """ Close the link. Packets still being held back are lost. """
+        
+        self._socket.close()
+    
+    def _send(self, data, address):
+        """ Send the given packet now. A packet which can't be sent is lost,
+        as it could be anywhere else on the network.
+        
+        _send(string, (string, int)) -> void
+        """
+        
+        try:
+            self._socket.sendto(data, address)
+        except socket.error:
+            pass
+
+
+class Server:
+    
+    """ A class for hosting a versus game for clients over a network. The
+    server runs every board itself, from the key presses its clients send, and
+    regularly sends all the boards back. Each send only has the rows which have
+    changed since the last boards the client acknowledged, with each row's
+    blocks packed into bits, so little is sent even for the biggest boards. A
+    client which has fallen too far behind is sent every row (a resync). """
+    
+    def __init__(self, link, level, order, ominoes, players, seed=None):
+        """ Initialise a server on the given link for a versus game between
+        the given number of players, with the given level and order, and given
+        list of ominoes. The game starts once every player has joined.
+        
+        __init__(Link, int, int,
+                 (list<list<list<bool>>>,
+                  list<((int, int, int), (int, int, int), (int, int, int))>),
+                 int, int) -> void
+        """
+        
+        self._link = link
+        self._level = level
+        self._order = order
+        self._profiler = Profiler(False)
+        
+        if seed == None:
+            seed = random.randint(0, 2 ** 31 - 1)
+        self._boards = [Board(_No_Sound(), level, order, ominoes, seed)
+                        for i in xrange(players)]
+        self._codes = _cell_codes(ominoes[1])
+        self._size = self._boards[0].get_field().get_size()
+        self._cell_bits = _bit_length(len(self._codes))
+        self._settled = [(None, None)] * players
+        
+        self._peers = {}
+        self._started = False
+        self._winner = _PLAYING
+        self._lag = 0.0
+        self._send_time = 0.0
+        
+        # The boards sent, by sequence number. The empty boards every game
+        # starts with are always kept as 0, to resync against
+        self._sequence = 0
+        self._history = {0: [_empty_rows(*self._size)] * players}
+        self._sent = collections.deque()
+    
+    def get_boards(self):
+        """ Return the players' boards, in player order.
+        
+        get_boards() -> list<Board>
+        """
+        
+        return self._boards
+    
+    def get_sent_boards(self, sequence):
+        """ Return the rows of every board as sent with the given sequence
+        number, or None if they are no longer kept.
+        
+        get_sent_boards(int) -> list<list<tuple<int>>>
+        """
+        
+        return self._history.get(sequence)
+    
+    def is_started(self):
+        """ Return True once every player has joined.
+        
+        is_started() -> bool
+        """
+        
+        return self._started
+    
+    def close(self):
+        """ Close the server's link. """
+        
+        self._link.close()
+    
+    def step(self, time):
+        """ Advance the server by the given number of milliseconds: handle the
+        packets which have arrived, step the boards, and send them to the
+        clients if it is time to.
+        
+        step(float) -> void
+        """
+        
+        self._link.step(time)
+        for data, address in self._link.receive():
+            self._handle(data, address)
+        
+        # The boards are stepped in the same fixed ticks as a local game
+        if self._started and self._winner == _PLAYING:
+            tick_time = 1000.0 / config.logic_rate
+            self._lag = min(self._lag + time, config.max_catch_up)
+            while self._lag >= tick_time:
+                playing = step_boards(self._boards, tick_time, self._profiler)
+                self._lag -= tick_time
+                if len(playing) == 1:
+                    self._winner = playing[0]
+                elif not playing:
+                    self._winner = _DRAW
+                if self._winner != _PLAYING:
+                    break
+        
+        self._send_time += time
+        if self._send_time >= config.net_send_interval:
+            self._send_time %= config.net_send_interval
+            self._send_boards()
+    
+    def _handle(self, data, address):
+        """ Handle a packet from the given address. Packets which aren't
+        understood are ignored.
+        
+        _handle(string, (string, int)) -> void
+        """
+        
+        try:
+            magic, kind, sequence, ack = _header.unpack_from(data)
+        except struct.error:
+            return
+        if magic != NET_MAGIC:
+            return
+        peer = self._peers.get(address)
+        
+        if kind == MSG_HELLO:
+            if peer == None:
+                if len(self._peers) == len(self._boards):
+                    return
+                peer = _Peer(len(self._peers))
+                self._peers[address] = peer
+                if len(self._peers) == len(self._boards):
+                    for board in self._boards:
+                        board.start()
+                    self._started = True
+            welcome = _welcome.pack(peer.player, len(self._boards),
+                                    self._order, self._level, *self._size)
+            self._link.send(_header.pack(NET_MAGIC, MSG_WELCOME, 0, 0) +
+                            welcome, address)
+        
+        elif kind == MSG_KEYS and peer != None:
+            # An acknowledgement of 0 asks for a resync
+            if ack == 0 or ack > peer.acked:
+                peer.acked = ack
+            offset = _header.size + _keys.size
+            try:
+                count = _keys.unpack_from(data, _header.size)[0]
+            except struct.error:
+                return
+            keys = data[offset:offset + count]
+            board = self._boards[peer.player]
+            first = sequence - len(keys) + 1
+            for i, key in enumerate(keys):
+                if first + i <= peer.keys:
+                    continue
+                peer.keys = first + i
+                action = ord(key) & 127
+                if not self._started or action > DROP or \
+                   not board.is_playing():
+                    continue
+                if ord(key) & 128:
+                    board.press(action)
+                else:
+                    board.release(action)
+    
+    def _send_boards(self):
+        """ Send every board to every client, as the rows changed since the
+        boards it last acknowledged. """
+        
+        if not self._peers:
+            return
+        self._sequence += 1
+        state = [self._board_rows(i) for i in xrange(len(self._boards))]
+        self._history[self._sequence] = state
+        self._sent.append(self._sequence)
+        if len(self._sent) > config.net_history:
+            del self._history[self._sent.popleft()]
+        
+        width, height = self._size
+        row_bits = _bit_length(height)
+        info = [(board.get_score(), board.get_lines_cleared(),
+                 board.get_garbage(), board.is_playing())
+                for board in self._boards]
+        
+        # Clients which acknowledged the same boards are sent the same changes
+        changes = {}
+        for address, peer in self._peers.items():
+            base = peer.acked
+            if base not in self._history:
+                base = 0
+            if base not in changes:
+                packet = [_boards.pack(base, len(self._boards), self._winner)]
+                for i, rows in enumerate(state):
+                    data = _pack_rows(rows, self._history[base][i], width,
+                                      row_bits, self._cell_bits)
+                    packet.append(_board.pack(*(info[i] + (len(data),))))
+                    packet.append(data)
+                changes[base] = ''.join(packet)
+            header = _header.pack(NET_MAGIC, MSG_BOARDS, self._sequence,
+                                  peer.keys)
+            self._link.send(header + changes[base], address)
+    
+    def _board_rows(self, index):
+        """ Return the rows of the given board, with the moving omino in them,
+        as tuples of cell codes (see _cell_codes). The settled rows are only
+        worked out again when the board's field has changed.
+        
+        _board_rows(int) -> list<tuple<int>>
+        """
+        
+        field = self._boards[index].get_field()
+        version, settled = self._settled[index]
+        if version != field.get_version():
+            codes = self._codes
+            settled = [tuple([cell[0] and codes[cell[1]] or 0
+                              for cell in line])
+                       for line in field.get_grid()]
+            self._settled[index] = (field.get_version(), settled)
+        
+        rows = list(settled)
+        omino = field.get_omino()
+        if omino != None:
+            width, height = self._size
+            code = self._codes[omino.get_colour()]
+            location = omino.get_location()
+            for i, line in enumerate(omino.get_shape()):
+                y = location.y + i
+                if y >= height or True not in line:
+                    continue
+                row = list(rows[y])
+                for j, filled in enumerate(line):
+                    if filled and location.x + j < width:
+                        row[location.x + j] = code
+                rows[y] = tuple(row)
+        return rows
+
+
+class Client:
+    
+    """ A class for playing in a versus game hosted by a server over a network.
+    Key presses are numbered and sent to the server until it acknowledges
+    them. The boards the server sends back are rebuilt into remote boards,
+    which can be drawn like local ones. """
+    
+    def __init__(self, link, address, ominoes):
+        """ Initialise a client on the given link, to join the server at the
+        given (host, port) address. The ominoes and colours of every order are
+        given, as they are generated by the application.
+        
+        __init__(Link, (string, int),
+                 list<(list<list<list<bool>>>,
+                       list<((int, int, int), (int, int, int),
+                             (int, int, int))>)>) -> void
+        """
+        
+        self._link = link
+        self._address = address
+        self._ominoes = ominoes
+        
+        self._player = None
+        self._order = None
+        self._level = None
+        self._boards = []
+        self._winner = _PLAYING
+        
+        self._keys = []     # Pairs of (number, byte) not yet acknowledged
+        self._key_number = 0
+        self._send_time = config.net_send_interval
+        
+        self._sequence = 0
+        self._resync = False
+        self._history = {}
+        self._received = collections.deque()
+    
+    def get_player(self):
+        """ Return the index of the client's own board, or None until the
+        server has welcomed the client.
+        
+        get_player() -> int
+        """
+        
+        return self._player
+    
+    def get_order(self):
+        """ Return the polyomino order of the game, or None until the server
+        has welcomed the client.
+        
+        get_order() -> int
+        """
+        
+        return self._order
+    
+    def get_level(self):
+        """ Return the difficulty level of the game, or None until the server
+        has welcomed the client.
+        
+        get_level() -> int
+        """
+        
+        return self._level
+    
+    def get_boards(self):
+        """ Return the players' boards as last received, in player order.
+        
+        get_boards() -> list<Remote_Board>
+        """
+        
+        return self._boards
+    
+    def get_winner(self):
+        """ Return the index of the board which won, or None if the game isn't
+        over or every board topped out at once.
+        
+        get_winner() -> int
+        """
+        
+        if self._winner in [_PLAYING, _DRAW]:
+            return None
+        return self._winner
+    
+    def is_over(self):
+        """ Return True once the server has reported the game over.
+        
+        is_over() -> bool
+        """
+        
+        return self._winner != _PLAYING
+    
+    def get_sequence(self):
+        """ Return the sequence number of the last boards received.
+        
+        get_sequence() -> int
+        """
+        
+        return self._sequence
+    
+    def get_rows(self):
+        """ Return the rows of every board as last received, as tuples of cell
+        codes.
+        
+        get_rows() -> list<list<tuple<int>>>
+        """
+        
+        return self._history.get(self._sequence)
+    
+    def get_unacknowledged(self):
+        """ Return the number of key presses the server hasn't acknowledged.
+        
+        get_unacknowledged() -> int
+        """
+        
+        return len(self._keys)
+    
+    def close(self):
+        """ Close the client's link. """
+        
+        self._link.close()
+    
+    def press(self, action):
+        """ Send the server a key press for the given action.
+        
+        press(int) -> void
+        """
+        
+        self._key_number += 1
+        self._keys.append((self._key_number, chr(action | 128)))
+    
+    def release(self, action):
+        """ Send the server a key release for the given action.
+        
+        release(int) -> void
+        """
+        
+        self._key_number += 1
+        self._keys.append((self._key_number, chr(action)))
+    
+    def step(self, time):
+        """ Advance the client by the given number of milliseconds: handle the
+        packets which have arrived, and send the server the key presses it
+        hasn't acknowledged if it is time to.
+        
+        step(float) -> void
+        """
+        
+        self._link.step(time)
+        for data, address in self._link.receive():
+            if address == self._address:
+                self._handle(data)
+        
+        self._send_time += time
+        if self._send_time < config.net_send_interval:
+            return
+        self._send_time %= config.net_send_interval
+        if self._player == None:
+            self._link.send(_header.pack(NET_MAGIC, MSG_HELLO, 0, 0),
+                            self._address)
+            return
+        keys = self._keys[:255]
+        sequence = keys and keys[-1][0] or self._key_number
+        ack = self._sequence
+        if self._resync:
+            ack = 0
+        self._link.send(_header.pack(NET_MAGIC, MSG_KEYS, sequence, ack) +
+                        _keys.pack(len(keys)) + ''.join([n[1] for n in keys]),
+                        self._address)
+    
+    def _handle(self, data):
+        """ Handle a packet from the server. Packets which aren't understood,
+        or are older than the last boards received, are ignored.
+        
+        _handle(string) -> void
+        """
+        
+        try:
+            magic, kind, sequence, ack = _header.unpack_from(data)
+        except struct.error:
+            return
+        if magic != NET_MAGIC:
+            return
+        
+        if kind == MSG_WELCOME and self._player == None:
+            try:
+                player, players, order, level, width, height = \
+                    _welcome.unpack_from(data, _header.size)
+            except struct.error:
+                return
+            colours = self._ominoes[order - 1][1]
+            self._palettes = [(0, 0, 0)] + colours + [config.garbage_palette]
+            self._size = (width, height)
+            self._cell_bits = _bit_length(len(colours) + 1)
+            self._boards = [Remote_Board(order, width, height)
+                            for i in xrange(players)]
+            self._history = {0: [_empty_rows(width, height)] * players}
+            self._order = order
+            self._level = level
+            self._player = player
+        
+        elif kind == MSG_BOARDS and self._player != None:
+            if sequence <= self._sequence:
+                return
+            self._keys = [n for n in self._keys if n[0] > ack]
+            try:
+                base, count, winner = _boards.unpack_from(data, _header.size)
+                if base not in self._history:
+                    # Too far behind to follow the changes
+                    self._resync = True
+                    return
+                width, height = self._size
+                row_bits = _bit_length(height)
+                offset = _header.size + _boards.size
+                state = []
+                info = []
+                for i in xrange(count):
+                    board = _board.unpack_from(data, offset)
+                    offset += _board.size
+                    rows = data[offset:offset + board[-1]]
+                    offset += board[-1]
+                    state.append(_unpack_rows(rows, self._history[base][i],
+                                              width, row_bits,
+                                              self._cell_bits))
+                    info.append(board[:-1])
+            except (struct.error, ValueError, IndexError):
+                return
+            if count != len(self._boards) or \
+               max([max(row) for rows in state for row in rows] or [0]) >= \
+               len(self._palettes):
+                return
+            
+            for board, rows, values in zip(self._boards, state, info):
+                board.update(rows, self._palettes, *values)
+            self._history[sequence] = state
+            self._received.append(sequence)
+            if len(self._received) > config.net_history:
+                del self._history[self._received.popleft()]
+            self._sequence = sequence
+            self._resync = False
+            self._winner = winner
+
+
+class Remote_Board:
+    
+    """ A class for a board being played on a server, as last received by a
+    client. It has the same accessors as a Board, so either can be drawn. The
+    moving omino is part of the field's grid, as the server sends it. """
+    
+    def __init__(self, order, width, height):
+        """ Initialise an empty board of the given order and size.
+        
+        __init__(int, int, int) -> void
+        """
+        
+        self._field = Field(order, width, height)
+        self._rows = _empty_rows(width, height)
+        self._score = 0
+        self._lines = 0
+        self._garbage = 0
+        self._playing = True
+    
+    def get_field(self):
+        """ Return the board's field.
+        
+        get_field() -> Field
+        """
+        
+        return self._field
+    
+    def get_score(self):
+        """ Return the board's score.
+        
+        get_score() -> int
+        """
+        
+        return self._score
+    
+    def get_lines_cleared(self):
+        """ Return the number of lines cleared on the board.
+        
+        get_lines_cleared() -> int
+        """
+        
+        return self._lines
+    
+    def get_garbage(self):
+        """ Return the number of garbage lines waiting to be added to the
+        board.
+        
+        get_garbage() -> int
+        """
+        
+        return self._garbage
+    
+    def is_playing(self):
+        """ Return False once the board's blocks have reached the top.
+        
+        is_playing() -> bool
+        """
+        
+        return self._playing
+    
+    def update(self, rows, palettes, score, lines, garbage, playing):
+        """ Update the board to the given rows of cell codes, the palettes of
+        which are given, and the given score, lines, garbage and playing flag.
+        Only the rows which have changed are replaced in the field.
+        
+        update(list<tuple<int>>,
+               list<((int, int, int), (int, int, int), (int, int, int))>,
+               int, int, int, bool) -> void
+        """
+        
+        for i, row in enumerate(rows):
+            if row != self._rows[i]:
+                self._field.set_line(i, [(code != 0, palettes[code])
+                                         for code in row])
+        self._rows = rows
+        self._score = score
+        self._lines = lines
+        self._garbage = garbage
+        self._playing = bool(playing)
+
+
+class Net_Versus:
+    
+    """ The class which handles the application while the user plays in a
+    versus game over a network. The user's key presses are sent by a client to
+    the server running the game, and the boards it sends back are drawn as in
+    a local versus game. When the user is hosting, the server is run here
+    too, and the user joins it like any other player. The user plays with the
+    keys of the player they join as (see config.versus_keys). """
+    
+    def __init__(self, master, view, event_handler, sound, client,
+                 server=None):
+        """ Initialise a game played through the given client, which has not
+        yet joined, and the given server if the user is hosting.
+        
+        __init__(Ominohs, View, Event_Handler, Sound, Client, Server) -> void
+        """
+        
+        self._master = master
+        self._view = view
+        self._events = event_handler
+        self._sound = sound
+        self._client = client
+        self._server = server
+        self._order = None
+        self._level = None
+        
+        # The application stays on the loading screen until the client has
+        # joined, so the game starts out in that state
+        self._actions = {}
+        self._running = False
+        self._result = None
+        self._state = config.GS_LOADING
+    
+    def get_order(self):
+        """ Return the polyomino order of the game, or None until the client
+        has joined.
+        
+        get_order() -> int
+        """
+        
+        return self._order
+    
+    def get_level(self):
+        """ Return the difficulty level of the game, or None until the client
+        has joined.
+        
+        get_level() -> int
+        """
+        
+        return self._level
+    
+    def get_boards(self):
+        """ Return the players' boards as last received, in player order.
+        
+        get_boards() -> list<Remote_Board>
+        """
+        
+        return self._client.get_boards()
+    
+    def get_winner(self):
+        """ Return the index of the board which won, or None if the game isn't
+        over or every board topped out at once.
+        
+        get_winner() -> int
+        """
+        
+        return self._client.get_winner()
+    
+    def change_state(self, state):
+        """ Change the state of the game.
+        
+        change_state(int) -> void
+        """
+        
+        self._state = state
+    
+    def loop(self):
+        """ Main loop which joins the game, showing the loading screen until
+        the server has welcomed the client, then sends the user's key presses
+        and draws the boards until the game is over. Return -1 when the user
+        goes back to the menu, or None if the application should end.
+        
+        loop() -> int
+        """
+        
+        clock = pygame.time.Clock()
+        self._events.clear_queue()
+        self._register_handlers()
+        previous = pygame.time.get_ticks()
+        self._running = True
+        while self._running:
+            
+            if config.fixed_frame_time:
+                elapsed = config.fixed_frame_time
+            else:
+                now = pygame.time.get_ticks()
+                elapsed = now - previous
+                previous = now
+            
+            for event in self._events.get_events():
+                self._events.dispatch(self._state, event)
+                if not self._running:
+                    break
+            if not self._running:
+                break
+            
+            if self._server != None:
+                self._server.step(elapsed)
+            self._client.step(elapsed)
+            if self._state == config.GS_LOADING and \
+               self._client.get_player() != None:
+                self._join()
+            elif self._state == config.GS_VERSUS and self._client.is_over():
+                self._sound.stop_music()
+                self._sound.play_sound_effect(config.SFX_GAME_OVER)
+                self._master.change_state(config.GS_VERSUS_OVER)
+            
+            self._view.update()
+            clock.tick(config.frame_rate)
+        
+        self._events.unregister([config.GS_LOADING] + config.GAME_STATES)
+        self._client.close()
+        if self._server != None:
+            self._server.close()
+        return self._result
+    
+    def _join(self):
+        """ Start playing once the server has welcomed the client: take the
+        order and level of the game from it, and the keys of the player the
+        client joined as. """
+        
+        player = self._client.get_player()
+        self._order = self._client.get_order()
+        self._level = self._client.get_level()
+        for action, name in enumerate(config.versus_keys[player]):
+            self._actions[key_code(name)] = action
+        self._sound.play_next()
+        self._master.change_state(config.GS_VERSUS)
+    
+    def _register_handlers(self):
+        """ Register the game's event handlers for the loading screen, shown
+        while joining, and each versus state with the event handler. """
+        
+        register = self._events.register
+        KEYDOWN = constants.KEYDOWN
+        
+        # The game goes on while the user is away, so escape leaves it
+        register([config.GS_LOADING, config.GS_VERSUS], KEYDOWN,
+                 constants.K_ESCAPE, self._quit_to_menu)
+        register([config.GS_VERSUS], KEYDOWN, None, self._press_key)
+        register([config.GS_VERSUS], constants.KEYUP, None, self._release_key)
+        register([config.GS_VERSUS_OVER], KEYDOWN, constants.K_RETURN,
+                 self._finish)
+        
+        register(config.VERSUS_STATES, config.EVENT_MUSIC_STOP, None,
+                 self._next_track)
+        register([config.GS_LOADING] + config.VERSUS_STATES, constants.QUIT,
+                 None, self._quit)
+    
+    def _stop(self, result):
+        """ End the loop, returning the given result from it.
+        
+        _stop(int) -> void
+        """
+        
+        self._result = result
+        self._running = False
+    
+    def _press_key(self, event):
+        """ Send the action of one of the user's keys to the server. """
+        
+        if event.key in self._actions:
+            self._client.press(self._actions[event.key])
+    
+    def _release_key(self, event):
+        """ Send the release of one of the user's keys to the server. """
+        
+        if event.key in self._actions:
+            self._client.release(self._actions[event.key])
+    
+    def _quit_to_menu(self, event):
+        """ Leave the game and go back to the menu. """
+        
+        self._sound.stop_music()
+        self._stop(-1)
+    
+    def _finish(self, event):
+        """ Leave the game over screen. """
+        
+        self._stop(-1)
+    
+    def _next_track(self, event):
+        """ Keep the music going when a track finishes. """
+        
+        self._sound.track_ended()
+    
+    def _quit(self, event):
+        """ End the application. """
+        
+        self._stop(None)
+
+
+class _Peer:
+    
+    """ What the server knows of a client: its player number, the last boards
+    it acknowledged and the number of its last key press applied. """
+    
+    def __init__(self, player):
+        """ Initialise for the given player.
+        
+        __init__(int) -> void
+        """
+        
+        self.player = player
+        self.acked = 0
+        self.keys = 0
+
+
+class _No_Sound:
+    
+    """ Stands in for the Sound class on a server, which plays no sound. """
+    
+    def play_sound_effect(self, effect):
+        """ Do nothing. """
+        
+        pass
+
+
+class _Bit_Reader:
+    
+    """ A class for reading unsigned fields of any number of bits, least
+    significant first, from a string packed by _pack_bits. """
+    
+    def __init__(self, data):
+        """ Initialise to read the given string from the start.
+        
+        __init__(string) -> void
+        """
+        
+        self._value = 0
+        if data:
+            self._value = int(data[::-1].encode('hex'), 16)
+        self._left = len(data) * 8
+    
+    def read(self, bits):
+        """ Read and return the next field of the given number of bits. Raise
+        ValueError if there are not that many bits left.
+        
+        read(int) -> int
+        """
+        
+        if bits > self._left:
+            raise ValueError('Packet ended early')
+        field = self._value & ((1 << bits) - 1)
+        self._value >>= bits
+        self._left -= bits
+        return field
+
+
+def _cell_codes(colours):
+    """ Return a dictionary of the codes the blocks of each of the given
+    palettes, and of garbage, are sent as. Empty cells are sent as 0.
+    
+    _cell_codes(list<((int, int, int), (int, int, int), (int, int, int))>)
+        -> dict<((int, int, int), (int, int, int), (int, int, int)):int>
+    """
+    
+    codes = dict((colour, i + 1) for i, colour in enumerate(colours))
+    codes[config.garbage_palette] = len(colours) + 1
+    return codes
+
+def _empty_rows(width, height):
+    """ Return the rows of an empty board of the given size.
+    
+    _empty_rows(int, int) -> list<tuple<int>>
+    """
+    
+    return [(0,) * width] * height
+
+def _bit_length(n):
+    """ Return the number of bits needed to hold the numbers up to n.
+    
+    _bit_length(int) -> int
+    """
+    
+    return max(n.bit_length(), 1)
+
+def _pack_bits(fields):
+    """ Pack the given (value, bits) pairs into a string, each value taking
+    the given number of bits, least significant first.
+    
+    _pack_bits(list<(int, int)>) -> string
+    """
+    
+    value = 0
+    shift = 0
+    for field, bits in fields:
+        value |= field << shift
+        shift += bits
+    size = (shift + 7) // 8
+    if size == 0:
+        return ''
+    return ('%0*x' % (size * 2, value)).decode('hex')[::-1]
+
+def _pack_rows(rows, base, width, row_bits, cell_bits):
+    """ Pack the rows which differ from the given base rows into a string:
+    the number of them, then for each its index, a bit for each of its cells
+    telling whether it is filled, and the code of each filled cell.
+    
+    _pack_rows(list<tuple<int>>, list<tuple<int>>, int, int, int) -> string
+    """
+    
+    changed = [i for i, row in enumerate(rows) if row != base[i]]
+    fields = [(len(changed), row_bits)]
+    for i in changed:
+        row = rows[i]
+        filled = 0
+        for x, code in enumerate(row):
+            if code:
+                filled |= 1 << x
+        fields.append((i, row_bits))
+        fields.append((filled, width))
+        fields.extend([(code, cell_bits) for code in row if code])
+    return _pack_bits(fields)
+
+def _unpack_rows(data, base, width, row_bits, cell_bits):
+    """ Return the given base rows with the changed rows packed in the given
+    string (see _pack_rows) put in place. Raise ValueError if the string is
+    corrupt.
+    
+    _unpack_rows(string, list<tuple<int>>, int, int, int) -> list<tuple<int>>
+    """
+    
+    reader = _Bit_Reader(data)
+    rows = list(base)
+    for n in xrange(reader.read(row_bits)):
+        i = reader.read(row_bits)
+        if i >= len(rows):
+            raise ValueError('Row out of range')
+        filled = reader.read(width)
+        row = []
+        for x in xrange(width):
+            if filled >> x & 1:
+                row.append(reader.read(cell_bits))
+            else:
+                row.append(0)
+        rows[i] = tuple(row)
+    return rows
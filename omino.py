@@ -15,17 +15,24 @@ class Omino:
     
     def __init__(self, shape, colour, rotation=None):
         """ Create a new omino. Shape is a square 2D list filled with boolean
-        values representing the shape of the omino. Colour is a triple of RGB
-        values. Rotation is the rotation state, if left blank a random rotation
-        will be chosen.
-        
-        __init__(list<list<bool>>, (int, int int), int) -> void
+        values representing the shape of the omino, or a view of one from a
+        Shape_Catalog. Colour is a block palette, ie. a triple of RGB triples
+        (colour, highlight and shadow). Rotation is the rotation state, if
+        left blank a random rotation will be chosen.
+        
+        __init__(list<list<bool>>/Shape_View,
+                 ((int, int, int), (int, int, int), (int, int, int)), int)
+                 -> void
         Precondition: If rotation is given it is between 0 and 3 inclusive.
         """
         
-        self._shapes = [shape]
         self._order = len(shape)
-        self._find_rotations()
+        if hasattr(shape, 'get_rotations'):
+            # Shapes from a catalog come with their rotations already found
+            self._shapes, self._pivot, self._offsets = shape.get_rotations()
+        else:
+            self._shapes = [shape]
+            self._find_rotations()
         if rotation == None:
             self._rotation = random.randint(0, 3)
         else:
@@ -77,9 +84,10 @@ class Omino:
         return self._rotation
     
     def get_colour(self):
-        """ Return a triple with the RGB values giving the colour of the omino.
+        """ Return the block palette (colour, highlight and shadow RGB triples)
+        of the omino.
         
-        get_colour() -> (int, int, int)
+        get_colour() -> ((int, int, int), (int, int, int), (int, int, int))
         """
         
         return self._colour
@@ -0,0 +1,232 @@
+""" profiler.py: Contains the Profiler class. """
+
+
+import collections
+import json
+import timeit
+
+import config
+
+
+class Profiler:
+    
+    """ A class for timing the phases of each frame of the main loops (event
+    polling, event dispatch, game logic, line checking, rendering and display
+    updating). Keeps a rolling window of timings for each phase, from which
+    percentiles are worked out, and a record of the frames which took too
+    long. Input latency, from the start of a frame in which a key was pressed
+    to that frame being shown, is kept alongside the phases as 'input'. When
+    not enabled, all methods return straight away. """
+    
+    def __init__(self, enabled, window=None, hitch_time=None):
+        """ Initialise. Window is the number of frames timings are kept for
+        and hitch_time the time (in ms) above which a frame counts as a hitch.
+        If not given, they are taken from the config file.
+        
+        __init__(bool, int, float) -> void
+        """
+        
+        self._enabled = enabled
+        if window == None:
+            window = config.profile_window
+        if hitch_time == None:
+            hitch_time = config.profile_hitch_time
+        self._hitch_time = hitch_time
+        self._timer = timeit.default_timer
+        
+        self._phases = []   # In the order they were first timed
+        self._history = {}
+        self._window = window
+        self._frames = collections.deque(maxlen=window)
+        self._hitches = collections.deque(maxlen=config.profile_max_hitches)
+        
+        self._frame = {}
+        self._frame_start = None
+        self._starts = {}
+        self._key_pressed = False
+        self._frame_count = 0
+        self._last_dump = self._timer()
+    
+    def is_enabled(self):
+        """ Return True if the profiler is recording timings.
+        
+        is_enabled() -> bool
+        """
+        
+        return self._enabled
+    
+    def begin_frame(self):
+        """ Start timing a new frame. """
+        
+        if not self._enabled: return
+        self._frame = {}
+        self._starts = {}
+        self._frame_start = self._timer()
+    
+    def start(self, phase):
+        """ Start timing the given phase of the current frame.
+        
+        start(string) -> void
+        """
+        
+        if not self._enabled: return
+        self._starts[phase] = self._timer()
+    
+    def stop(self, phase):
+        """ Stop timing the given phase, adding the time since it was started
+        to the phase's total for the current frame.
+        
+        stop(string) -> void
+        Precondition: start has been called for the phase this frame.
+        """
+        
+        if not self._enabled: return
+        elapsed = (self._timer() - self._starts.pop(phase)) * 1000.0
+        self._frame[phase] = self._frame.get(phase, 0.0) + elapsed
+    
+    def key_down(self):
+        """ Note that a key press was handled in the current frame, so the
+        time until the frame is shown is recorded as input latency. """
+        
+        if not self._enabled: return
+        self._key_pressed = True
+    
+    def end_frame(self):
+        """ Finish timing the current frame, record it, and write a report to
+        the profile file if it is time to. """
+        
+        if not self._enabled or self._frame_start == None: return
+        now = self._timer()
+        total = (now - self._frame_start) * 1000.0
+        self._frame_start = None
+        self._frame_count += 1
+        
+        for phase, elapsed in self._frame.items():
+            if phase not in self._history:
+                self._phases.append(phase)
+                self._history[phase] = collections.deque(maxlen=self._window)
+        for phase in self._phases:
+            self._history[phase].append(self._frame.get(phase, 0.0))
+        self._frames.append(total)
+        
+        # Frames without a key press have no latency, so unlike the phases
+        # nothing is added for them
+        if self._key_pressed:
+            if 'input' not in self._history:
+                self._history['input'] = collections.deque(maxlen=self._window)
+            self._history['input'].append(total)
+            self._key_pressed = False
+        
+        if total > self._hitch_time:
+            self._hitches.append((self._frame_count, total, dict(self._frame)))
+        
+        if config.profile_dump_interval and \
+           now - self._last_dump >= config.profile_dump_interval:
+            self.dump(config.profile_filename)
+            self._last_dump = now
+    
+    def get_percentiles(self, phase, percentiles=(50, 95, 99)):
+        """ Return the given percentiles (in ms) of the given phase's timings
+        over the window, or of the whole frame if phase is None. Returns
+        zeroes if nothing has been timed.
+        
+        get_percentiles(string, list<int>) -> list<float>
+        """
+        
+        if phase == None:
+            timings = sorted(self._frames)
+        else:
+            timings = sorted(self._history.get(phase, []))
+        if not timings:
+            return [0.0] * len(percentiles)
+        last = len(timings) - 1
+        return [timings[int(round(last * p / 100.0))] for p in percentiles]
+    
+    def get_summary(self):
+        """ Return a list of lines of text summarising the 50th, 95th and 99th
+        percentiles of every phase, of input latency and of the whole frame, in
+        ms.
+        
+        get_summary() -> list<string>
+        """
+        
+        lines = []
+        for phase in self._reported():
+            name = phase or 'frame'
+            p50, p95, p99 = self.get_percentiles(phase)
+            lines.append('%-8s %5.1f %5.1f %5.1f' % (name, p50, p95, p99))
+        return lines
+    
+    def get_histogram(self, bounds=(2, 4, 8, 16, 33, 66)):
+        """ Return a histogram of the frame times over the window, as a list of
+        pairs of each bucket's upper bound in ms (None for the last, unbounded
+        bucket) and how many frames fell into it.
+        
+        get_histogram(list<float>) -> list<(float, int)>
+        """
+        
+        bounds = list(bounds) + [None]
+        counts = [0] * len(bounds)
+        for total in self._frames:
+            for i, bound in enumerate(bounds):
+                if bound == None or total < bound:
+                    counts[i] += 1
+                    break
+        return zip(bounds, counts)
+    
+    def get_hitches(self):
+        """ Return the recorded hitches as triples of the frame number, total
+        frame time and a dictionary of each phase's time (all times in ms).
+        
+        get_hitches() -> list<(int, float, dict<string:float>)>
+        """
+        
+        return list(self._hitches)
+    
+    def dump(self, filename):
+        """ Write the percentiles of each phase and the recorded hitches to the
+        given file, as JSON if its name ends in .json, otherwise as CSV.
+        
+        dump(string) -> void
+        """
+        
+        if not self._enabled: return
+        rows = []
+        for phase in self._reported():
+            p50, p95, p99 = self.get_percentiles(phase)
+            rows.append((phase or 'frame', p50, p95, p99))
+        
+        file_handle = open(filename, 'w')
+        if filename.endswith('.json'):
+            report = {'frames': self._frame_count,
+                      'phases': [{'phase': row[0], 'p50': row[1],
+                                  'p95': row[2], 'p99': row[3]}
+                                 for row in rows],
+                      'hitches': [{'frame': hitch[0], 'total': hitch[1],
+                                   'phases': hitch[2]}
+                                  for hitch in self._hitches]}
+            json.dump(report, file_handle, indent=1)
+        else:
+            file_handle.write('phase,p50,p95,p99\n')
+            for row in rows:
+                file_handle.write('%s,%.3f,%.3f,%.3f\n' % row)
+            file_handle.write('\nhitch frame,total,' +
+                              ','.join(self._phases) + '\n')
+            for frame, total, phases in self._hitches:
+                times = ['%.3f' % phases.get(phase, 0.0)
+                         for phase in self._phases]
+                file_handle.write('%d,%.3f,%s\n' % (frame, total,
+                                                    ','.join(times)))
+        file_handle.close()
+
+    def _reported(self):
+        """ Return the phases reported on in order, followed by 'input' if any
+        key presses have been timed, then None for the whole frame.
+        
+        _reported() -> list<string>
+        """
+        
+        phases = list(self._phases)
+        if 'input' in self._history:
+            phases.append('input')
+        return phases + [None]
@@ -0,0 +1,539 @@
+""" solver.py: Contains the Exact_Cover and Tiling classes. """
+
+
+import multiprocessing
+
+from omino import *
+
+
+class Exact_Cover:
+    
+    """ A class for solving exact cover problems with Knuth's Algorithm X,
+    using Dancing Links: the ones of the problem's matrix are nodes in
+    circular, doubly linked lists along each row and down each column, so a
+    column and its rows can be taken out of the matrix and put back exactly
+    as they were in constant time per node. The links are kept in flat lists
+    of node numbers, which is much faster in Python than a node object each.
+    
+    The search can be split over processes, each taking some of the rows
+    which could cover the first column chosen. """
+    
+    def __init__(self, columns, rows, secondary=0):
+        """ Initialise a problem with the given number of columns and the
+        given rows, each a list of the columns it has ones in. The last
+        secondary columns need not be covered, but can't be covered twice.
+        
+        __init__(int, list<list<int>>, int) -> void
+        """
+        
+        self._columns = columns
+        self._rows = rows
+        self._secondary = secondary
+        
+        # Node 0 is the root, and nodes 1 to columns are the column headers,
+        # with the primary columns linked in a ring to the root
+        headers = columns + 1
+        primary = columns - secondary
+        self._left = range(-1, headers - 1)
+        self._right = range(1, headers + 1)
+        self._left[0] = primary
+        self._right[primary] = 0
+        for node in xrange(primary + 1, headers):
+            self._left[node] = node
+            self._right[node] = node
+        self._up = range(headers)
+        self._down = range(headers)
+        self._column = range(headers)
+        self._row = [-1] * headers
+        self._size = [0] * headers
+        
+        left, right, up, down = self._left, self._right, self._up, self._down
+        for i, row in enumerate(rows):
+            first = len(self._column)
+            for column in row:
+                header = column + 1
+                node = len(self._column)
+                self._column.append(header)
+                self._row.append(i)
+                up.append(up[header])
+                down.append(header)
+                down[up[header]] = node
+                up[header] = node
+                self._size[header] += 1
+                left.append(node - 1)
+                right.append(node + 1)
+            if len(self._column) > first:
+                left[first] = len(self._column) - 1
+                right[-1] = first
+        
+        # Rows are never unlinked from themselves, so the other nodes of each
+        # node's row, in both directions, are worked out once
+        self._others = [()] * headers
+        self._others_back = [()] * headers
+        for node in xrange(headers, len(self._column)):
+            others = []
+            other = right[node]
+            while other != node:
+                others.append(other)
+                other = right[other]
+            self._others.append(tuple(others))
+            self._others_back.append(tuple(reversed(others)))
+        
+        self._found = 0
+        self._limit = 0
+        self._solutions = None
+    
+    def find_first(self, processes=1):
+        """ Return the first solution found, as a list of row indices, or None
+        if there is no solution.
+        
+        find_first(int) -> list<int>
+        """
+        
+        solutions = self.find_all(processes, 1)
+        if solutions:
+            return solutions[0]
+        return None
+    
+    def find_all(self, processes=1, limit=0):
+        """ Return every solution, or only the first limit found if limit
+        isn't 0, as lists of row indices. Solutions are found in the same
+        order however many processes the search is split over.
+        
+        find_all(int, int) -> list<list<int>>
+        """
+        
+        return self._run(processes, limit, True)[1]
+    
+    def count(self, processes=1):
+        """ Return the number of solutions, without keeping them.
+        
+        count(int) -> int
+        """
+        
+        return self._run(processes, 0, False)[0]
+    
+    def _run(self, processes, limit, keep):
+        """ Search for solutions, stopping once limit have been found unless it
+        is 0, and return the number found and a list of them (empty unless
+        keep is True). If processes is more than 1, the branches of the first
+        column chosen are searched in that many processes.
+        
+        _run(int, int, bool) -> (int, list<list<int>>)
+        """
+        
+        if processes <= 1:
+            self._found = 0
+            self._limit = limit
+            self._solutions = []
+            if not keep:
+                self._solutions = None
+            self._search([])
+            return self._found, self._solutions or []
+        
+        column = self._choose_column()
+        if column == None:
+            return self._run(1, limit, keep)
+        branches = []
+        node = self._down[column]
+        while node != column:
+            branches.append(node)
+            node = self._down[node]
+        
+        found = 0
+        solutions = []
+        pool = multiprocessing.Pool(processes, _start_worker,
+                                    (self._columns, self._rows,
+                                     self._secondary))
+        try:
+            results = pool.imap(_search_branch,
+                                [(node, limit, keep) for node in branches])
+            for count, branch_solutions in results:
+                found += count
+                solutions.extend(branch_solutions)
+                if limit and found >= limit:
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+        if limit:
+            found = min(found, limit)
+            solutions = solutions[:limit]
+        return found, solutions
+    
+    def _search_branch(self, node, limit, keep):
+        """ Search only the solutions which include the row of the given node,
+        from the first column chosen, and return the number found and a list
+        of them (empty unless keep is True).
+        
+        _search_branch(int, int, bool) -> (int, list<list<int>>)
+        """
+        
+        self._found = 0
+        self._limit = limit
+        self._solutions = []
+        if not keep:
+            self._solutions = None
+        column = self._column[node]
+        self._cover(column)
+        self._cover_row(node)
+        self._search([self._row[node]])
+        self._uncover_row(node)
+        self._uncover(column)
+        return self._found, self._solutions or []
+    
+    def _search(self, partial):
+        """ Extend the given partial solution by each row which covers the
+        column with the fewest rows left, and recurse, until every primary
+        column is covered. Solutions are counted, and kept if there is a list
+        to keep them in.
+        
+        _search(list<int>) -> void
+        """
+        
+        column = self._choose_column()
+        if column == None:
+            self._found += 1
+            if self._solutions != None:
+                self._solutions.append(list(partial))
+            return
+        if self._size[column] == 0:
+            return
+        
+        down = self._down
+        self._cover(column)
+        node = down[column]
+        while node != column:
+            partial.append(self._row[node])
+            self._cover_row(node)
+            self._search(partial)
+            self._uncover_row(node)
+            partial.pop()
+            if self._limit and self._found >= self._limit:
+                break
+            node = down[node]
+        self._uncover(column)
+    
+    def _choose_column(self):
+        """ Return the primary column with the fewest rows left, the first if
+        there is a tie, or None if every primary column is covered.
+        
+        _choose_column() -> int
+        """
+        
+        right = self._right
+        size = self._size
+        column = right[0]
+        if column == 0:
+            return None
+        best = column
+        fewest = size[column]
+        column = right[column]
+        while column != 0 and fewest > 1:
+            if size[column] < fewest:
+                best = column
+                fewest = size[column]
+            column = right[column]
+        return best
+    
+    def _cover_row(self, node):
+        """ Cover the columns of the given node's row, other than its own.
+        
+        _cover_row(int) -> void
+        """
+        
+        for other in self._others[node]:
+            self._cover(self._column[other])
+    
+    def _uncover_row(self, node):
+        """ Undo _cover_row for the given node, in reverse order.
+        
+        _uncover_row(int) -> void
+        """
+        
+        for other in self._others_back[node]:
+            self._uncover(self._column[other])
+    
+    def _cover(self, column):
+        """ Take the given column out of the header ring, and every row with a
+        one in it out of the other columns.
+        
+        _cover(int) -> void
+        """
+        
+        left, right, up, down = self._left, self._right, self._up, self._down
+        nodes = self._column
+        size = self._size
+        others = self._others
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        row = down[column]
+        while row != column:
+            for node in others[row]:
+                above = up[node]
+                below = down[node]
+                down[above] = below
+                up[below] = above
+                size[nodes[node]] -= 1
+            row = down[row]
+    
+    def _uncover(self, column):
+        """ Put the given column and its rows back, undoing _cover exactly.
+        
+        _uncover(int) -> void
+        """
+        
+        left, right, up, down = self._left, self._right, self._up, self._down
+        nodes = self._column
+        size = self._size
+        others = self._others_back
+        row = up[column]
+        while row != column:
+            for node in others[row]:
+                size[nodes[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+            row = up[row]
+        right[left[column]] = column
+        left[right[column]] = column
+
+
+class Tiling:
+    
+    """ A class for packing puzzles: filling a rectangle, less any holes, with
+    a set of polyominoes, each used exactly once. The placements of the pieces
+    are worked out from the rotations of the shapes (and their mirror images,
+    if pieces may be turned over) and solved as an exact cover problem, with a
+    column for each piece and each cell.
+    
+    Solutions which are rotations or reflections of each other are only found
+    once where possible: a piece none of whose placements is left unchanged by
+    any symmetry of the board is only placed in one of each set of placements
+    the symmetries map onto each other. """
+    
+    def __init__(self, shapes, width, height, free=True, holes=()):
+        """ Initialise a puzzle to fill a width * height rectangle, less the
+        given (x, y) holes, with the given one-sided polyominoes, as made by
+        the Generator. If free is True, pieces may be turned over, and shapes
+        which are mirror images of each other are the same piece. Raise
+        ValueError if the pieces don't cover as many cells as there are to
+        fill.
+        
+        __init__(list<list<list<bool>>>, int, int, bool,
+                 list<(int, int)>) -> void
+        """
+        
+        self._width = width
+        self._height = height
+        self._holes = set(holes)
+        self._pieces = _find_pieces(shapes, free)
+        
+        cells = [(x, y) for y in xrange(height) for x in xrange(width)
+                 if (x, y) not in self._holes]
+        area = sum([len(n[0]) for n in self._pieces])
+        if area != len(cells):
+            raise ValueError('The pieces cover %d cells, but there are %d to '
+                             'fill' % (area, len(cells)))
+        columns = dict((cell, len(self._pieces) + i)
+                       for i, cell in enumerate(cells))
+        
+        self._placements = []
+        for piece, orientations in enumerate(self._pieces):
+            placements = []
+            for orientation in orientations:
+                right = max([n[0] for n in orientation])
+                bottom = max([n[1] for n in orientation])
+                for top in xrange(height - bottom):
+                    for left in xrange(width - right):
+                        placed = tuple([(x + left, y + top)
+                                        for x, y in orientation])
+                        if not [n for n in placed if n not in columns]:
+                            placements.append(placed)
+            self._placements.append(placements)
+        self._symmetries = self._break_symmetry(free)
+        
+        self._rows = []
+        matrix = []
+        for piece, placements in enumerate(self._placements):
+            for placed in placements:
+                self._rows.append((piece, placed))
+                matrix.append([piece] + [columns[n] for n in placed])
+        self._cover = Exact_Cover(len(self._pieces) + len(cells), matrix)
+    
+    def get_pieces(self):
+        """ Return the pieces, each as a list of its distinct orientations,
+        which are lists of the (x, y) cells they fill.
+        
+        get_pieces() -> list<list<list<(int, int)>>>
+        """
+        
+        return self._pieces
+    
+    def get_symmetries(self):
+        """ Return how many solutions each solution found stands for: 1 if
+        every solution is found, or the number of symmetries of the board if
+        only one of each set of solutions they map onto each other is.
+        
+        get_symmetries() -> int
+        """
+        
+        return self._symmetries
+    
+    def find_first(self, processes=1):
+        """ Return the first solution found, or None if there is none. A
+        solution is a grid of the index of the piece filling each cell, or -1
+        for holes, indexed by [row][column].
+        
+        find_first(int) -> list<list<int>>
+        """
+        
+        solution = self._cover.find_first(processes)
+        if solution == None:
+            return None
+        return self._solution_grid(solution)
+    
+    def find_all(self, processes=1, limit=0):
+        """ Return every solution, or only the first limit found if limit
+        isn't 0, as grids (see find_first).
+        
+        find_all(int, int) -> list<list<list<int>>>
+        """
+        
+        return [self._solution_grid(n)
+                for n in self._cover.find_all(processes, limit)]
+    
+    def count(self, processes=1):
+        """ Return the number of solutions.
+        
+        count(int) -> int
+        """
+        
+        return self._cover.count(processes)
+    
+    def _solution_grid(self, solution):
+        """ Return the grid of the given solution's row indices.
+        
+        _solution_grid(list<int>) -> list<list<int>>
+        """
+        
+        grid = rect_list(self._width, self._height, -1)
+        for row in solution:
+            piece, placed = self._rows[row]
+            for x, y in placed:
+                grid[y][x] = piece
+        return grid
+    
+    def _break_symmetry(self, free):
+        """ Find the piece none of whose placements are left unchanged by a
+        symmetry of the board (other than the identity) with the fewest
+        placements, and keep only one of each set of its placements the
+        symmetries map onto each other. Return the number of symmetries, or 1
+        if there is no such piece.
+        
+        _break_symmetry(bool) -> int
+        """
+        
+        symmetries = _board_symmetries(self._width, self._height, free)
+        symmetries = [n for n in symmetries
+                      if set([n(*hole) for hole in self._holes]) ==
+                         self._holes]
+        if len(symmetries) == 1:
+            return 1
+        
+        best = None
+        for piece, placements in enumerate(self._placements):
+            kept = []
+            for placed in placements:
+                images = [tuple(sorted([symmetry(*n) for n in placed]))
+                          for symmetry in symmetries]
+                if len(set(images)) != len(symmetries):
+                    break
+                if tuple(sorted(placed)) == min(images):
+                    kept.append(placed)
+            else:
+                if best == None or len(kept) < len(best[1]):
+                    best = (piece, kept)
+        if best == None:
+            return 1
+        self._placements[best[0]] = best[1]
+        return len(symmetries)
+
+
+def _find_pieces(shapes, free):
+    """ Return the pieces made from the given one-sided shapes, each as a list
+    of its distinct orientations, which are lists of the (x, y) cells they
+    fill, moved to touch the x and y axes. The orientations are the shape's
+    rotations and, if free is True, their mirror images, in which case only
+    the first of two shapes which are mirror images is kept.
+    
+    _find_pieces(list<list<list<bool>>>, bool) -> list<list<list<(int, int)>>>
+    """
+    
+    pieces = []
+    seen = set()
+    for shape in shapes:
+        omino = Omino(shape, None, 0)
+        orientations = set()
+        for rotation in xrange(4):
+            cells = [(x, y) for y, line in enumerate(omino.get_shape(rotation))
+                     for x, filled in enumerate(line) if filled]
+            orientations.add(_normalise_cells(cells))
+        if free:
+            orientations |= set([_normalise_cells([(-x, y) for x, y in n])
+                                 for n in orientations])
+        key = min(orientations)
+        if key not in seen:
+            seen.add(key)
+            pieces.append([list(n) for n in sorted(orientations)])
+    return pieces
+
+def _normalise_cells(cells):
+    """ Return the given (x, y) cells moved to touch the x and y axes, sorted.
+    
+    _normalise_cells(list<(int, int)>) -> tuple<(int, int)>
+    """
+    
+    left = min([n[0] for n in cells])
+    top = min([n[1] for n in cells])
+    return tuple(sorted([(x - left, y - top) for x, y in cells]))
+
+def _board_symmetries(width, height, free):
+    """ Return the rotations of a width * height board onto itself, and its
+    reflections if free is True, as functions mapping (x, y) to (x, y). The
+    identity is first.
+    
+    _board_symmetries(int, int, bool) -> list<function>
+    """
+    
+    w = width - 1
+    h = height - 1
+    symmetries = [lambda x, y: (x, y), lambda x, y: (w - x, h - y)]
+    if width == height:
+        symmetries += [lambda x, y: (h - y, x), lambda x, y: (y, w - x)]
+    if free:
+        symmetries += [lambda x, y: (w - x, y), lambda x, y: (x, h - y)]
+        if width == height:
+            symmetries += [lambda x, y: (y, x), lambda x, y: (h - y, w - x)]
+    return symmetries
+
+
+# The problem each worker process searches branches of
+_worker_cover = None
+
+def _start_worker(columns, rows, secondary):
+    """ Set up a worker process to search the given problem.
+    
+    _start_worker(int, list<list<int>>, int) -> void
+    """
+    
+    global _worker_cover
+    _worker_cover = Exact_Cover(columns, rows, secondary)
+
+def _search_branch(arguments):
+    """ Search one branch of the worker's problem, given the (node, limit,
+    keep) arguments of Exact_Cover._search_branch.
+    
+    _search_branch((int, int, bool)) -> (int, list<list<int>>)
+    """
+    
+    return _worker_cover._search_branch(*arguments)
@@ -3,6 +3,8 @@
 
 
 import os
+import random
+import threading
 
 import config
 
@@ -13,20 +15,63 @@ class Sound:
     are defined in the config file. """
     
     def __init__(self, pygame):
-        """ Initialise and load audio.
+        """ Initialise. No audio is available until it has been loaded.
         
         __init__(pygame) -> void
         """
         
         self._mixer = pygame.mixer
-        self._mixer.init()
-        self._available = self._mixer.get_init()
-        if self._available:
-            self._load_audio()
-            self._sfx_chan = self._mixer.Channel(0)
+        self._error = pygame.error
+        self._get_ticks = pygame.time.get_ticks
+        # Must come before the mixer is started to take effect
+        self._mixer.pre_init(config.mixer_frequency, -16, 2,
+                             config.mixer_buffer)
+        self._available = False
+        self._latency = 0.0
+        self._loader = None
+        self._music = []
+        self._sfx = []
+        self._channels = []
+        self._channel_priorities = []
+        self._channel_starts = []
+        self._last_played = [None] * len(config.sfx_filenames)
         self._music_on = True
         self._sfx_on = True
+        self._playlist = []
         self._current_track = -1
+        self._playing = False
+        self._queued = False
+        self._starts = 0    # Number of times music has been started
+        self._music_lock = threading.Lock()
+    
+    def load(self):
+        """ Start the mixer, if it isn't already, and load the audio on a
+        background thread so that nothing waits for it. Until it has finished,
+        sound effects and music are skipped. """
+        
+        if self._loader != None: return
+        self._loader = threading.Thread(target=self._load_audio)
+        self._loader.daemon = True
+        self._loader.start()
+    
+    def is_loaded(self):
+        """ Return True if the audio has been loaded and can be played.
+        
+        is_loaded() -> bool
+        """
+        
+        return self._available
+    
+    def get_latency(self):
+        """ Return roughly how long (in ms) it takes a sound effect to be heard
+        after being played. The mixer fills one buffer of samples ahead of
+        what is being heard, so a new sound waits for that to play out first.
+        Returns 0 if the audio hasn't been loaded.
+        
+        get_latency() -> float
+        """
+        
+        return self._latency
     
     def get_music_on(self):
         """ Return 'On' or 'Off' if the music is on or off.
@@ -62,17 +107,38 @@ class Sound:
     
     def play_next(self):
         """ Play the next music track and set a custom event to be generated
-        when the track stops. """
+        when the track stops. The track after it is queued up to follow on
+        without a gap. Both are loaded on a background thread, so the game
+        doesn't wait for them. """
         
         if not self._available: return
         if not self._music_on: return
         if len(self._music) == 0: return
         
-        self._current_track += 1
-        self._current_track %= len(self._music)
-        self._mixer.music.load(self._music[self._current_track])
-        self._mixer.music.play()
-        self._mixer.music.set_endevent(config.EVENT_MUSIC_STOP)
+        path = self._next_track()
+        following = self._next_track()
+        self._playing = True
+        self._queued = True
+        self._starts += 1
+        thread = threading.Thread(target=self._start,
+                                  args=(path, following, self._starts))
+        thread.daemon = True
+        thread.start()
+    
+    def track_ended(self):
+        """ Carry on the music after a track has ended (when the custom event
+        set in play_next is generated). Normally the queued track will have
+        taken over, and the one after it is queued. If the music had been
+        stopped nothing is done, and if the queued track wasn't ready in time
+        the next track is played. """
+        
+        if not self._playing: return
+        if self._mixer.music.get_busy():
+            self._queued = False
+            self._queue_next()
+        else:
+            self._unqueue()
+            self.play_next()
     
     def stop_music(self, fadeout_time=0):
         """ Stop the music track currently playing with a fade-out of
@@ -83,7 +149,13 @@ class Sound:
         """
         
         if not self._available: return
+        # Also keeps a track still being started from playing
+        self._playing = False
+        self._starts += 1
+        self._music_lock.acquire()
         self._mixer.music.fadeout(fadeout_time)
+        self._music_lock.release()
+        self._unqueue()
     
     def play_sound_effect(self, effect):
         """ Play the given sound effect.
@@ -96,21 +168,153 @@ class Sound:
         if not self._available: return
         if not self._sfx_on: return
         if self._sfx[effect] == None: return
-        self._sfx[effect].play()
+        
+        # Each effect can only be played so often, so held keys can't flood
+        # the channels with it
+        now = self._get_ticks()
+        last = self._last_played[effect]
+        if last != None and now - last < config.sfx_min_intervals[effect]:
+            return
+        
+        priority = config.sfx_priorities[effect]
+        channel = self._find_channel(priority)
+        if channel == None: return
+        self._channels[channel].play(self._sfx[effect])
+        self._channel_priorities[channel] = priority
+        self._channel_starts[channel] = now
+        self._last_played[effect] = now
+    
+    def _find_channel(self, priority):
+        """ Return the number of a channel to play a sound effect of the given
+        priority on: a free one if there is one, otherwise the one playing the
+        lowest priority effect (the oldest, if there are several) no higher
+        than the given priority, which is then cut off. Returns None if every
+        channel is playing something more important.
+        
+        _find_channel(int) -> int
+        """
+        
+        victim = None
+        for i, channel in enumerate(self._channels):
+            if not channel.get_busy():
+                return i
+            if self._channel_priorities[i] > priority:
+                continue
+            if victim == None or \
+               (self._channel_priorities[i], self._channel_starts[i]) < \
+               (self._channel_priorities[victim], self._channel_starts[victim]):
+                victim = i
+        return victim
+    
+    def _next_track(self):
+        """ Move on to and return the filename of the next track of the
+        playlist. Each time through the playlist is in the order the music
+        files are listed in the config file, or shuffled if set there.
+        
+        _next_track() -> string
+        """
+        
+        self._current_track += 1
+        if self._current_track >= len(self._playlist):
+            last = None
+            if self._playlist:
+                last = self._playlist[-1]
+            self._playlist = list(self._music)
+            if config.music_shuffle:
+                random.shuffle(self._playlist)
+                # Don't play the same track twice in a row
+                if len(self._playlist) > 1 and self._playlist[0] == last:
+                    self._playlist.append(self._playlist.pop(0))
+            self._current_track = 0
+        return self._playlist[self._current_track]
+    
+    def _queue_next(self):
+        """ Queue the next track to play once the current one ends. The track
+        is loaded on a background thread so the game doesn't wait for it. """
+        
+        path = self._next_track()
+        self._queued = True
+        thread = threading.Thread(target=self._queue, args=(path,))
+        thread.daemon = True
+        thread.start()
+    
+    def _unqueue(self):
+        """ Step the playlist back over the queued track if it never got to
+        play, so that it is the next to be played. """
+        
+        if self._queued:
+            self._current_track -= 1
+            self._queued = False
+    
+    def _start(self, path, following, start):
+        """ Play the given music file and queue the one following it, unless
+        the music has been stopped or started again since the given start.
+        Run on a background thread.
+        
+        _start(string, string, int) -> void
+        """
+        
+        self._music_lock.acquire()
+        try:
+            if self._playing and start == self._starts:
+                self._mixer.music.load(path)
+                self._mixer.music.play()
+                self._mixer.music.set_endevent(config.EVENT_MUSIC_STOP)
+                self._mixer.music.queue(following)
+        except self._error, error:
+            # Eg. there is no MIDI support, so the game carries on silently
+            print 'Could not play music:', error
+            self._playing = False
+            self._queued = False
+        finally:
+            self._music_lock.release()
+    
+    def _queue(self, path):
+        """ Queue the given music file, unless the music has been stopped.
+        
+        _queue(string) -> void
+        """
+        
+        self._music_lock.acquire()
+        try:
+            if self._playing:
+                self._mixer.music.queue(path)
+        except self._error, error:
+            print 'Could not queue music:', error
+        finally:
+            self._music_lock.release()
     
     def _load_audio(self):
-        """ Load the sound effects and make sure music files are available for
-        streaming. """
+        """ Start the mixer, load the sound effects and make sure music files
+        are available for streaming. Run on the loader thread, so the audio is
+        only made available once it is all loaded. """
         
-        self._music = []
-        self._sfx = []
+        if self._mixer.get_init() == None:
+            try:
+                self._mixer.init()
+            except self._error:
+                return
+        frequency = self._mixer.get_init()[0]
+        self._latency = config.mixer_buffer * 1000.0 / frequency
+        
+        music = []
+        sfx = []
         for filename in config.music_filenames:
             path = os.path.join(config.music_dir, filename)
             if os.path.exists(path):
-                self._music.append(path)
+                music.append(path)
         for filename in config.sfx_filenames:
             if os.path.exists(os.path.join(config.sfx_dir, filename)):
                 path = os.path.join(config.sfx_dir, filename)
-                self._sfx.append(self._mixer.Sound(path))
+                sfx.append(self._mixer.Sound(path))
             else:
-                self._sfx.append(None)
\ No newline at end of file
+                sfx.append(None)
+        
+        self._mixer.set_num_channels(config.sfx_channels)
+        self._channels = [self._mixer.Channel(i)
+                          for i in xrange(config.sfx_channels)]
+        self._channel_priorities = [0] * config.sfx_channels
+        self._channel_starts = [0] * config.sfx_channels
+        self._music = music
+        self._sfx = sfx
+        self._available = True
\ No newline at end of file
@@ -0,0 +1,296 @@
+""" stats.py: Contains the Stats_Store class. """
+
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class Stats_Store:
+    
+    """ A class for keeping a record of every game finished, in an SQLite
+    database. Games are indexed by order, level and score, so the best games
+    of an order and level, and totals over them, can be found without reading
+    every game.
+    
+    Games are written to the database on a background thread, with its own
+    connection, so that nothing waits for the disk. Until they have been
+    written, games are also kept in memory and included in what is read back,
+    so the store always reads as though every change had been written. """
+    
+    def __init__(self, filename):
+        """ Open (creating if need be) the database in the given file.
+        
+        __init__(string) -> void
+        """
+        
+        self._filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.text_factory = str
+        # Games are only added between games, so a lost write after a power
+        # cut is acceptable in exchange for not waiting on the disk
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._new = self._connection.execute('''
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE type = 'table' AND name = 'games' ''').fetchone()[0] == 0
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                omino_order INTEGER NOT NULL,
+                level INTEGER NOT NULL,
+                score INTEGER NOT NULL,
+                lines INTEGER NOT NULL,
+                duration INTEGER NOT NULL,
+                pieces INTEGER NOT NULL,
+                seed INTEGER NOT NULL,
+                finished REAL NOT NULL)''')
+        self._connection.execute('''
+            CREATE INDEX IF NOT EXISTS games_by_score
+            ON games (omino_order, level, score DESC, id)''')
+        self._connection.commit()
+        
+        # Ids are given out here rather than by the database, so that a game
+        # has one before it is written
+        self._next_id = self._connection.execute('''
+            SELECT COALESCE(MAX(id), 0) + 1 FROM games''').fetchone()[0]
+        self._queue = []    # (game id, SQL, parameters) waiting to be run
+        # [order, level, score, name, writes left] of each game with writes
+        # waiting, by id
+        self._pending = {}
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def is_new(self):
+        """ Return True if the database was created when the store was opened.
+        
+        is_new() -> bool
+        """
+        
+        return self._new
+    
+    def add_game(self, order, level, score, lines, duration, pieces, seed,
+                 name=None, finished=None):
+        """ Record a finished game, with its duration in ms, the number of
+        pieces played, the seed its pieces were chosen with, and optionally
+        the name of its player and the time it finished (by default, now).
+        Return the game's id.
+        
+        add_game(int, int, int, int, int, int, int, string, float) -> int
+        """
+        
+        if finished == None:
+            finished = time.time()
+        self._condition.acquire()
+        game_id = self._next_id
+        self._next_id += 1
+        self._pending[game_id] = [order, level, score, name, 0]
+        self._write(game_id, '''
+            INSERT INTO games (id, name, omino_order, level, score, lines,
+                               duration, pieces, seed, finished)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (game_id, name, order, level, score, lines, int(duration), pieces,
+             seed, finished))
+        self._condition.release()
+        return game_id
+    
+    def set_name(self, game_id, name):
+        """ Set the name of the player of the game with the given id.
+        
+        set_name(int, string) -> void
+        """
+        
+        self._condition.acquire()
+        if game_id not in self._pending:
+            order, level, score = self._get_game(game_id)
+            self._pending[game_id] = [order, level, score, name, 0]
+        self._pending[game_id][3] = name
+        self._write(game_id, 'UPDATE games SET name = ? WHERE id = ?',
+                    (name, game_id))
+        self._condition.release()
+    
+    def import_highscores(self, filename, order, level):
+        """ Add the scores in the given old high scores file, which has a line
+        of '<name>,<score>' for each, as games of the given order and level.
+        Lines which can't be read and the file's placeholder entries (no score)
+        are skipped. Return the number of scores added, or 0 if there is no
+        such file.
+        
+        import_highscores(string, int, int) -> int
+        """
+        
+        try:
+            file_handle = open(filename, 'r')
+            lines = file_handle.read().splitlines()
+            file_handle.close()
+        except IOError:
+            return 0
+        
+        # The file was last written at the last of its games
+        try:
+            finished = os.path.getmtime(filename)
+        except OSError:
+            finished = time.time()
+        count = 0
+        for line in lines:
+            fields = line.split(',')
+            if len(fields) != 2 or not fields[0]:
+                continue
+            try:
+                score = int(fields[1])
+            except ValueError:
+                continue
+            if score <= 0:
+                continue
+            self.add_game(order, level, score, 0, 0, 0, 0, fields[0],
+                          finished)
+            count += 1
+        return count
+    
+    def get_top(self, order, level, count):
+        """ Return the given number of best games of the given order and
+        level, best first, as triples of (id, name, score). Where scores are
+        equal the earlier game comes first. Games without a name have None.
+        
+        get_top(int, int, int) -> list<(int, string, int)>
+        """
+        
+        self._condition.acquire()
+        games = {}
+        for game_id, name, score in self._connection.execute('''
+            SELECT id, name, score FROM games
+            WHERE omino_order = ? AND level = ?
+            ORDER BY score DESC, id LIMIT ?''',
+            (order, level, count)).fetchall():
+            games[game_id] = (game_id, name, score)
+        for game_id, game in self._pending.iteritems():
+            if game[0] == order and game[1] == level:
+                games[game_id] = (game_id, game[3], game[2])
+        self._condition.release()
+        top = sorted(games.values(), key=lambda n: (-n[2], n[0]))
+        return top[:count]
+    
+    def get_rank(self, game_id, count):
+        """ Return the position of the game with the given id among the games
+        of its order and level, counting from 0, or count if it is not within
+        the best count of them.
+        
+        get_rank(int, int) -> int
+        """
+        
+        self._condition.acquire()
+        order, level, score = self._get_game(game_id)
+        better = set([n[0] for n in self._connection.execute('''
+            SELECT id FROM games
+            WHERE omino_order = ? AND level = ? AND
+                  (score > ? OR (score = ? AND id < ?))
+            LIMIT ?''',
+            (order, level, score, score, game_id, count)).fetchall()])
+        for other_id, game in self._pending.iteritems():
+            if game[0] == order and game[1] == level and \
+               (game[2] > score or (game[2] == score and other_id < game_id)):
+                better.add(other_id)
+        self._condition.release()
+        return min(len(better), count)
+    
+    def get_totals(self):
+        """ Return, for each order and level any games have been played at,
+        the number of games, best score, average score, lines cleared, and
+        time played (in ms), ordered by order then level.
+        
+        get_totals() -> list<(int, int, int, int, float, int, int)>
+        """
+        
+        self.flush()
+        return self._connection.execute('''
+            SELECT omino_order, level, COUNT(*), MAX(score), AVG(score),
+                   SUM(lines), SUM(duration)
+            FROM games GROUP BY omino_order, level
+            ORDER BY omino_order, level''').fetchall()
+    
+    def flush(self):
+        """ Wait until every change made so far has been written. """
+        
+        self._condition.acquire()
+        while self._queue or self._writing:
+            self._condition.wait()
+        self._condition.release()
+    
+    def close(self):
+        """ Write out every change made so far and close the database. """
+        
+        self._condition.acquire()
+        self._closed = True
+        self._condition.notify_all()
+        self._condition.release()
+        self._thread.join()
+        self._connection.close()
+    
+    def _write(self, game_id, sql, parameters):
+        """ Queue the given SQL statement, which changes the game with the
+        given id, to be run on the writer's thread.
+        
+        _write(int, string, tuple) -> void
+        Precondition: The condition is held.
+        """
+        
+        self._pending[game_id][4] += 1
+        self._queue.append((game_id, sql, parameters))
+        self._condition.notify_all()
+    
+    def _get_game(self, game_id):
+        """ Return the order, level and score of the game with the given id.
+        
+        _get_game(int) -> (int, int, int)
+        Precondition: The condition is held.
+        """
+        
+        if game_id in self._pending:
+            return tuple(self._pending[game_id][:3])
+        return self._connection.execute('''
+            SELECT omino_order, level, score FROM games WHERE id = ?''',
+            (game_id,)).fetchone()
+    
+    def _run(self):
+        """ Run the queued statements whenever there are some, all those
+        waiting in one transaction, until the store is closed and they have
+        all been run. Run on the writer's thread. """
+        
+        connection = sqlite3.connect(self._filename)
+        connection.text_factory = str
+        connection.execute('PRAGMA synchronous = NORMAL')
+        while True:
+            self._condition.acquire()
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                self._condition.release()
+                break
+            queue = self._queue
+            self._queue = []
+            self._writing = True
+            self._condition.release()
+            
+            try:
+                for game_id, sql, parameters in queue:
+                    connection.execute(sql, parameters)
+                connection.commit()
+            except sqlite3.Error, error:
+                connection.rollback()
+                print 'Could not save game stats:', error
+            
+            self._condition.acquire()
+            for game_id, sql, parameters in queue:
+                self._pending[game_id][4] -= 1
+                if self._pending[game_id][4] == 0:
+                    del self._pending[game_id]
+            self._writing = False
+            self._condition.notify_all()
+            self._condition.release()
+        connection.close()
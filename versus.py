@@ -0,0 +1,281 @@
+""" versus.py: Contains the Versus class. """
+
+
+import random
+import pygame.constants as constants
+import pygame.time
+
+import config
+from board import *
+from event_handler import key_code
+
+
+class Versus:
+    
+    """ The versus class which handles the application while two to four
+    players play against each other, each on their own board with their own
+    keys. Lines cleared on one board are sent as garbage to the next board
+    still playing, and the last board playing wins. """
+    
+    def __init__(self, master, view, event_handler, sound, level, order,
+                 ominoes, players, seed=None):
+        """ Initialise a new versus game between the given number of players
+        with the given level and order, and given list of ominoes.
+        
+        __init__(Ominohs, View, Event_Handler, Sound, int, int,
+                 (list<list<list<bool>>>,
+                  list<((int, int, int), (int, int, int), (int, int, int))>),
+                 int, int) -> void
+        Precondition: 2 <= players <= len(config.versus_keys)
+        """
+        
+        self._master = master
+        self._profiler = master.get_profiler()
+        self._view = view
+        self._events = event_handler
+        self._sound = sound
+        self._order = order
+        self._level = level
+        
+        if seed == None:
+            seed = random.randint(0, 2 ** 31 - 1)
+        self._boards = [Board(sound, level, order, ominoes, seed)
+                        for i in xrange(players)]
+        
+        # Each key maps to the board it is for and the action it takes
+        self._actions = {}
+        for board, keys in zip(self._boards, config.versus_keys):
+            for action, name in enumerate(keys):
+                self._actions[key_code(name)] = (board, action)
+        
+        self._winner = None
+        self._running = False
+        self._result = None
+        self._state = None
+    
+    def get_order(self):
+        """ Return the polyomino order of the game.
+        
+        get_order() -> int
+        """
+        
+        return self._order
+    
+    def get_level(self):
+        """ Return the difficulty level of the game.
+        
+        get_level() -> int
+        """
+        
+        return self._level
+    
+    def get_boards(self):
+        """ Return the players' boards, in player order.
+        
+        get_boards() -> list<Board>
+        """
+        
+        return self._boards
+    
+    def get_winner(self):
+        """ Return the index of the board which won, or None if the game isn't
+        over or every board topped out at once.
+        
+        get_winner() -> int
+        """
+        
+        return self._winner
+    
+    def change_state(self, state):
+        """ Change the state of the game.
+        
+        change_state(int) -> void
+        """
+        
+        self._state = state
+    
+    def loop(self):
+        """ Main versus loop which handles the players' input and updates
+        every board. Return -1 when the players go back to the menu, or None
+        if the application should end.
+        
+        loop() -> int
+        """
+        
+        clock = pygame.time.Clock()
+        self._events.clear_queue()
+        
+        for board in self._boards:
+            board.start()
+        
+        self._sound.play_next()
+        
+        # All the boards are stepped together in the same fixed ticks as a
+        # single game (see Game.loop)
+        tick_time = 1000.0 / config.logic_rate
+        lag = 0.0
+        previous = pygame.time.get_ticks()
+        
+        self._register_handlers()
+        profiler = self._profiler
+        self._running = True
+        while self._running:
+            
+            profiler.begin_frame()
+            if config.fixed_frame_time:
+                lag += config.fixed_frame_time
+            else:
+                now = pygame.time.get_ticks()
+                lag = min(lag + now - previous, config.max_catch_up)
+                previous = now
+            
+            # Events
+            profiler.start('events')
+            events = self._events.get_events()
+            profiler.stop('events')
+            profiler.start('dispatch')
+            for event in events:
+                self._events.dispatch(self._state, event)
+                if not self._running:
+                    break
+            profiler.stop('dispatch')
+            if not self._running:
+                break
+            
+            profiler.start('logic')
+            while lag >= tick_time:
+                self._step(tick_time)
+                lag -= tick_time
+            profiler.stop('logic')
+            
+            self._view.update()
+            profiler.end_frame()
+            clock.tick(config.frame_rate)
+        
+        self._events.unregister(config.GAME_STATES)
+        return self._result
+    
+    def _register_handlers(self):
+        """ Register the versus game's event handlers for each versus state
+        with the event handler. """
+        
+        register = self._events.register
+        KEYDOWN = constants.KEYDOWN
+        
+        # In game, the players' keys are looked up by the handlers
+        versus = [config.GS_VERSUS]
+        register(versus, KEYDOWN, None, self._press_key)
+        register(versus, KEYDOWN, constants.K_ESCAPE, self._pause)
+        register(versus, constants.KEYUP, None, self._release_key)
+        
+        # Game paused
+        paused = [config.GS_VERSUS_PAUSED]
+        register(paused, KEYDOWN, constants.K_ESCAPE, self._resume)
+        register(paused, KEYDOWN, constants.K_y, self._quit_to_menu)
+        
+        # Game over screen
+        register([config.GS_VERSUS_OVER], KEYDOWN, constants.K_RETURN,
+                 self._finish)
+        
+        register(config.VERSUS_STATES, config.EVENT_MUSIC_STOP, None,
+                 self._next_track)
+        register(config.VERSUS_STATES, constants.QUIT, None, self._quit)
+    
+    def _stop(self, result):
+        """ End the versus loop, returning the given result from it.
+        
+        _stop(int) -> void
+        """
+        
+        self._result = result
+        self._running = False
+    
+    def _press_key(self, event):
+        """ Carry out the action of a player's key. """
+        
+        if event.key in self._actions:
+            board, action = self._actions[event.key]
+            if board.is_playing():
+                self._profiler.key_down()
+                board.press(action)
+    
+    def _release_key(self, event):
+        """ Stop repeating the action of a player's released key. """
+        
+        if event.key in self._actions:
+            board, action = self._actions[event.key]
+            board.release(action)
+    
+    def _pause(self, event):
+        """ Pause the game. """
+        
+        self._sound.play_sound_effect(config.SFX_PAUSE)
+        for board in self._boards:
+            board.release_all()
+        self._master.change_state(config.GS_VERSUS_PAUSED)
+    
+    def _resume(self, event):
+        """ Un-pause the game. """
+        
+        self._master.change_state(config.GS_VERSUS)
+    
+    def _quit_to_menu(self, event):
+        """ Abandon the game and go back to the menu. """
+        
+        self._sound.stop_music()
+        self._stop(-1)
+    
+    def _finish(self, event):
+        """ Leave the game over screen. """
+        
+        self._stop(-1)
+    
+    def _next_track(self, event):
+        """ Keep the music going when a track finishes. """
+        
+        self._sound.track_ended()
+    
+    def _quit(self, event):
+        """ End the application. """
+        
+        self._stop(None)
+    
+    def _step(self, time):
+        """ Advance every board still playing by the given number of
+        milliseconds, pass on the garbage lines they send, and end the game
+        once at most one board is left playing.
+        
+        _step(float) -> void
+        """
+        
+        if self._state != config.GS_VERSUS:
+            return
+        
+        playing = step_boards(self._boards, time, self._profiler)
+        if len(playing) <= 1:
+            if playing:
+                self._winner = playing[0]
+            self._sound.stop_music()
+            self._sound.play_sound_effect(config.SFX_GAME_OVER)
+            self._master.change_state(config.GS_VERSUS_OVER)
+
+
+def step_boards(boards, time, profiler):
+    """ Advance every board still playing by the given number of milliseconds,
+    and pass the garbage lines each sends on to the next board after it which
+    is still playing. Return the indices of the boards still playing.
+    
+    step_boards(list<Board>, float, Profiler) -> list<int>
+    """
+    
+    count = len(boards)
+    for i, board in enumerate(boards):
+        sent = board.step(time, profiler)
+        if not sent:
+            continue
+        for j in xrange(1, count):
+            target = boards[(i + j) % count]
+            if target.is_playing():
+                target.receive(sent)
+                break
+    return [i for i, board in enumerate(boards) if board.is_playing()]
@@ -18,11 +18,29 @@ class View:
         
         self._pygame = pygame
         self._master = master
+        self._profiler = master.get_profiler()
         self._display = self._pygame.display
         self._interface = None
         self._state = None
-        self._cycle_colour = (200, 0, 0)
+        self._cycle_hue = 0
+        self._cycle_palette = cycle_palettes[0]
+        self._cycle_colour = self._cycle_palette[0]
         self._white = (255, 255, 255)
+        
+        # Dirty rectangle tracking: what each panel last showed, the screen
+        # areas changed this frame and whether the whole screen needs pushing
+        self._panels = {}
+        self._panel_keys = {}
+        self._dirty = []
+        self._full_update = True
+        self._frame = 0
+        
+        # Polyomino thumbnails still to be drawn for the selected order
+        self._thumbnail_order = None
+        self._pending_thumbnails = []
+        
+        # Frame timings shown on screen, if profiling
+        self._hud_lines = []
     
     def start(self):
         """ Start the display. """
@@ -34,23 +52,51 @@ class View:
     def update(self):
         """ Update the screen. """
         
-        # Constantly cycle through a colour
-        h, s, v = rgb2hsv(self._cycle_colour)
-        h += 1
-        self._cycle_colour = hsv2rgb((h, s, v))
+        self._profiler.start('render')
+        
+        # Constantly cycle through a colour, changing it only every
+        # cycle_hue_step degrees so that cached text renders get reused
+        self._cycle_hue = (self._cycle_hue + 1) % 360
+        h = self._cycle_hue - self._cycle_hue % config.cycle_hue_step
+        self._cycle_palette = cycle_palettes[h]
+        self._cycle_colour = self._cycle_palette[0]
+        self._frame += 1
         
         if self._state == config.GS_LOADING:
             self._screen.blit(self._background, (0, 0))
         elif self._state in [config.GS_MENU, config.GS_MENU_ENTER_HIGHSCORE,
                              config.GS_MENU_HIGHSCORES, config.GS_MENU_HELP]:
             
+            self._load_thumbnails(self._interface.get_order())
+            
             # Get current selections
             selected = self._interface.get_selection()
             settings = {config.MENU_LEVEL: str(self._interface.get_level()),
                         config.MENU_ORDER: str(self._interface.get_order()),
+                        config.MENU_PLAYERS:
+                            str(self._interface.get_players()),
                         config.MENU_SFX: self._interface.get_sfx(),
                         config.MENU_MUSIC: self._interface.get_music()}
             
+            # The menu panels overlap, so the whole screen is still drawn, but
+            # only the panels which have changed are pushed to the display
+            self._refresh('title', self._cycle_colour)
+            hovered = selected in self._buttons and self._frame or None
+            self._refresh('buttons', (selected, self._cycle_colour, hovered))
+            for radio in self._radios.keys():
+                hovered = radio == selected and self._frame or None
+                self._refresh(('radio', radio),
+                              (settings[radio], self._cycle_colour, hovered))
+            self._refresh('omino', (self._interface.get_order(),
+                                    self._interface.get_random_omino(),
+                                    self._cycle_colour))
+            if self._state != config.GS_MENU:
+                self._refresh(('overlay', self._state),
+                              (self._cycle_colour,
+                               self._interface.get_highscore_highlight(),
+                               self._state == config.GS_MENU_ENTER_HIGHSCORE
+                               and self._frame))
+            
             # Background and title
             self._screen.blit(self._background, (0, 0))
             draw_text(self._screen, (120, 25), 'PolyominOhs!', 36,
@@ -78,40 +124,35 @@ class View:
             
             # Random polyomino
             order = self._interface.get_order()
-            ominoes = self._master._ominoes[order - 1]
+            ominoes = self._master.get_ominoes(order)
             n = self._interface.get_random_omino()
             shape = ominoes[0][n]
             draw_polyomino(self._screen, (400, 160), shape, 21,
-                           self._cycle_colour, self._pygame)
+                           self._cycle_palette, self._pygame, (order, n, 0))
             
             # Highscores
             if self._state == config.GS_MENU_HIGHSCORES:
+                level = self._interface.get_level()
+                highscores = self._master.get_highscores(order, level)
+                highlight = self._interface.get_highscore_highlight()
+                key = (order, level, tuple(highscores), highlight)
+                if key != self._highscores_key:
+                    self._compose_highscores(order, level, highscores,
+                                             highlight)
+                    self._highscores_key = key
+                
+                # Only the border and highlighted score change colour
                 draw_border(self._highscores, self._cycle_colour, self._pygame)
-                for i, highscore in enumerate(self._master.get_highscores()):
-                    name, score = highscore
-                    name = name.replace('_', ' ')
-                    if self._interface.get_highscore_highlight() == i:
-                        colour = self._cycle_colour
-                    else:
-                        colour = self._white
-                    draw_text(self._highscores, (20, 10 + (i + 1) * 25), name,
-                              10, colour, self._pygame)
-                    draw_text(self._highscores, (175, 10 + (i + 1) * 25),
-                              str(score), 10, colour, self._pygame)
+                if highlight >= 0:
+                    self._draw_highscore(highscores[highlight], highlight,
+                                         self._cycle_colour)
                 self._screen.blit(self._highscores, (200, 100))
             
             # Enter highscore
             if self._state == config.GS_MENU_ENTER_HIGHSCORE:
-                self._enterhighscore.fill((0, 0, 0))
+                self._enterhighscore.blit(self._enterhighscore_text, (0, 0))
                 draw_border(self._enterhighscore, self._cycle_colour,
                             self._pygame)
-                draw_text(self._enterhighscore, (60, 20), 'Highscore!', 14,
-                          self._white, self._pygame)
-                draw_text(self._enterhighscore, (20, 60),
-                          'Please enter your name:', 10, self._white,
-                          self._pygame)
-                draw_text(self._enterhighscore, (70, 170), 'Press return', 10,
-                          self._white, self._pygame)
                 self._name_entry.update(self._interface.get_highscore_name())
                 self._name_entry.draw(self._enterhighscore,
                                       self._interface.get_name_selected(),
@@ -126,48 +167,107 @@ class View:
         elif self._state in [config.GS_GAME, config.GS_GAME_PAUSED,
                              config.GS_GAME_OVER]:
             
+            self._load_thumbnails(self._interface.get_order())
+            
             # Get current information
             score = str(self._interface.get_score())
             lines = str(self._interface.get_lines_cleared())
             next_omino = self._interface.get_next_omino()
             
-            self._screen.blit(self._background, (0, 0))
+            field = self._interface.get_field()
+            omino = field.get_omino()
+            if omino != None:
+                omino = (omino, omino.get_location().x,
+                         omino.get_location().y, omino.get_rotation())
+            
+            if self._full_update:
+                self._screen.blit(self._background, (0, 0))
             
             # Score and number of lines cleared
-            draw_text(self._screen, (445, 155), score, 10, self._white,
-                      self._pygame)
-            draw_text(self._screen, (445, 215), lines, 10, self._white,
-                      self._pygame)
+            if self._refresh('score', score, True):
+                draw_text(self._screen, (445, 155), score, 10, self._white,
+                          self._pygame)
+            if self._refresh('lines', lines, True):
+                draw_text(self._screen, (445, 215), lines, 10, self._white,
+                          self._pygame)
             
             # Draw next polyomino
-            if self._state == config.GS_GAME:
+            if self._refresh('next', (self._state, next_omino), True) and \
+               self._state == config.GS_GAME:
+                shape_id = (self._interface.get_order(),
+                            self._interface.get_next_index(), 0)
                 draw_polyomino(self._screen, (440, 290), next_omino.get_shape(0),
-                               21, next_omino.get_colour(), self._pygame)
-            
-            # Draw grid of blocks (or pause or game over screen)
-            grid = self._interface.get_field().get_complete_grid()
-            self._grid.fill((0, 0, 0))
-            draw_border(self._grid, self._cycle_colour, self._pygame)
-            
-            if self._state == config.GS_GAME:
-                size = config.sizes[self._interface.get_order()]
-                draw_grid(self._grid, (5, 5), grid, size, self._pygame)
-            elif self._state == config.GS_GAME_PAUSED:
-                draw_text(self._grid, (30, 115), 'Game Paused', 14,
-                          self._cycle_colour, self._pygame, True)
-                draw_text(self._grid, (40, 185), 'Press y to quit', 10,
-                          self._white, self._pygame)
-                draw_text(self._grid, (30, 215), 'or esc to resume', 10,
-                          self._white, self._pygame)
-            elif self._state == config.GS_GAME_OVER:
-                draw_text(self._grid, (42, 115), 'Game Over', 14,
-                          self._cycle_colour, self._pygame, True)
-                draw_text(self._grid, (47, 185), 'Press return', 10,
-                          self._white, self._pygame)
-            
-            self._screen.blit(self._grid, (60, 30))
+                               21, next_omino.get_colour(), self._pygame,
+                               shape_id)
+            
+            # Draw grid of blocks (or pause or game over screen) if changed
+            grid_key = (self._state, self._cycle_colour, field.get_version(),
+                        omino)
+            if self._refresh('grid', grid_key, True):
+                self._grid.fill((0, 0, 0))
+                draw_border(self._grid, self._cycle_colour, self._pygame)
+                
+                if self._state == config.GS_GAME:
+                    self._layer.draw(self._grid, field, self._pygame)
+                elif self._state == config.GS_GAME_PAUSED:
+                    self._grid.blit(self._overlays[self._state], (0, 0))
+                    draw_text(self._grid, (30, 115), 'Game Paused', 14,
+                              self._cycle_colour, self._pygame, True)
+                elif self._state == config.GS_GAME_OVER:
+                    self._grid.blit(self._overlays[self._state], (0, 0))
+                    draw_text(self._grid, (42, 115), 'Game Over', 14,
+                              self._cycle_colour, self._pygame, True)
+                
+                self._screen.blit(self._grid, (60, 30))
+        
+        elif self._state in config.VERSUS_STATES:
+            
+            if self._full_update:
+                self._screen.blit(self._background, (0, 0))
+            
+            # Each board is only redrawn when something on it has changed, so
+            # boards which are idle this frame cost nothing
+            for i, board in enumerate(self._interface.get_boards()):
+                field = board.get_field()
+                omino = field.get_omino()
+                if omino != None:
+                    omino = (omino, omino.get_location().x,
+                             omino.get_location().y, omino.get_rotation())
+                key = (field.get_version(), omino, board.get_score(),
+                       board.get_lines_cleared(), board.get_garbage(),
+                       board.is_playing())
+                if self._refresh(('board', i), key, True):
+                    self._draw_board(i, board)
+            
+            # Pause and game over messages, shown over the players' controls
+            status = None
+            if self._state == config.GS_VERSUS_PAUSED:
+                status = 'Paused - press y to quit or esc to resume'
+            elif self._state == config.GS_VERSUS_OVER:
+                winner = self._interface.get_winner()
+                if winner == None:
+                    status = 'Draw! Press return'
+                else:
+                    status = 'Player %d wins! Press return' % (winner + 1)
+            if self._refresh('status', (status, self._cycle_colour), True) \
+               and status:
+                self._screen.fill((0, 0, 0), self._panels['status'])
+                draw_text(self._screen, (20, 458), status, 10,
+                          self._cycle_colour, self._pygame)
         
-        self._display.flip()
+        if config.profile_hud and self._profiler.is_enabled():
+            self._draw_hud()
+        self._profiler.stop('render')
+        
+        self._profiler.start('flip')
+        self._push_display()
+        self._profiler.stop('flip')
+    
+    def redraw(self):
+        """ Draw the whole screen again on the next update, for when the
+        window has been uncovered or restored. """
+        
+        self._full_update = True
     
     def change_state(self, state, interface=None):
         """ Change the state of the application and get the new interface
@@ -179,6 +279,8 @@ class View:
         self._state = state
         if interface != None:
             self._interface = interface
+        self._full_update = True
+        self._panel_keys = {}
         
         if self._state == config.GS_LOADING:
             
@@ -206,6 +308,12 @@ class View:
             draw_text(self._background, (410, 250), next_text, 10,
                       self._white, self._pygame)
             
+            # Draw all the block sprites this game can use up front
+            order = self._interface.get_order()
+            colours = self._master.get_ominoes(order)[1]
+            load_block_sprites(colours, config.sizes[order], self._pygame)
+            load_block_sprites(colours, 21, self._pygame)
+            
             # Grid
             w = 210 + 10 - self._interface.get_field().get_size()[0] + 1
             h = 420 + 10 - self._interface.get_field().get_size()[1] + 1
@@ -214,6 +322,78 @@ class View:
             self._grid.fill((0, 0, 0))
             self._grid.set_colorkey((0, 0, 0))
             
+            # Static text of the pause and game over screens
+            paused = self._pygame.Surface((w, h))
+            paused = paused.convert()
+            paused.fill((0, 0, 0))
+            paused.set_colorkey((0, 0, 0))
+            draw_text(paused, (40, 185), 'Press y to quit', 10, self._white,
+                      self._pygame)
+            draw_text(paused, (30, 215), 'or esc to resume', 10, self._white,
+                      self._pygame)
+            game_over = self._pygame.Surface((w, h))
+            game_over = game_over.convert()
+            game_over.fill((0, 0, 0))
+            game_over.set_colorkey((0, 0, 0))
+            draw_text(game_over, (47, 185), 'Press return', 10, self._white,
+                      self._pygame)
+            self._overlays = {config.GS_GAME_PAUSED: paused,
+                              config.GS_GAME_OVER: game_over}
+            
+            # Screen areas which change independently during the game
+            Rect = self._pygame.Rect
+            self._panels = {'score': Rect(440, 150, 200, 25),
+                            'lines': Rect(440, 210, 200, 25),
+                            'next': Rect(400, 270, 240, 160),
+                            'grid': Rect((60, 30), (w, h))}
+            
+            # Settled blocks, only redrawn when the field's blocks change
+            self._layer = Field_Layer((w, h), config.sizes[order],
+                                      self._pygame)
+        
+        elif self._state == config.GS_VERSUS:
+            
+            boards = self._interface.get_boards()
+            order = self._interface.get_order()
+            width, height = boards[0].get_field().get_size()
+            
+            # The boards share the screen in columns, with blocks as large as
+            # fit (but no larger than in a single game)
+            column = 640 // len(boards)
+            size = min((column - 31) // width + 1, (395 - 11) // height + 1,
+                       config.sizes[order])
+            w = width * (size - 1) + 11
+            h = height * (size - 1) + 11
+            colours = self._master.get_ominoes(order)[1]
+            load_block_sprites(colours, size, self._pygame)
+            load_block_sprites([config.garbage_palette], size, self._pygame)
+            
+            # Background with each player's name and controls
+            self._background = self._pygame.Surface(self._screen.get_size())
+            self._background = self._background.convert()
+            self._background.fill((0, 0, 0))
+            
+            Rect = self._pygame.Rect
+            self._panels = {'status': Rect(0, 450, 640, 30)}
+            self._boards = []
+            for i in xrange(len(boards)):
+                left = i * column
+                keys = ' '.join(config.versus_keys[i][:4]).upper()
+                draw_text(self._background, (left + 10, 5),
+                          'Player %d' % (i + 1), 10, self._white,
+                          self._pygame)
+                draw_text(self._background, (left + 10, 460), keys, 8,
+                          self._white, self._pygame)
+                self._panels[('board', i)] = Rect(left, 22, column, 425)
+                
+                # Each board has its own grid surface and layer of settled
+                # blocks, sized to its column
+                grid = self._pygame.Surface((w, h))
+                grid = grid.convert()
+                layer = Field_Layer((w, h), size, self._pygame)
+                self._boards.append(((left + (column - w) // 2, 50), grid,
+                                     layer))
+            
         elif self._state in [config.GS_MENU, config.GS_MENU_ENTER_HIGHSCORE,
                              config.GS_MENU_HIGHSCORES]:
             
@@ -222,20 +402,43 @@ class View:
             self._background = self._background.convert()
             self._background.fill((0, 0, 0))
             
-            draw_text(self._background, (110, 300), 'Settings:', 10,
+            draw_text(self._background, (110, 290), 'Settings:', 10,
+                      self._white, self._pygame)
+            draw_text(self._background, (130, 315), 'Difficulty Level:', 10,
                       self._white, self._pygame)
-            draw_text(self._background, (130, 340), 'Difficulty Level:', 10,
+            draw_text(self._background, (130, 365), 'Polyomino Order:', 10,
                       self._white, self._pygame)
-            draw_text(self._background, (130, 400), 'Polyomino Order:', 10,
+            draw_text(self._background, (130, 415), 'Players:', 10,
                       self._white, self._pygame)
             
-            draw_text(self._background, (370, 300), 'Audio:', 10,
+            draw_text(self._background, (370, 290), 'Audio:', 10,
                       self._white, self._pygame)
-            draw_text(self._background, (400, 340), 'Sound Effects:', 10,
+            draw_text(self._background, (400, 315), 'Sound Effects:', 10,
                       self._white, self._pygame)
-            draw_text(self._background, (400, 400), 'Music:', 10,
+            draw_text(self._background, (400, 365), 'Music:', 10,
                       self._white, self._pygame)
             
+            # Screen areas which change independently in the menu
+            Rect = self._pygame.Rect
+            self._panels = {'title': Rect(110, 15, 460, 60),
+                            'buttons': Rect(80, 140, 240, 125),
+                            'omino': Rect(390, 145, 150, 145),
+                            ('radio', config.MENU_LEVEL):
+                                Rect(150, 330, 220, 30),
+                            ('radio', config.MENU_ORDER):
+                                Rect(150, 380, 220, 30),
+                            ('radio', config.MENU_PLAYERS):
+                                Rect(150, 430, 220, 30),
+                            ('radio', config.MENU_SFX): Rect(425, 330, 120, 30),
+                            ('radio', config.MENU_MUSIC):
+                                Rect(425, 380, 120, 30),
+                            ('overlay', config.GS_MENU_HIGHSCORES):
+                                Rect(200, 100, 250, 300),
+                            ('overlay', config.GS_MENU_ENTER_HIGHSCORE):
+                                Rect(200, 120, 250, 210),
+                            ('overlay', config.GS_MENU_HELP):
+                                Rect(115, 120, 410, 240)}
+            
             # Buttons
             self._buttons = {}
             start_game_button = Button('Start Game', 10, (90, 150))
@@ -250,14 +453,19 @@ class View:
             # Radio Selections
             self._radios = {}
             level_selection = Radio_Selection([str(n + 1) for n in range(9)],
-                                              10, (160, 365))
+                                              10, (160, 340))
             self._radios.update({config.MENU_LEVEL: level_selection})
             order_selection = Radio_Selection([str(n + 1) for n in range(6)],
-                                              10, (160, 425))
+                                              10, (160, 390))
             self._radios.update({config.MENU_ORDER: order_selection})
-            sfx_selection = Radio_Selection(['On', 'Off'], 10, (435, 365))
+            players = len(config.versus_keys)
+            players_selection = Radio_Selection([str(n + 1)
+                                                 for n in range(players)],
+                                                10, (160, 440))
+            self._radios.update({config.MENU_PLAYERS: players_selection})
+            sfx_selection = Radio_Selection(['On', 'Off'], 10, (435, 340))
             self._radios.update({config.MENU_SFX: sfx_selection})
-            music_selection = Radio_Selection(['On', 'Off'], 10, (435, 425))
+            music_selection = Radio_Selection(['On', 'Off'], 10, (435, 390))
             self._radios.update({config.MENU_MUSIC: music_selection})
             
             # Highscores Screen
@@ -265,13 +473,21 @@ class View:
             self._highscores = self._highscores.convert()
             self._highscores.fill((0, 0, 0))
             
-            draw_text(self._highscores, (15, 10), 'Highscores:', 10,
-                      self._white, self._pygame)
+            self._highscores_key = None
             
-            # Enter highscore name screen
+            # Enter highscore name screen, with its static text kept apart so
+            # it can be copied back under the bouncing name each frame
             self._enterhighscore = self._pygame.Surface((250, 210))
             self._enterhighscore = self._enterhighscore.convert()
-            self._enterhighscore.fill((0, 0, 0))
+            self._enterhighscore_text = self._pygame.Surface((250, 210))
+            self._enterhighscore_text = self._enterhighscore_text.convert()
+            self._enterhighscore_text.fill((0, 0, 0))
+            draw_text(self._enterhighscore_text, (60, 20), 'Highscore!', 14,
+                      self._white, self._pygame)
+            draw_text(self._enterhighscore_text, (20, 60),
+                      'Please enter your name:', 10, self._white, self._pygame)
+            draw_text(self._enterhighscore_text, (70, 170), 'Press return', 10,
+                      self._white, self._pygame)
             self._name_entry = Text_Entry(3, ['A', 'A', 'A'], 20, (85, 105))
             
             # Help Screen
@@ -302,4 +518,127 @@ class View:
             instructions = render_textrect(text, 8, rect, self._white,
                                            (0, 0, 0), 0, self._pygame)
             self._help.blit(instructions, (210, 45))
-            
\ No newline at end of file
+            
+    
+    def _draw_board(self, index, board):
+        """ Draw the given board of a versus game, with its score, lines
+        cleared and garbage waiting, in its column of the screen.
+        
+        _draw_board(int, Board) -> void
+        """
+        
+        coords, grid, layer = self._boards[index]
+        left = self._panels[('board', index)].left + 10
+        info = '%d pts  %d lines' % (board.get_score(),
+                                     board.get_lines_cleared())
+        draw_text(self._screen, (left, 25), info, 8, self._white,
+                  self._pygame)
+        if board.get_garbage():
+            draw_text(self._screen, (left, 37),
+                      '+%d garbage' % board.get_garbage(), 8, self._white,
+                      self._pygame)
+        
+        grid.fill((0, 0, 0))
+        draw_border(grid, self._white, self._pygame)
+        layer.draw(grid, board.get_field(), self._pygame)
+        if not board.is_playing():
+            draw_text(grid, (grid.get_width() // 2 - 20, 115), 'Out', 14,
+                      self._white, self._pygame, True)
+        self._screen.blit(grid, coords)
+    
+    def _compose_highscores(self, order, level, highscores, highlight):
+        """ Redraw the highscores screen with the given list of highscores of
+        the given order and level. The highscore at index highlight is left
+        out, as it is drawn each frame in the cycling colour.
+        
+        _compose_highscores(int, int, list<(string, int)>, int) -> void
+        """
+        
+        self._highscores.fill((0, 0, 0))
+        draw_text(self._highscores, (15, 10),
+                  'Order %d Level %d:' % (order, level), 10, self._white,
+                  self._pygame)
+        for i, highscore in enumerate(highscores):
+            if i != highlight:
+                self._draw_highscore(highscore, i, self._white)
+    
+    def _draw_highscore(self, highscore, index, colour):
+        """ Draw the given (name, score) pair as the given row of the
+        highscores screen, in the given colour.
+        
+        _draw_highscore((string, int), int, (int, int, int)) -> void
+        """
+        
+        name, score = highscore
+        name = name.replace('_', ' ')
+        top = 10 + (index + 1) * 25
+        self._highscores.fill((0, 0, 0), (20, top, 220, 20))
+        draw_text(self._highscores, (20, top), name, 10, colour, self._pygame)
+        draw_text(self._highscores, (175, top), str(score), 10, colour,
+                  self._pygame)
+    
+    def _draw_hud(self):
+        """ Draw the profiler's frame timing percentiles in the top right
+        corner of the screen. The timings shown are only updated every half
+        second or so, to keep them readable. """
+        
+        if self._frame % 30 == 0 or not self._hud_lines:
+            self._hud_lines = self._profiler.get_summary()
+        if 'hud' not in self._panels:
+            self._panels['hud'] = self._pygame.Rect(455, 0, 185, 125)
+        clear = self._state in config.GAME_STATES
+        if self._refresh('hud', tuple(self._hud_lines), clear) or not clear:
+            draw_text(self._screen, (460, 5), 'phase    p50   p95   p99', 8,
+                      self._white, self._pygame)
+            for i, line in enumerate(self._hud_lines):
+                draw_text(self._screen, (460, 20 + i * 11), line, 8,
+                          self._white, self._pygame)
+    
+    def _refresh(self, panel, key, clear=False):
+        """ Record key as a description of what the given panel now shows. If
+        it differs from the last frame's, mark the panel's area of the screen
+        to be pushed to the display, restore it from the background if clear
+        is True, and return True. Otherwise return False.
+        
+        _refresh(object, object, bool) -> bool
+        """
+        
+        if not self._full_update and self._panel_keys.get(panel) == key:
+            return False
+        self._panel_keys[panel] = key
+        rect = self._panels[panel]
+        if clear:
+            self._screen.blit(self._background, rect, rect)
+        self._dirty.append(rect)
+        return True
+    
+    def _push_display(self):
+        """ Push the changed areas of the screen to the display, or the whole
+        screen if everything has changed. """
+        
+        if self._full_update:
+            self._display.flip()
+            self._full_update = False
+        elif self._dirty:
+            self._display.update(self._dirty)
+        self._dirty = []
+    
+    def _load_thumbnails(self, order):
+        """ Draw a few of the next-polyomino thumbnails for the given order,
+        so that by the time a game starts they are all ready. If the order has
+        changed, the thumbnails of the old order are thrown away.
+        
+        _load_thumbnails(int) -> void
+        """
+        
+        if order != self._thumbnail_order:
+            clear_thumbnails()
+            self._thumbnail_order = order
+            shapes, colours = self._master.get_ominoes(order)
+            self._pending_thumbnails = [((order, i, 0), shapes[i], colours[i])
+                                        for i in xrange(len(shapes))]
+        for i in xrange(config.thumbnails_per_frame):
+            if not self._pending_thumbnails:
+                break
+            shape_id, shape, colour = self._pending_thumbnails.pop()
+            get_thumbnail(shape_id, shape, 21, colour, self._pygame)
@@ -0,0 +1,133 @@
+""" writer.py: Contains the File_Writer class. """
+
+
+import os
+import sys
+import tempfile
+import threading
+
+if os.name == 'nt':
+    import ctypes
+
+
+# New files get the permissions they would if opened normally
+_umask = os.umask(0)
+os.umask(_umask)
+
+# MoveFileEx flags: replace the target if it exists, and don't return until
+# the move has been written to disk
+_MOVEFILE_REPLACE_EXISTING = 0x1
+_MOVEFILE_WRITE_THROUGH = 0x8
+
+
+class File_Writer:
+    
+    """ A class for saving a file on a background thread, so that nothing
+    waits for the disk. Each save replaces the whole file atomically: the new
+    contents are written to a temporary file next to it, flushed to disk and
+    renamed over the old file, so a crash leaves either the old file or the
+    new one, never part of one. Saves asked for while one is being written are
+    coalesced, so only the latest contents are written next. """
+    
+    def __init__(self, filename):
+        """ Initialise a writer for the given file.
+        
+        __init__(string) -> void
+        """
+        
+        self._filename = filename
+        self._pending = None
+        self._writing = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def write(self, contents):
+        """ Save the given contents to the file in the background, replacing
+        any contents waiting to be saved.
+        
+        write(string) -> void
+        """
+        
+        self._condition.acquire()
+        self._pending = contents
+        self._condition.notify_all()
+        self._condition.release()
+    
+    def flush(self):
+        """ Wait until everything asked to be saved has been written. """
+        
+        self._condition.acquire()
+        while self._pending != None or self._writing:
+            self._condition.wait()
+        self._condition.release()
+    
+    def _run(self):
+        """ Write out the pending contents whenever there are some. Run on the
+        writer's thread. """
+        
+        while True:
+            self._condition.acquire()
+            while self._pending == None:
+                self._condition.wait()
+            contents = self._pending
+            self._pending = None
+            self._writing = True
+            self._condition.release()
+            
+            try:
+                self._save(contents)
+            except (IOError, OSError), error:
+                print 'Could not save ' + self._filename + ':', error
+            
+            self._condition.acquire()
+            self._writing = False
+            self._condition.notify_all()
+            self._condition.release()
+    
+    def _save(self, contents):
+        """ Atomically replace the file with the given contents.
+        
+        _save(string) -> void
+        """
+        
+        directory, name = os.path.split(self._filename)
+        handle, temp_filename = tempfile.mkstemp(prefix=name + '.',
+                                                 dir=directory or '.')
+        try:
+            if os.path.exists(self._filename):
+                os.chmod(temp_filename, os.stat(self._filename).st_mode)
+            else:
+                os.chmod(temp_filename, 0666 & ~_umask)
+            file_handle = os.fdopen(handle, 'wb')
+            file_handle.write(contents)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+            file_handle.close()
+            replace_file(temp_filename, self._filename)
+        except:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
+
+def replace_file(source, target):
+    """ Rename the source file to the target, replacing the target if it
+    exists, in a single step so that there is always one of the two files.
+    os.rename can't replace a file on Windows, so MoveFileEx is used there.
+    
+    replace_file(string, string) -> void
+    """
+    
+    if os.name != 'nt':
+        os.rename(source, target)
+        return
+    encoding = sys.getfilesystemencoding()
+    if isinstance(source, str):
+        source = source.decode(encoding)
+    if isinstance(target, str):
+        target = target.decode(encoding)
+    flags = _MOVEFILE_REPLACE_EXISTING | _MOVEFILE_WRITE_THROUGH
+    if not ctypes.windll.kernel32.MoveFileExW(source, target, flags):
+        raise ctypes.WinError()